@@ -1,3 +1,3 @@
 # flake8: noqa
 # pylint: disable=useless-import-alias,missing-module-docstring
-__version__ = "1.1.1"
+__version__ = "1.2.0"
@@ -0,0 +1,34 @@
+"""Helpers for managing state that lives for the duration of a single render."""
+from __future__ import annotations
+
+from typing import Any
+from typing import Callable
+from typing import TypeVar
+
+from liquid import Context
+
+T = TypeVar("T")
+
+
+def root_context(context: Context) -> Context:
+    """Return the render context that `context` was, ultimately, copied from.
+
+    Tags like `render` copy the active render context. Copied contexts get their own
+    tag namespace, so state that should be shared across a whole render needs to be
+    stored on the root context.
+    """
+    while context.parent_context is not None:
+        context = context.parent_context
+    return context
+
+
+def render_state(context: Context, key: str, factory: Callable[[], T]) -> T:
+    """Return the per-render object stored under `key`, creating it with `factory`
+    if it does not yet exist.
+    """
+    namespace: Any = root_context(context).tag_namespace
+    try:
+        state: T = namespace[key]
+    except KeyError:
+        state = namespace[key] = factory()
+    return state
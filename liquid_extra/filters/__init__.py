@@ -4,5 +4,18 @@
 from .additional import JSON as JSON
 from .additional import Translate as Translate
 from .array import index as index
+from .array import cached_index as cached_index
+from .array import indices as indices
+from .array import index_by as index_by
+from .array import bisect as bisect
+from .array import sorted_index as sorted_index
 from .html import stylesheet_tag as stylesheet_tag
 from .html import script_tag as script_tag
+from .html import stylesheet_tags as stylesheet_tags
+from .html import script_tags as script_tags
+from .html import AssetManifest as AssetManifest
+from .html import SubresourceIntegrity as SubresourceIntegrity
+from .html import ManifestStylesheetTag as ManifestStylesheetTag
+from .html import ManifestScriptTag as ManifestScriptTag
+from .html import AssetCollector as AssetCollector
+from .html import collect_assets as collect_assets
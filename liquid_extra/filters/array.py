@@ -1,16 +1,343 @@
 """Extra array filters."""
+import bisect as _bisect
 
+from numbers import Number
+
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
 from typing import Sequence
+from typing import Tuple
+
+from liquid import Context
+from liquid.context import get_item
+from liquid.context import is_undefined
+from liquid.exceptions import FilterValueError
 
 from liquid.filter import array_filter
+from liquid.filter import liquid_filter
+from liquid.filter import with_context
 
+from liquid_extra.context import render_state
 
-@array_filter
-def index(arr: Sequence[object], obj: object) -> object:
+CACHE_INDEX = "index_cache"
+CACHE_PROPERTY_INDEX = "index_by_cache"
+
+# Stands in for items that don't have the requested property. Never equal to
+# anything but itself.
+_MISSING = object()
+
+
+@liquid_filter
+def index(arr: object, obj: object) -> object:
     """Return the first zero-based index of an item in an array. Or None if
     the items is not in the array.
+
+    Any iterable other than a string or mapping is accepted. Iterables are consumed
+    lazily, stopping at the first match, and ranges are searched arithmetically.
     """
+    if is_undefined(arr):
+        return None
+
+    if isinstance(arr, (list, tuple)):
+        try:
+            return arr.index(obj)
+        except ValueError:
+            return None
+
+    if isinstance(arr, range):
+        return range_index(arr, obj)
+
+    if isinstance(arr, (str, Mapping)) or not isinstance(arr, Iterable):
+        raise FilterValueError(f"expected an array, found {type(arr).__name__}")
+
+    return scan_index(arr, obj)
+
+
+def range_index(rng: range, obj: object) -> Optional[int]:
+    """Return the index of `obj` in the given range, or None if `obj` is not in the
+    range, without iterating the range.
+    """
+    # Range items are always integers, so nothing else can be in the range. We
+    # never fall back to iterating, which could take a very long time.
+    if isinstance(obj, complex):
+        if obj.imag:
+            return None
+        obj = obj.real
+
+    if not isinstance(obj, Number):
+        return None
+
     try:
-        return arr.index(obj)
-    except ValueError:
+        num = int(obj)  # type: ignore
+    except (ValueError, OverflowError):
+        # NaN or infinity
+        return None
+
+    # Membership tests and `range.index` are only O(1) for exact integers.
+    if num != obj or num not in rng:
+        return None
+    return rng.index(num)
+
+
+def scan_index(items: Iterable[object], obj: object) -> Optional[int]:
+    """Return the index of the first item equal to `obj`, or None if there is no such
+    item. Stops consuming `items` at the first match.
+    """
+    for i, item in enumerate(items):
+        if item == obj:
+            return i
+    return None
+
+
+# Types whose instances only compare equal to values with the same hash. Other
+# values, like Liquid's `Undefined`, which is equal to `None`, can't be looked up
+# by hash.
+_HASH_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+class ArrayIndex(NamedTuple):
+    """A map of hashable array items to the position of their first occurrence."""
+
+    arr: Sequence[object]
+    positions: Dict[object, int]
+    # Positions of items that can't be looked up by hash. These are checked with a
+    # linear scan, which is fine as long as there are few of them.
+    scanned: List[int]
+
+    def find(self, obj: object) -> Optional[int]:
+        """Return the first zero-based index of `obj`, or None if it is not in the
+        array.
+        """
+        if type(obj) not in _HASH_TYPES:
+            try:
+                return self.arr.index(obj)
+            except ValueError:
+                return None
+
+        pos = self.positions.get(obj)
+
+        # A scanned item could still compare equal to `obj`, and it might appear
+        # before the first hashed match.
+        for i in self.scanned:
+            if pos is not None and i > pos:
+                break
+            if self.arr[i] == obj:
+                return i
+
+        return pos
+
+
+def build_array_index(arr: Sequence[object]) -> ArrayIndex:
+    """Return an `ArrayIndex` for the given array."""
+    positions: Dict[object, int] = {}
+    scanned: List[int] = []
+
+    for i, item in enumerate(arr):
+        if type(item) in _HASH_TYPES:
+            positions.setdefault(item, i)
+        elif item is not _MISSING:
+            scanned.append(i)
+
+    return ArrayIndex(arr, positions, scanned)
+
+
+def get_array_index(context: Context, arr: object) -> ArrayIndex:
+    """Return an `ArrayIndex` for the given array, building it the first time
+    the array is seen during the current render.
+    """
+    cache: Dict[int, Tuple[object, ArrayIndex]] = render_state(
+        context, CACHE_INDEX, dict
+    )
+    entry = cache.get(id(arr))
+
+    # Holding a reference to `arr` stops its id from being reused before the
+    # render is complete.
+    if entry is None or entry[0] is not arr:
+        entry = cache[id(arr)] = (arr, build_array_index(as_sequence(arr)))
+
+    return entry[1]
+
+
+def get_property_index(context: Context, arr: object, key: str) -> ArrayIndex:
+    """Return an `ArrayIndex` mapping the value of property `key`, for each item in
+    the given array, to its position. The index is built the first time the array and
+    property are seen during the current render.
+    """
+    cache: Dict[Tuple[int, str], Tuple[object, ArrayIndex]] = render_state(
+        context, CACHE_PROPERTY_INDEX, dict
+    )
+    entry = cache.get((id(arr), key))
+
+    if entry is None or entry[0] is not arr:
+        items: Sequence[Any] = as_sequence(arr)
+        values = [get_item(item, key, default=_MISSING) for item in items]
+        entry = cache[(id(arr), key)] = (arr, build_array_index(values))
+
+    return entry[1]
+
+
+def as_sequence(val: object) -> Sequence[object]:
+    """Return `val` as a sequence, or raise a `FilterValueError` if `val` is not
+    array-like.
+
+    Array-like objects with a `tolist` method, like NumPy arrays and `array.array`,
+    are converted to a list in one go.
+    """
+    if isinstance(val, (list, tuple, range)):
+        return val
+
+    tolist = getattr(val, "tolist", None)
+    if callable(tolist):
+        items = tolist()
+        if isinstance(items, list):
+            return items
+
+    if isinstance(val, Sequence) and not isinstance(val, str):
+        return val
+
+    raise FilterValueError(f"expected an array, found {type(val).__name__}")
+
+
+@array_filter
+@with_context
+def cached_index(
+    arr: Sequence[object], obj: object, *, context: Context
+) -> Optional[int]:
+    """Return the first zero-based index of an item in an array. Or None if
+    the item is not in the array.
+
+    Unlike `index`, a map of items to positions is built the first time an array
+    is seen, and reused for the rest of the render. Use this when looking up items
+    in the same array many times, like from inside a `for` loop. Ranges are searched
+    arithmetically, without building a map.
+    """
+    if is_undefined(arr):
         return None
+    if isinstance(arr, range):
+        return range_index(arr, obj)
+    return get_array_index(context, arr).find(obj)
+
+
+@liquid_filter
+@with_context
+def indices(arr: object, needles: Any, *, context: Context) -> List[Optional[int]]:
+    """Return the first zero-based index of each item in `needles`, or None for
+    items that are not in the array.
+
+    All needles are looked up using a single map of items to positions, which is
+    built once per array per render.
+    """
+    if is_undefined(needles):
+        return []
+
+    if isinstance(needles, str) or not isinstance(needles, Iterable):
+        needles = [needles]
+
+    if is_undefined(arr):
+        return [None for _ in needles]
+
+    if isinstance(arr, range):
+        return [range_index(arr, needle) for needle in needles]
+
+    array_index = get_array_index(context, arr)
+    return [array_index.find(needle) for needle in needles]
+
+
+@liquid_filter
+@with_context
+def index_by(
+    arr: object, key: object, value: object, *, context: Context
+) -> Optional[int]:
+    """Return the zero-based index of the first item in an array with a property
+    `key` equal to `value`. Or None if there is no such item.
+
+    A map of property values to positions is built the first time an array and
+    property are seen, and reused for the rest of the render.
+    """
+    if is_undefined(arr):
+        return None
+    return get_property_index(context, arr, str(key)).find(value)
+
+
+def bisect_array(
+    arr: Sequence[Any], obj: object, key: Optional[str] = None, right: bool = False
+) -> int:
+    """Return the position at which `obj` would be inserted into the sorted array
+    `arr`, optionally comparing `obj` to the value of each item's `key` property.
+
+    Items without a `key` property sort before all other items.
+    """
+    if key is None:
+        if right:
+            return _bisect.bisect_right(arr, obj)
+        return _bisect.bisect_left(arr, obj)
+
+    # `bisect` doesn't accept a `key` argument until Python 3.10, so we look up
+    # properties as we go. This keeps lookups O(log n) without building an
+    # intermediate list of keys.
+    lo, hi = 0, len(arr)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        val: Any = get_item(arr[mid], key, default=_MISSING)
+        if val is _MISSING:
+            before = False
+        else:
+            before = obj < val if right else not val < obj
+        if before:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+@liquid_filter
+def bisect(
+    arr: object, obj: object, key: Optional[object] = None, *, right: bool = False
+) -> int:
+    """Return the position at which an item would be inserted into a sorted array to
+    keep it sorted.
+
+    If `key` is given, the array is assumed to be sorted by the value of each item's
+    `key` property, with items that don't have that property first. If `right` is
+    true, the insertion point will come after any
+    existing items equal to `obj`, otherwise it will come before them.
+    """
+    if is_undefined(arr):
+        return 0
+
+    return bisect_array(
+        as_sequence(arr),
+        obj,
+        key=None if key is None or is_undefined(key) else str(key),
+        right=bool(right),
+    )
+
+
+@liquid_filter
+def sorted_index(arr: object, obj: object, key: Optional[object] = None) -> object:
+    """Return the first zero-based index of an item in a sorted array. Or None if
+    the item is not in the array.
+
+    If `key` is given, the array is assumed to be sorted by the value of each item's
+    `key` property, with items that don't have that property first, and the index of
+    the first item with a property equal to `obj` is returned.
+    """
+    if is_undefined(arr):
+        return None
+
+    items: Sequence[Any] = as_sequence(arr)
+    _key = None if key is None or is_undefined(key) else str(key)
+    pos = bisect_array(items, obj, key=_key)
+
+    if pos < len(items):
+        item = (
+            items[pos] if _key is None else get_item(items[pos], _key, default=_MISSING)
+        )
+        if item == obj:
+            return pos
+    return None
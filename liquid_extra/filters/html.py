@@ -1,34 +1,612 @@
 """Extra HTML filters."""
+import base64
+import hashlib
 import html
+import json
+import os
+import threading
+import time
+
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from urllib.parse import quote
 
 from liquid import Markup
 from liquid import escape
 
+from liquid.filter import liquid_filter
+from liquid.filter import sequence_filter
 from liquid.filter import string_filter
+from liquid.filter import with_context
 from liquid.filter import with_environment
 
+from liquid import Context
 from liquid import Environment
 
+from liquid_extra.context import render_state
+from liquid_extra.context import root_context
+
+# Characters that are left as they are when writing a URL to a `Link` header, in
+# addition to letters, digits and `_.-~`. Includes `%`, so URLs that are already
+# percent-encoded are not encoded again.
+LINK_URL_SAFE = "!$&'()*+/:=?@#[]%"
+
+STYLESHEET_TAG = '<link href="{}" rel="stylesheet" type="text/css" media="all" />'
+SCRIPT_TAG = '<script src="{}" type="text/javascript"></script>'
+
+# Tag templates with an additional integrity attribute, keyed by their plain
+# counterparts.
+INTEGRITY_TAGS = {
+    STYLESHEET_TAG: (
+        '<link href="{}" rel="stylesheet" type="text/css" media="all" '
+        'integrity="{}" crossorigin="anonymous" />'
+    ),
+    SCRIPT_TAG: (
+        '<script src="{}" type="text/javascript" '
+        'integrity="{}" crossorigin="anonymous"></script>'
+    ),
+}
+
+# Keys of per-render asset state in the root context's tag namespace.
+ASSETS = "assets"
+EMITTED_ASSETS = "emitted_assets"
+
+
+class AssetCollector:
+    """An ordered, de-duplicated record of asset URLs emitted by HTML filters
+    during a render.
+
+    Use `collect_assets` to enable asset collection for a render context.
+    """
+
+    def __init__(self) -> None:
+        # Asset URL to its preload destination. Like "style" or "script".
+        self.assets: Dict[str, str] = {}
+
+    def add(self, url: str, kind: str) -> None:
+        """Record an asset URL, unless it has been recorded already."""
+        if url not in self.assets:
+            self.assets[url] = kind
+
+    @property
+    def urls(self) -> List[str]:
+        """Asset URLs in the order they were first emitted."""
+        return list(self.assets)
+
+    def link_header(self) -> str:
+        """Return the value of a `Link` header that preloads all collected assets.
+        Suitable for use in a 103 Early Hints response.
+
+        URLs can come from template data, so characters that are not allowed in a
+        URI reference, and the `,` and `;` link delimiters, are percent-encoded.
+        """
+        return ", ".join(
+            f"<{quote(url, safe=LINK_URL_SAFE)}>; rel=preload; as={kind}"
+            for url, kind in self.assets.items()
+        )
+
+
+def collect_assets(context: Context) -> AssetCollector:
+    """Enable asset collection for the render using the given context, and return
+    the collector.
+
+    Assets are collected as they are output, so the collector can be inspected
+    part-way through a render as well as after it.
+    """
+    return render_state(context, ASSETS, AssetCollector)
+
+
+def emit_asset(context: Context, url: str, kind: str, once: bool = False) -> bool:
+    """Record that an asset is about to be output during the current render.
+
+    Returns `False` if `once` is true and the asset has already been output during
+    this render, in which case the asset should not be output again.
+    """
+    namespace = root_context(context).tag_namespace
+
+    collector: Optional[AssetCollector] = namespace.get(ASSETS)
+    if collector is not None:
+        collector.add(url, kind)
+
+    try:
+        emitted: Set[str] = namespace[EMITTED_ASSETS]
+    except KeyError:
+        emitted = namespace[EMITTED_ASSETS] = set()
+
+    if url in emitted:
+        return not once
+
+    emitted.add(url)
+    return True
+
+
+def format_tag(
+    tag: str, url: object, autoescape: bool, integrity: Optional[str] = None
+) -> str:
+    """Substitute the given URL into an HTML tag template, escaping it as needed.
+
+    If `integrity` is given, the tag will include an integrity attribute.
+    """
+    # We are deliberately forcing possible Markup strings to normal strings. We do
+    # not want markup in the middle of a tag.
+    if integrity is None:
+        args = [str(url)]
+    else:
+        tag = INTEGRITY_TAGS[tag]
+        args = [str(url), integrity]
+
+    if autoescape:
+        return Markup(tag).format(*[escape(arg) for arg in args])
+    return tag.format(*[html.escape(arg) for arg in args])
+
 
 @string_filter
+@with_context
 @with_environment
-def stylesheet_tag(url: str, *, environment: Environment) -> str:
-    """Wrap a URL in an HTML stylesheet tag."""
-    tag = '<link href="{}" rel="stylesheet" type="text/css" media="all" />'
-    if environment.autoescape:
-        # We are deliberately forcing possible Markup strings to normal strings. We do
-        # not want markup in the middle of a link tag.
-        return Markup(tag).format(escape(str(url)))
-    return tag.format(html.escape(url))
+def stylesheet_tag(
+    url: str, *, context: Context, environment: Environment, once: bool = False
+) -> str:
+    """Wrap a URL in an HTML stylesheet tag.
+
+    If `once` is true and the same URL has already been output during the current
+    render, an empty string is returned instead.
+    """
+    if not emit_asset(context, str(url), "style", once):
+        return ""
+    return format_tag(STYLESHEET_TAG, url, environment.autoescape)
 
 
 @string_filter
+@with_context
+@with_environment
+def script_tag(
+    url: str, *, context: Context, environment: Environment, once: bool = False
+) -> str:
+    """Wrap a URL in an HTML script tag.
+
+    If `once` is true and the same URL has already been output during the current
+    render, an empty string is returned instead.
+    """
+    if not emit_asset(context, str(url), "script", once):
+        return ""
+    return format_tag(SCRIPT_TAG, url, environment.autoescape)
+
+
+def format_tags(
+    tag: str,
+    urls: Iterable[object],
+    autoescape: bool,
+    *,
+    context: Context,
+    kind: str,
+    once: bool = False,
+) -> str:
+    """Substitute each of the given URLs into an HTML tag template and join the
+    results, escaping URLs as needed.
+    """
+    _escape = escape if autoescape else html.escape
+    tags: List[str] = []
+
+    for url in urls:
+        _url = str(url)
+        if emit_asset(context, _url, kind, once):
+            tags.append(tag.format(_escape(_url)))
+
+    # The tag template is trusted and every URL has been escaped, so we only need
+    # to mark the result as safe once.
+    return Markup("".join(tags)) if autoescape else "".join(tags)
+
+
+@sequence_filter
+@with_context
+@with_environment
+def stylesheet_tags(
+    urls: Iterable[object],
+    *,
+    context: Context,
+    environment: Environment,
+    once: bool = False,
+) -> str:
+    """Wrap each URL in an array of URLs in an HTML stylesheet tag, and join them.
+
+    If `once` is true, URLs that have already been output during the current render
+    are skipped.
+    """
+    return format_tags(
+        STYLESHEET_TAG,
+        urls,
+        environment.autoescape,
+        context=context,
+        kind="style",
+        once=once,
+    )
+
+
+@sequence_filter
+@with_context
+@with_environment
+def script_tags(
+    urls: Iterable[object],
+    *,
+    context: Context,
+    environment: Environment,
+    once: bool = False,
+) -> str:
+    """Wrap each URL in an array of URLs in an HTML script tag, and join them.
+
+    If `once` is true, URLs that have already been output during the current render
+    are skipped.
+    """
+    return format_tags(
+        SCRIPT_TAG,
+        urls,
+        environment.autoescape,
+        context=context,
+        kind="script",
+        once=once,
+    )
+
+
+class SubresourceIntegrity:
+    """Compute and cache Subresource Integrity hashes for files under a local
+    directory.
+
+    Hashes are cached by path, modification time and size, so a file is only hashed
+    again if it changes. Cached hashes can optionally be persisted to a JSON sidecar
+    file, so other processes don't need to hash the same files at startup.
+
+    Args:
+        root: The directory that asset paths are relative to.
+        algorithm: One of "sha256", "sha384" or "sha512".
+        sidecar: An optional path to a JSON file for persisting hashes.
+    """
+
+    algorithms = frozenset(["sha256", "sha384", "sha512"])
+
+    def __init__(
+        self,
+        root: Union[str, "os.PathLike[str]"],
+        *,
+        algorithm: str = "sha384",
+        sidecar: Optional[Union[str, "os.PathLike[str]"]] = None,
+    ):
+        if algorithm not in self.algorithms:
+            raise ValueError(f"unsupported integrity algorithm {algorithm!r}")
+
+        self.root = os.path.abspath(root)
+        self.algorithm = algorithm
+        self.sidecar = sidecar
+
+        # Relative asset path to a (modification time, size, integrity) tuple.
+        self.hashes: Dict[str, Tuple[int, int, str]] = {}
+        self._dirty = False
+
+        if self.sidecar is not None and os.path.isfile(self.sidecar):
+            self.load()
+
+    def load(self) -> None:
+        """Read cached hashes from the sidecar file."""
+        assert self.sidecar is not None
+        with open(self.sidecar, encoding="utf-8") as fd:
+            data = json.load(fd)
+
+        if data.get("algorithm") == self.algorithm:
+            self.hashes = {
+                path: (int(mtime), int(size), str(digest))
+                for path, (mtime, size, digest) in data.get("hashes", {}).items()
+            }
+        self._dirty = False
+
+    def save(self) -> None:
+        """Write cached hashes to the sidecar file, if there are any changes."""
+        if self.sidecar is None or not self._dirty:
+            return
+
+        data = {"algorithm": self.algorithm, "hashes": self.hashes}
+        tmp = f"{self.sidecar}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fd:
+            json.dump(data, fd)
+
+        # Other processes will see the old file or the new one, never a partial
+        # write.
+        os.replace(tmp, self.sidecar)
+        self._dirty = False
+
+    def resolve(self, path: str) -> Optional[str]:
+        """Return the local file system path for an asset path, or None if the asset
+        is not a local file under the root directory.
+        """
+        if "://" in path or path.startswith("//"):
+            return None
+
+        full_path = os.path.abspath(os.path.join(self.root, path.lstrip("/")))
+        try:
+            if os.path.commonpath([self.root, full_path]) != self.root:
+                return None
+        except ValueError:
+            # Paths on different drives
+            return None
+        return full_path
+
+    def integrity(self, path: str) -> Optional[str]:
+        """Return an integrity attribute value for the asset at the given path,
+        relative to the root directory, or None if the asset is not a local file.
+        """
+        full_path = self.resolve(path)
+        if full_path is None:
+            return None
+
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            return None
+
+        key = os.path.relpath(full_path, self.root)
+        cached = self.hashes.get(key)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        digest = hashlib.new(self.algorithm)
+        with open(full_path, "rb") as fd:
+            for chunk in iter(lambda: fd.read(65536), b""):
+                digest.update(chunk)
+
+        value = f"{self.algorithm}-{base64.b64encode(digest.digest()).decode()}"
+        self.hashes[key] = (stat.st_mtime_ns, stat.st_size, value)
+        self._dirty = True
+        return value
+
+
+class ManifestState(NamedTuple):
+    """A snapshot of a loaded asset manifest.
+
+    A new snapshot is built for every load and replaces the old one with a single
+    assignment, so readers never see URLs from one load paired with integrity
+    hashes or cached tags from another.
+    """
+
+    urls: Mapping[str, str]
+    integrity_hashes: Mapping[str, str]
+    tags: Dict[Tuple[str, str, bool], str]
+    mtime: float
+
+
+class AssetManifest:  # pylint: disable=too-many-instance-attributes
+    """Resolve logical asset names to (usually fingerprinted) URLs using a JSON
+    manifest file.
+
+    The manifest file should contain a JSON object mapping asset names to paths.
+    Formatted HTML tags are cached per asset name and autoescape setting, so
+    repeated use of the same asset costs a dictionary lookup.
+
+    Changes found while rendering are loaded in a background thread. Until that
+    finishes, templates continue to use the previously loaded manifest. Call
+    `reload()` to pick up changes immediately, from a deploy hook for example.
+
+    Args:
+        path: Path to a JSON manifest file.
+        base_url: A string to prefix to every path read from the manifest.
+        auto_reload: If `True`, the manifest is reloaded when its modification time
+            changes.
+        reload_interval: The minimum number of seconds between checks for changes to
+            the manifest file.
+        integrity: An optional `SubresourceIntegrity` instance. If given, tags for
+            assets that resolve to local files will include an integrity attribute.
+            Hashes are computed when the manifest is loaded, not while rendering.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, "os.PathLike[str]"],
+        *,
+        base_url: str = "",
+        auto_reload: bool = True,
+        reload_interval: float = 2.0,
+        integrity: Optional[SubresourceIntegrity] = None,
+    ):
+        self.path = path
+        self.base_url = base_url
+        self.auto_reload = auto_reload
+        self.reload_interval = reload_interval
+        self.integrity = integrity
+
+        self._state = ManifestState({}, {}, {}, 0.0)
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._refresh: Optional[threading.Thread] = None
+        self.load()
+
+    @property
+    def urls(self) -> Mapping[str, str]:
+        """A mapping of asset names to URLs."""
+        return self._state.urls
+
+    @property
+    def integrity_hashes(self) -> Mapping[str, str]:
+        """A mapping of asset names to integrity hashes."""
+        return self._state.integrity_hashes
+
+    def load(self) -> None:
+        """Read the manifest file, discarding any cached tags."""
+        with self._lock:
+            self._load()
+
+    def _load(self) -> None:
+        mtime = os.stat(self.path).st_mtime
+        with open(self.path, encoding="utf-8") as fd:
+            manifest = json.load(fd)
+
+        urls = {str(name): self.base_url + str(path) for name, path in manifest.items()}
+
+        integrity_hashes: Dict[str, str] = {}
+        if self.integrity is not None:
+            for name, path in manifest.items():
+                value = self.integrity.integrity(str(path))
+                if value is not None:
+                    integrity_hashes[str(name)] = value
+            self.integrity.save()
+
+        self._state = ManifestState(urls, integrity_hashes, {}, mtime)
+        self._next_check = time.monotonic() + self.reload_interval
+
+    def reload(self) -> bool:
+        """Reload the manifest now if the file has changed since it was last read.
+
+        Returns `True` if the manifest was reloaded.
+        """
+        with self._lock:
+            if os.stat(self.path).st_mtime == self._state.mtime:
+                return False
+            self._load()
+            return True
+
+    def check(self) -> None:
+        """Start reloading the manifest in the background if auto reload is enabled
+        and the file has changed since it was last read.
+        """
+        if not self.auto_reload:
+            return
+
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+
+        self._next_check = now + self.reload_interval
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            # The manifest might be missing for a moment during a deploy. Keep using
+            # the current state and try again on the next check.
+            return
+
+        if mtime == self._state.mtime:
+            return
+
+        if self._refresh is None or not self._refresh.is_alive():
+            self._refresh = threading.Thread(target=self._reload_quietly, daemon=True)
+            self._refresh.start()
+
+    def _reload_quietly(self) -> None:
+        # The manifest might be mid-write. Keep the old state and try again on the
+        # next check.
+        try:
+            self.reload()
+        except (OSError, ValueError):
+            pass
+
+    def url(self, name: str) -> str:
+        """Return the URL for the asset with the given name. Names that are not in
+        the manifest are assumed to be URLs already.
+        """
+        self.check()
+        return self._state.urls.get(name, name)
+
+    def tag(self, tag: str, name: str, autoescape: bool) -> str:
+        """Return the asset with the given name, formatted as an HTML tag.
+
+        Only tags for names found in the manifest are cached. Other names come
+        from template data and are formatted on every call, so they can't grow
+        the cache without bound.
+        """
+        self.check()
+        state = self._state
+        if name not in state.urls:
+            return format_tag(tag, name, autoescape)
+
+        key = (tag, name, autoescape)
+        try:
+            return state.tags[key]
+        except KeyError:
+            formatted = state.tags[key] = format_tag(
+                tag,
+                state.urls[name],
+                autoescape,
+                integrity=state.integrity_hashes.get(name),
+            )
+            return formatted
+
+
+@with_context
 @with_environment
-def script_tag(url: str, *, environment: Environment) -> str:
-    """Wrap a URL in an HTML script tag."""
-    tag = '<script src="{}" type="text/javascript"></script>'
-    if environment.autoescape:
-        # We are deliberately forcing possible Markup strings to normal strings. We do
-        # not want markup in the middle of a script tag.
-        return Markup(tag).format(escape(str(url)))
-    return tag.format(html.escape(url))
+class ManifestStylesheetTag:  # pylint: disable=too-few-public-methods
+    """Wrap an asset in an HTML stylesheet tag, resolving its URL from an asset
+    manifest.
+
+    Args:
+        manifest: The `AssetManifest` to resolve asset names with.
+        once: If `True`, assets that have already been output during the current
+            render are replaced with an empty string. This can be overridden with
+            the `once` filter argument.
+    """
+
+    name = "stylesheet_tag"
+
+    def __init__(self, manifest: AssetManifest, *, once: bool = False):
+        self.manifest = manifest
+        self.once = once
+
+    @liquid_filter
+    def __call__(
+        self,
+        name: object,
+        *,
+        context: Context,
+        environment: Environment,
+        once: Optional[bool] = None,
+    ) -> str:
+        name = str(name)
+        if not emit_asset(
+            context,
+            self.manifest.url(name),
+            "style",
+            self.once if once is None else once,
+        ):
+            return ""
+        return self.manifest.tag(STYLESHEET_TAG, name, environment.autoescape)
+
+
+@with_context
+@with_environment
+class ManifestScriptTag:  # pylint: disable=too-few-public-methods
+    """Wrap an asset in an HTML script tag, resolving its URL from an asset
+    manifest.
+
+    Args:
+        manifest: The `AssetManifest` to resolve asset names with.
+        once: If `True`, assets that have already been output during the current
+            render are replaced with an empty string. This can be overridden with
+            the `once` filter argument.
+    """
+
+    name = "script_tag"
+
+    def __init__(self, manifest: AssetManifest, *, once: bool = False):
+        self.manifest = manifest
+        self.once = once
+
+    @liquid_filter
+    def __call__(
+        self,
+        name: object,
+        *,
+        context: Context,
+        environment: Environment,
+        once: Optional[bool] = None,
+    ) -> str:
+        name = str(name)
+        if not emit_asset(
+            context,
+            self.manifest.url(name),
+            "script",
+            self.once if once is None else once,
+        ):
+            return ""
+        return self.manifest.tag(SCRIPT_TAG, name, environment.autoescape)
@@ -0,0 +1,318 @@
+"""An output stage that collapses whitespace in HTML as it is rendered."""
+from __future__ import annotations
+
+import io
+import re
+from typing import Any
+from typing import List
+from typing import Match
+from typing import Optional
+from typing import TextIO
+
+from liquid import Context
+from liquid.template import BoundTemplate
+
+# Content of these elements is written verbatim.
+RAW_TEXT_ELEMENTS = ("pre", "textarea", "script", "style")
+
+RE_RAW_TEXT_OPEN = re.compile(
+    r"<(" + "|".join(RAW_TEXT_ELEMENTS) + r")(?=[ \t\n\r\f/>])", re.IGNORECASE
+)
+
+RE_RAW_TEXT_CLOSE = {
+    name: re.compile("</" + name, re.IGNORECASE) for name in RAW_TEXT_ELEMENTS
+}
+
+# A `<` that is not followed by one of these is text, not the start of a tag.
+RE_TAG_OPEN = re.compile(r"<[a-zA-Z/!?]")
+RE_TAG_SPECIAL = re.compile(r"[>\"']")
+
+# Runs of HTML whitespace. We deliberately don't use `\s`, which would match
+# non-breaking spaces.
+RE_NEWLINE_WHITESPACE = re.compile(r"[ \t\r\f]*\n[ \t\n\r\f]*")
+RE_WHITESPACE = re.compile(r"[ \t\r\f]{2,}|[\t\r\f]")
+
+# A complete tag, other than a comment.
+TAG = r"""<[a-zA-Z/!?][^>"']*(?:(?:"[^"]*"|'[^']*')[^>"']*)*>"""
+
+# Text and complete tags, stopping before anything that needs more context.
+RE_TEXT_AND_TAGS = re.compile(r"(?:[^<]+|<(?=[^a-zA-Z/!?])|" + TAG + r")*")
+
+# Tags are matched so they are skipped over when collapsing whitespace.
+RE_COLLAPSE = re.compile(
+    r"(" + TAG + r")|[ \t\r\f]*\n[ \t\n\r\f]*|[ \t\r\f]{2,}|[\t\r\f]"
+)
+
+# Comments and raw text elements are handled one step at a time.
+RE_SPECIAL = re.compile(
+    r"<!--|<(?:" + "|".join(RAW_TEXT_ELEMENTS) + r")(?=[ \t\n\r\f/>])",
+    re.IGNORECASE,
+)
+
+# The longest look ahead we need to decide what kind of markup follows a `<`.
+LOOKAHEAD = len("<textarea") + 1
+
+STATE_TEXT = 1
+STATE_TAG = 2
+STATE_COMMENT = 3
+STATE_RAW_TEXT = 4
+
+
+class HTMLMinifier(io.TextIOBase):
+    """A text stream that collapses runs of whitespace in HTML before writing them to
+    another text stream.
+
+    Whitespace outside of tags is collapsed to a single newline, if the run of
+    whitespace contained a newline, or a single space otherwise. Tags, comments and
+    the content of `pre`, `textarea`, `script` and `style` elements are written
+    unchanged.
+
+    Input is processed incrementally, so there is no second pass over rendered
+    output. A small amount of input can be held back while waiting for more
+    context. Call `finish` after the last write to flush it.
+
+    Args:
+        buffer: The text stream to write minified HTML to.
+    """
+
+    def __init__(self, buffer: TextIO):
+        super().__init__()
+        self.buffer = buffer
+        self._state = STATE_TEXT
+        # Unprocessed input held back from the last write.
+        self._pending = ""
+        # Collapsed whitespace held back from the last write, in case the next
+        # write starts with whitespace too.
+        self._whitespace = ""
+        # The quote character of the attribute value we're in, if any.
+        self._quote: Optional[str] = None
+        # The end tag we are looking for, when in a raw text element.
+        self._raw_end: Optional[re.Pattern[str]] = None
+        # The name of the raw text element whose start tag we are in, if any.
+        self._raw_name: Optional[str] = None
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        out: List[str] = []
+        self._process(self._pending + s, out, final=False)
+        if out:
+            self.buffer.write("".join(out))
+        return len(s)
+
+    def flush(self) -> None:
+        """Flush the underlying stream. Input held back by the minifier is not
+        written. Use `finish` for that.
+        """
+        self.buffer.flush()
+
+    def finish(self) -> None:
+        """Write any input held back by the minifier."""
+        out: List[str] = []
+        self._process(self._pending, out, final=True)
+        out.append(self._whitespace)
+        self._whitespace = ""
+        self.buffer.write("".join(out))
+
+    def getvalue(self) -> Any:
+        """Finish and return the value of the underlying buffer. The underlying
+        buffer must have a `getvalue` method, like `io.StringIO`.
+        """
+        self.finish()
+        return self.buffer.getvalue()  # type: ignore
+
+    def _process(self, data: str, out: List[str], final: bool) -> None:
+        self._pending = ""
+        pos = 0
+        end = len(data)
+
+        while pos < end:
+            if self._state == STATE_TEXT:
+                pos = self._process_text(data, pos, out, final)
+            elif self._state == STATE_TAG:
+                pos = self._process_tag(data, pos, out)
+            elif self._state == STATE_COMMENT:
+                pos = self._process_comment(data, pos, out, final)
+            else:
+                pos = self._process_raw_text(data, pos, out, final)
+
+            if pos < 0:
+                # Not enough input to decide what to do next.
+                self._pending = data[-pos - 1 :]
+                return
+
+    def _process_text(self, data: str, pos: int, out: List[str], final: bool) -> int:
+        # Fast path. Collapse whitespace in text and complete, ordinary tags in one
+        # go, up to the next comment or raw text element.
+        special = RE_SPECIAL.search(data, pos)
+        prefix = RE_TEXT_AND_TAGS.match(
+            data, pos, special.start() if special else len(data)
+        )
+        assert prefix is not None
+        if prefix.end() > pos:
+            self._carry_whitespace(RE_COLLAPSE.sub(_collapse, prefix.group()), out)
+            pos = prefix.end()
+            if pos == len(data):
+                return pos
+
+        match = RE_TAG_OPEN.search(data, pos)
+        if match is None:
+            # A trailing `<` might be the start of a tag.
+            if data.endswith("<") and not final:
+                self._text(data[pos:-1], out)
+                return -len(data)
+            self._text(data[pos:], out)
+            return len(data)
+
+        start = match.start()
+        self._text(data[pos:start], out)
+
+        if len(data) - start < LOOKAHEAD and not final:
+            return -start - 1
+
+        self._flush_whitespace(out)
+
+        if data.startswith("<!--", start):
+            self._state = STATE_COMMENT
+            out.append("<!--")
+            return start + 4
+
+        raw = RE_RAW_TEXT_OPEN.match(data, start)
+        if raw:
+            self._raw_name = raw.group(1).lower()
+
+        self._state = STATE_TAG
+        return start
+
+    def _process_tag(self, data: str, pos: int, out: List[str]) -> int:
+        while True:
+            if self._quote:
+                idx = data.find(self._quote, pos)
+                if idx == -1:
+                    out.append(data[pos:])
+                    return len(data)
+                out.append(data[pos : idx + 1])
+                pos = idx + 1
+                self._quote = None
+
+            match = RE_TAG_SPECIAL.search(data, pos)
+            if match is None:
+                out.append(data[pos:])
+                return len(data)
+
+            out.append(data[pos : match.end()])
+            pos = match.end()
+
+            char = match.group()
+            if char == ">":
+                if self._raw_name:
+                    self._raw_end = RE_RAW_TEXT_CLOSE[self._raw_name]
+                    self._raw_name = None
+                    self._state = STATE_RAW_TEXT
+                else:
+                    self._state = STATE_TEXT
+                return pos
+
+            self._quote = char
+
+    def _process_comment(self, data: str, pos: int, out: List[str], final: bool) -> int:
+        idx = data.find("-->", pos)
+        if idx == -1:
+            # Hold back anything that could be the start of `-->`.
+            return self._hold_back(data, pos, out, 0 if final else 2)
+
+        out.append(data[pos : idx + 3])
+        self._state = STATE_TEXT
+        return idx + 3
+
+    def _process_raw_text(
+        self, data: str, pos: int, out: List[str], final: bool
+    ) -> int:
+        assert self._raw_end is not None
+        match = self._raw_end.search(data, pos)
+        if match is None:
+            # Hold back anything that could be the start of the end tag.
+            return self._hold_back(
+                data, pos, out, 0 if final else len(self._raw_end.pattern) - 1
+            )
+
+        out.append(data[pos : match.start()])
+        self._raw_end = None
+        self._state = STATE_TAG
+        return match.start()
+
+    def _hold_back(self, data: str, pos: int, out: List[str], keep: int) -> int:
+        # Write everything from `pos` except the last `keep` characters, which are
+        # held back until the next write.
+        split = max(pos, len(data) - keep)
+        out.append(data[pos:split])
+        return len(data) if split == len(data) else -split - 1
+
+    def _text(self, text: str, out: List[str]) -> None:
+        if not text:
+            return
+
+        self._carry_whitespace(
+            RE_WHITESPACE.sub(" ", RE_NEWLINE_WHITESPACE.sub("\n", text)), out
+        )
+
+    def _carry_whitespace(self, text: str, out: List[str]) -> None:
+        # Merge leading whitespace with whitespace held back from the last write,
+        # and hold back trailing whitespace for the next write.
+        if self._whitespace:
+            if text[0] in " \n":
+                if self._whitespace == "\n":
+                    text = "\n" + text[1:]
+            else:
+                text = self._whitespace + text
+            self._whitespace = ""
+
+        if text[-1] in " \n":
+            self._whitespace = text[-1]
+            text = text[:-1]
+
+        out.append(text)
+
+    def _flush_whitespace(self, out: List[str]) -> None:
+        if self._whitespace:
+            out.append(self._whitespace)
+            self._whitespace = ""
+
+
+def _collapse(match: Match[str]) -> str:
+    tag = match.group(1)
+    if tag:
+        return tag
+    return "\n" if "\n" in match.group() else " "
+
+
+def render_minified(template: BoundTemplate, *args: Any, **kwargs: Any) -> str:
+    """Render a template, collapsing whitespace in its output with `HTMLMinifier`.
+
+    Accepts the same arguments as `BoundTemplate.render`. The environment's
+    `output_stream_limit`, if any, applies to minified output.
+    """
+    context = _make_context(template, *args, **kwargs)
+    minifier = HTMLMinifier(context.get_buffer())
+    template.render_with_context(context, minifier)  # type: ignore
+    return str(minifier.getvalue())
+
+
+async def render_minified_async(
+    template: BoundTemplate, *args: Any, **kwargs: Any
+) -> str:
+    """An async version of `render_minified`."""
+    context = _make_context(template, *args, **kwargs)
+    minifier = HTMLMinifier(context.get_buffer())
+    await template.render_with_context_async(context, minifier)  # type: ignore
+    return str(minifier.getvalue())
+
+
+def _make_context(template: BoundTemplate, *args: Any, **kwargs: Any) -> Context:
+    context: Context = template.context_class(
+        template.env,
+        globals=template.make_globals(dict(*args, **kwargs)),
+        template=template,
+    )
+    return context
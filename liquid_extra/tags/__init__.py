@@ -4,6 +4,7 @@
 from .if_not import IfNotTag as IfNotTag
 from .macro import MacroTag as MacroTag
 from .macro import CallTag as CallTag
+from .macro import ImportTag as ImportTag
 from .if_expressions import InlineIfStatement as InlineIfStatement
 from .if_expressions import InlineIfEchoTag as InlineIfEchoTag
 from .if_expressions import InlineIfAssignTag as InlineIfAssignTag
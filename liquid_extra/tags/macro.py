@@ -1,31 +1,58 @@
-"""Node and tag definitions for `macro` and `call`."""
+"""Node and tag definitions for `macro`, `call` and `import`."""
+# pylint: disable=too-many-lines
 from __future__ import annotations
 
+import asyncio
 import functools
 import itertools
 import sys
-
+import time
+import weakref
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from io import StringIO
+from io import TextIOBase
+
+from typing import Any
+from typing import Hashable
+from typing import Iterator
+from typing import Set
 from typing import Optional
 from typing import Tuple
 from typing import Dict
+from typing import FrozenSet
 from typing import List
+from typing import Mapping
 from typing import NamedTuple
 from typing import TextIO
+from typing import Type
 from typing import Union
+from typing import cast
 from typing import TYPE_CHECKING
 
+from liquid import Markup
+
 from liquid.ast import ChildNode
 from liquid.ast import Node
 from liquid.ast import BlockNode
 
 from liquid.context import is_undefined
 from liquid.context import Undefined
+from liquid.context import DebugUndefined
+from liquid.context import StrictUndefined
+from liquid.context import StrictDefaultUndefined
 from liquid.context import Context
 from liquid.context import ReadOnlyChainMap
+from liquid.context import builtin
 
 from liquid.expression import Expression
+from liquid.expression import Identifier
+from liquid.expression import IdentifierPathElement
 from liquid.expression import NIL
+from liquid.exceptions import ContextDepthError
 from liquid.exceptions import LiquidSyntaxError
+from liquid.exceptions import ResourceLimitError
 
 from liquid.lex import STRING_PATTERN
 from liquid.lex import _tokenize
@@ -40,6 +67,8 @@ from liquid.parse import parse_unchained_identifier
 from liquid.stream import TokenStream
 from liquid.tag import Tag
 
+from liquid.builtin.literal import LiteralNode
+from liquid.builtin.statement import StatementNode
 from liquid.builtin.tags.include_tag import TAG_INCLUDE
 
 from liquid.token import Token
@@ -64,13 +93,41 @@ from liquid.token import TOKEN_DOT
 from liquid.token import TOKEN_LBRACKET
 from liquid.token import TOKEN_RBRACKET
 
+from liquid_extra.context import render_state
+
 if TYPE_CHECKING:  # pragma: no cover
     from liquid import Environment
+    from liquid.template import BoundTemplate
 
 
 TAG_MACRO = sys.intern("macro")
 TAG_ENDMACRO = sys.intern("endmacro")
 TAG_CALL = sys.intern("call")
+TAG_IMPORT = sys.intern("import")
+
+# Types of argument values that can be part of a macro cache key. Instances are
+# immutable and compare by value.
+CACHE_KEY_TYPES: FrozenSet[type] = frozenset(
+    (str, Markup, int, float, bool, type(None), range)
+)
+
+# Templates that have had their calls linked to macros. See `link_macros`.
+_linked_templates: weakref.WeakSet[BoundTemplate] = weakref.WeakSet()
+
+# Render state keys for macro profiling.
+MACRO_PROFILE = "macro_profile"
+MACRO_CALLS = "macro_calls"
+
+# Render state key for string buffers reused by `call ... as`.
+MACRO_BUFFERS = "macro_buffers"
+
+# Render state key for macro call counts, checked against macro limits.
+MACRO_BUDGET = "macro_budget"
+
+# Undefined types with instances that depend on nothing but their name.
+STATELESS_UNDEFINED: FrozenSet[Type[Undefined]] = frozenset(
+    (Undefined, DebugUndefined, StrictUndefined, StrictDefaultUndefined)
+)
 
 
 class CallKeywordArg(NamedTuple):
@@ -87,11 +144,601 @@ class MacroArg(NamedTuple):
     default: Expression = NIL
 
 
+class MacroCacheInfo(NamedTuple):
+    """Statistics for a macro's output cache."""
+
+    hits: int
+    misses: int
+    bypassed: int
+    maxsize: int
+    currsize: int
+
+
+class MacroCache:
+    """A bounded, least recently used cache of a macro's rendered output, keyed on
+    the values of its arguments.
+
+    Args:
+        maxsize: The maximum number of outputs to keep.
+    """
+
+    __slots__ = ("maxsize", "hits", "misses", "bypassed", "_outputs")
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._outputs: OrderedDict[Hashable, str] = OrderedDict()
+
+    def key(
+        self, args: Dict[str, object], excess: Dict[str, Any]
+    ) -> Optional[Hashable]:
+        """Return a cache key for the given bound and excess arguments, or `None` if
+        any argument value can't be part of a key.
+
+        Only strings, numbers, booleans, `nil`, ranges and undefined values make
+        keys. Other hashable objects, like drops, usually hash by identity. Output
+        cached for them would never be hit by a later render, and the cache would
+        keep them alive.
+        """
+        values: List[object] = [*args.values(), *excess.get("args", ())]
+        for name, value in excess.get("kwargs", {}).items():
+            values.append(name)
+            values.append(value)
+
+        for val in values:
+            if type(val) not in CACHE_KEY_TYPES and not is_undefined(val):
+                self.bypassed += 1
+                return None
+
+        # Types are part of the key so `1`, `1.0` and `true` produce different
+        # entries. All undefined values of the same type render the same way.
+        return (
+            tuple(type(val) if is_undefined(val) else val for val in values),
+            tuple(type(val) for val in values),
+        )
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """Return the output cached for `key`, or `None` if there is none."""
+        try:
+            output = self._outputs[key]
+            self._outputs.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return output
+
+    def set(self, key: Hashable, output: str) -> None:
+        """Cache `output` for `key`, discarding the least recently used output if the
+        cache is full.
+        """
+        self._outputs[key] = output
+        while len(self._outputs) > self.maxsize:
+            self._outputs.popitem(last=False)
+
+    def info(self) -> MacroCacheInfo:
+        """Return statistics for this cache."""
+        return MacroCacheInfo(
+            hits=self.hits,
+            misses=self.misses,
+            bypassed=self.bypassed,
+            maxsize=self.maxsize,
+            currsize=len(self._outputs),
+        )
+
+    def clear(self) -> None:
+        """Discard all cached output and reset statistics."""
+        self._outputs.clear()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+
+class MacroReferences(NamedTuple):
+    """Variable and filter names referenced by a macro's body."""
+
+    names: FrozenSet[str]
+    filters: FrozenSet[str]
+    # Names assigned or bound by tags in the macro's body.
+    bound: FrozenSet[str] = frozenset()
+
+
 class Macro(NamedTuple):
     """A macro block and its arguments."""
 
     args: List[MacroArg]
     block: BlockNode
+    cache: Optional[MacroCache] = None
+    inline: bool = False
+    # Names referenced by the macro's body, or `None` if we don't know.
+    references: Optional[MacroReferences] = None
+
+
+class BindingPlan(NamedTuple):
+    """A precomputed mapping of call arguments to macro parameters, for a call site
+    and a macro.
+
+    Every macro parameter the macro's body might reference is mapped to a positional
+    argument expression, a keyword argument expression or the parameter's default
+    expression. Parameters mapped to `None` are missing and will be bound to an
+    instance of `Undefined`. If `excess` is `False`, the macro's body does not
+    reference `args` or `kwargs`, and excess arguments are not evaluated.
+
+    `exprs` is `args` as a dictionary, for looking up arguments by name.
+    """
+
+    args: List[Tuple[str, Optional[Expression]]]
+    exprs: Dict[str, Optional[Expression]]
+    excess_args: List[Expression]
+    excess_kwargs: List[Tuple[str, Expression]]
+    excess: bool = True
+
+
+class LazyArguments(Mapping[str, object]):
+    """A read-only namespace of macro arguments that are evaluated when they are
+    first accessed, rather than when the macro is called.
+
+    Argument expressions are evaluated in the scope of the call, even if the render
+    context has since had a macro scope pushed on to it.
+
+    Args:
+        context: The render context at the call site.
+        plan: The binding plan for the call.
+    """
+
+    __slots__ = ("context", "plan", "evaluated", "scope", "loops")
+
+    def __init__(self, context: Context, plan: BindingPlan):
+        self.context = context
+        self.plan = plan
+        self.evaluated: Dict[str, object] = {}
+
+        # A macro scope replaces, rather than mutates, these.
+        self.scope = context.scope
+        self.loops = context.loops
+
+    def __getitem__(self, key: str) -> object:
+        try:
+            return self.evaluated[key]
+        except KeyError:
+            pass
+
+        if key not in self:
+            raise KeyError(key)
+
+        if key in self.plan.exprs and self.plan.exprs[key] is None:
+            value: object = missing_argument(self.context.env, key)
+            self.evaluated[key] = value
+            return value
+
+        context = self.context
+        scope, loops = context.scope, context.loops
+        context.scope, context.loops = self.scope, self.loops
+        try:
+            value = self._evaluate(key)
+        finally:
+            context.scope, context.loops = scope, loops
+
+        self.evaluated[key] = value
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.plan.exprs or (
+            self.plan.excess and key in ("args", "kwargs")
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        names = [name for name, _ in self.plan.args]
+        if self.plan.excess:
+            names.extend(name for name in ("args", "kwargs") if name not in names)
+        return iter(names)
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+    def _evaluate(self, key: str) -> object:
+        expr = self.plan.exprs.get(key)
+        if expr is not None:
+            return expr.evaluate(self.context)
+        if key == "args":
+            return [expr.evaluate(self.context) for expr in self.plan.excess_args]
+        return {
+            name: expr.evaluate(self.context) for name, expr in self.plan.excess_kwargs
+        }
+
+
+class MacroScope:
+    """A context manager that pushes a read-only namespace of macro arguments onto an
+    existing render context, restoring the context on exit.
+
+    A lightweight alternative to `Context.copy`. Inside the scope, the context has
+    its own local namespace, counters, loop stack and state for the `cycle`,
+    `ifchanged` and `tablerow` tags, and the `include` tag is disabled. Defined
+    macros and per-render state are shared with the caller, so macros can call
+    other macros.
+
+    Args:
+        context: The render context to push a scope onto.
+        namespace: Macro arguments and excess arguments.
+    """
+
+    __slots__ = ("context", "namespace", "saved", "saved_tag_state")
+
+    def __init__(self, context: Context, namespace: Mapping[str, object]):
+        self.context = context
+        self.namespace = namespace
+        self.saved: Tuple[Any, ...] = ()
+        self.saved_tag_state: Tuple[Any, ...] = ()
+
+    def __enter__(self) -> Context:
+        # pylint: disable=protected-access
+        context = self.context
+        if context._copy_depth > context.env.context_depth_limit:
+            raise ContextDepthError(
+                "maximum context depth reached, possible recursive macro call"
+            )
+
+        self.saved = (
+            context.locals,
+            context.globals,
+            context.counters,
+            context.scope,
+            context.loops,
+            context.disabled_tags,
+            context.loop_iteration_carry,
+            context.local_namespace_size_carry,
+        )
+
+        context.local_namespace_size_carry = context.get_size_of_locals()
+        context.locals = {}
+        context.globals = ReadOnlyChainMap(self.namespace, context.globals)
+        context.counters = {}
+        context.scope = ReadOnlyChainMap(
+            context.locals, context.globals, builtin, context.counters
+        )
+        context.loops = []
+        context.loop_iteration_carry = 1
+        context._copy_depth += 1
+
+        tag_namespace = context.tag_namespace
+        self.saved_tag_state = (
+            tag_namespace["cycles"],
+            tag_namespace["ifchanged"],
+            tag_namespace["stopindex"],
+        )
+        tag_namespace["cycles"] = {}
+        tag_namespace["ifchanged"] = ""
+        tag_namespace["stopindex"] = {}
+
+        if TAG_INCLUDE not in context.disabled_tags:
+            context.disabled_tags = [*context.disabled_tags, TAG_INCLUDE]
+
+        return context
+
+    def __exit__(self, *args: object) -> None:
+        # pylint: disable=protected-access
+        context = self.context
+        (
+            context.locals,
+            context.globals,
+            context.counters,
+            context.scope,
+            context.loops,
+            context.disabled_tags,
+            context.loop_iteration_carry,
+            context.local_namespace_size_carry,
+        ) = self.saved
+        context._copy_depth -= 1
+
+        tag_namespace = context.tag_namespace
+        (
+            tag_namespace["cycles"],
+            tag_namespace["ifchanged"],
+            tag_namespace["stopindex"],
+        ) = self.saved_tag_state
+
+
+class MacroStats:
+    """Call statistics for one macro.
+
+    Times are in seconds. `total_time` includes time spent in macros called from the
+    macro's body, `self_time` does not. `bind_time` is the part of `self_time` spent
+    binding arguments to parameters before rendering the macro's body. Arguments
+    that are evaluated lazily count towards the time of the macro that uses them.
+    `written` is the number of characters written by the macro, including the
+    output of nested calls.
+    """
+
+    __slots__ = ("calls", "total_time", "self_time", "bind_time", "written")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total_time = 0.0
+        self.self_time = 0.0
+        self.bind_time = 0.0
+        self.written = 0
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return (
+            f"MacroStats(calls={self.calls}, total_time={self.total_time:.6f}, "
+            f"self_time={self.self_time:.6f}, bind_time={self.bind_time:.6f}, "
+            f"written={self.written})"
+        )
+
+
+class MacroProfile:
+    """Call statistics for each macro, keyed by macro name."""
+
+    def __init__(self) -> None:
+        self.stats: Dict[str, MacroStats] = {}
+
+    def record(
+        self,
+        name: str,
+        *,
+        total_time: float,
+        self_time: float,
+        bind_time: float,
+        written: int,
+    ) -> None:
+        """Add a single call to the statistics for macro `name`."""
+        try:
+            stats = self.stats[name]
+        except KeyError:
+            stats = self.stats[name] = MacroStats()
+
+        stats.calls += 1
+        stats.total_time += total_time
+        stats.self_time += self_time
+        stats.bind_time += bind_time
+        stats.written += written
+
+    def clear(self) -> None:
+        """Discard all statistics."""
+        self.stats.clear()
+
+    def report(self) -> str:
+        """Return statistics as a plain text table, slowest macro first by self
+        time."""
+        lines = [
+            f"{'macro':<24} {'calls':>8} {'total ms':>10} {'self ms':>10} "
+            f"{'bind ms':>10} {'written':>10}"
+        ]
+        for name, stats in sorted(
+            self.stats.items(), key=lambda item: item[1].self_time, reverse=True
+        ):
+            lines.append(
+                f"{name:<24} {stats.calls:>8} {stats.total_time * 1e3:>10.3f} "
+                f"{stats.self_time * 1e3:>10.3f} {stats.bind_time * 1e3:>10.3f} "
+                f"{stats.written:>10}"
+            )
+        return "\n".join(lines)
+
+
+class MacroProfiler(MacroProfile):
+    """Collect macro call statistics over the lifetime of the profiler.
+
+    Profiling is disabled by default. Set `macro_profiler` to an instance of
+    `MacroProfiler` on an `Environment`, or an `Environment` subclass, to profile
+    every macro call rendered by that environment. Use `macro_profile` with a render
+    context to get statistics for a single render.
+    """
+
+    def call(self, context: Context, name: str, buffer: TextIO) -> MacroCall:
+        """Return a context manager that profiles a call to macro `name`."""
+        return MacroCall(
+            self,
+            profile=render_state(context, MACRO_PROFILE, MacroProfile),
+            calls=render_state(context, MACRO_CALLS, list),
+            name=name,
+            buffer=buffer,
+        )
+
+
+class MacroCall:  # pylint: disable=too-many-instance-attributes
+    """A context manager that times a single macro call and counts the characters
+    it writes, recording the results with a profiler and a per-render profile.
+    `calls` is the stack of active calls for the render.
+
+    Use `buffer` in place of the original output buffer while the call is active,
+    and call `bound` once arguments have been bound.
+    """
+
+    __slots__ = (
+        "profiler",
+        "profile",
+        "name",
+        "buffer",
+        "counter",
+        "offset",
+        "calls",
+        "start",
+        "bind_time",
+        "child_time",
+    )
+
+    def __init__(
+        self,
+        profiler: MacroProfiler,
+        *,
+        profile: MacroProfile,
+        calls: List[MacroCall],
+        name: str,
+        buffer: TextIO,
+    ):
+        self.profiler = profiler
+        self.profile = profile
+        self.calls = calls
+        self.name = name
+
+        # String buffers can tell us how much has been written. Anything else is
+        # wrapped so writes can be counted.
+        self.buffer: TextIO = buffer
+        self.counter: Optional[CountingWriter] = None
+        self.offset = 0
+        if isinstance(buffer, StringIO):
+            self.offset = buffer.tell()
+        else:
+            self.counter = CountingWriter(buffer)
+            self.buffer = cast(TextIO, self.counter)
+
+        self.start = 0.0
+        self.bind_time = 0.0
+        self.child_time = 0.0
+
+    def __enter__(self) -> MacroCall:
+        self.calls.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        total_time = time.perf_counter() - self.start
+
+        self.calls.pop()
+        if self.calls:
+            self.calls[-1].child_time += total_time
+
+        if self.counter is None:
+            written = self.buffer.tell() - self.offset
+        else:
+            written = self.counter.written
+
+        for profile in (self.profile, self.profiler):
+            profile.record(
+                self.name,
+                total_time=total_time,
+                self_time=total_time - self.child_time,
+                bind_time=self.bind_time,
+                written=written,
+            )
+
+    def bound(self) -> None:
+        """Record that arguments have been bound to the macro's parameters."""
+        self.bind_time = time.perf_counter() - self.start
+
+
+class CountingWriter(TextIOBase):
+    """A text stream that counts characters written to another text stream."""
+
+    def __init__(self, buffer: TextIO):
+        super().__init__()
+        self.buffer = buffer
+        self.written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self.written += len(s)
+        return self.buffer.write(s)
+
+
+def macro_profile(context: Context) -> MacroProfile:
+    """Return macro call statistics for the render using the given context.
+
+    Statistics are only collected if the environment has a `macro_profiler`.
+    """
+    return render_state(context, MACRO_PROFILE, MacroProfile)
+
+
+class MacroLimitError(ResourceLimitError):
+    """Base class for exceptions raised when a render goes over a macro limit."""
+
+
+class MacroDepthError(MacroLimitError):
+    """Exception raised when macro calls are nested too deeply."""
+
+
+class MacroCallLimitError(MacroLimitError):
+    """Exception raised when a render makes too many macro calls."""
+
+
+class MacroOutputLimitError(MacroLimitError):
+    """Exception raised when macro calls write too much output during a render."""
+
+
+class MacroLimits(NamedTuple):
+    """Per-render limits on macro calls. `None` means no limit.
+
+    `depth` is the maximum number of nested macro calls, `calls` is the maximum
+    number of macro calls and `output` is the maximum number of characters written
+    by top level macro calls, including the output of nested calls.
+    """
+
+    depth: Optional[int]
+    calls: Optional[int]
+    output: Optional[int]
+
+
+class MacroBudget:
+    """Per-render counts of macro calls, checked against `MacroLimits` as each call
+    is made."""
+
+    __slots__ = ("depth", "calls", "written")
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.calls = 0
+        self.written = 0
+
+    @contextmanager
+    def call(
+        self, limits: MacroLimits, buffer: TextIO, linenum: int
+    ) -> Iterator[TextIO]:
+        """Count a macro call, raising a `MacroLimitError` if it goes over a limit.
+
+        Yields the buffer the macro should write to.
+        """
+        self.calls += 1
+        if limits.calls is not None and self.calls > limits.calls:
+            raise MacroCallLimitError(
+                f"maximum number of macro calls reached ({limits.calls})",
+                linenum=linenum,
+            )
+
+        if limits.depth is not None and self.depth >= limits.depth:
+            raise MacroDepthError(
+                f"maximum macro call depth reached ({limits.depth})",
+                linenum=linenum,
+            )
+
+        # Nested calls write through the top level call's buffer.
+        if limits.output is not None and self.depth == 0:
+            buffer = cast(
+                TextIO, OutputLimitWriter(self, limits.output, buffer, linenum)
+            )
+
+        self.depth += 1
+        try:
+            yield buffer
+        finally:
+            self.depth -= 1
+
+
+class OutputLimitWriter(TextIOBase):
+    """A text stream that counts characters written to another text stream against
+    a macro output limit."""
+
+    def __init__(self, budget: MacroBudget, limit: int, buffer: TextIO, linenum: int):
+        super().__init__()
+        self.budget = budget
+        self.limit = limit
+        self.buffer = buffer
+        self.linenum = linenum
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self.budget.written += len(s)
+        if self.budget.written > self.limit:
+            raise MacroOutputLimitError(
+                f"maximum macro output size reached ({self.limit})",
+                linenum=self.linenum,
+            )
+        return self.buffer.write(s)
 
 
 macro_expression_rules = (
@@ -131,7 +778,7 @@ tokenize_macro_expression = functools.partial(
 class MacroNode(Node):
     """Parse tree node representing a macro."""
 
-    __slots__ = ("tok", "name", "args", "block")
+    __slots__ = ("tok", "name", "args", "block", "cache", "macro")
 
     def __init__(
         self,
@@ -139,11 +786,19 @@ class MacroNode(Node):
         name: str,
         args: List[MacroArg],
         block: BlockNode,
+        *,
+        cache: Optional[MacroCache] = None,
+        inline: bool = False,
     ):
         self.tok = tok
         self.name = name
         self.args = args
         self.block = block
+        self.cache = cache
+
+        # The same `Macro` is registered every time this node is rendered, so call
+        # sites can cache binding plans keyed by macro identity.
+        self.macro = Macro(args, block, cache, inline, analyze_macro_block(block))
 
     def __str__(self) -> str:  # pragma: no cover
         args: List[str] = []
@@ -161,7 +816,7 @@ class MacroNode(Node):
         if "macros" not in context.tag_namespace:
             context.tag_namespace["macros"] = {}
 
-        context.tag_namespace["macros"][self.name] = Macro(self.args, self.block)
+        context.tag_namespace["macros"][self.name] = self.macro
         return False
 
     def children(self) -> List[ChildNode]:
@@ -181,10 +836,20 @@ class MacroNode(Node):
         return _children
 
 
-class CallNode(Node):
+class CallNode(Node):  # pylint: disable=too-many-instance-attributes
     """Parse tree node representing a call to a macro."""
 
-    __slots__ = ("tok", "name", "args", "kwargs")
+    __slots__ = (
+        "tok",
+        "name",
+        "args",
+        "kwargs",
+        "target",
+        "limits",
+        "plans",
+        "macro",
+        "linked",
+    )
 
     def __init__(
         self,
@@ -192,23 +857,110 @@ class CallNode(Node):
         name: str,
         args: List[Expression],
         kwargs: List[CallKeywordArg],
+        *,
+        target: Optional[str] = None,
+        limits: Optional[MacroLimits] = None,
     ):
         self.tok = tok
         self.name = name
         self.args = args
         self.kwargs = kwargs
 
+        # The name of a variable to assign the macro's output to, instead of
+        # writing it to the output buffer.
+        self.target = target
+
+        # Per-render macro limits, or `None` if there are no limits.
+        self.limits = limits
+
+        # Binding plans keyed by macro identity. Holding a reference to each macro
+        # stops its id from being reused.
+        self.plans: Dict[int, Tuple[Macro, BindingPlan]] = {}
+
+        # The macro this call was linked to, if any, and whether the template this
+        # call belongs to has been linked.
+        self.macro: Optional[Macro] = None
+        self.linked = False
+
     def __str__(self) -> str:  # pragma: no cover
         args = [str(expr) for expr in self.args]
         for name, expr in self.kwargs:
             args.append(f"{name}: {expr}")
-        return f"{self.name}({', '.join(args)})"
+        call = f"{self.name}({', '.join(args)})"
+        return call if self.target is None else f"{call} as {self.target}"
 
     def __repr__(self) -> str:  # pragma: no cover
         return f"CallNode(tok={self.tok}, name={self.name})"
 
-    def _make_context(self, context: Context, macro: Macro) -> Context:
-        args = dict(macro.args)
+    def link(self, env: Environment, macro: Macro) -> None:
+        """Link this call to `macro`.
+
+        This is called at most once per call, with the template's finished parse
+        tree, so arguments are only checked against the macro the call is finally
+        linked to. A binding plan is made up front, so rendering doesn't have to.
+        """
+        self.macro = macro
+        self._check_arguments(env, macro)
+        self.plans[id(macro)] = (macro, self._resolve_plan(env, macro))
+
+    def _check_arguments(self, env: Environment, macro: Macro) -> None:
+        # Report arguments that could never be used, according to the environment's
+        # tolerance mode. Excess arguments are fine if the macro might reference
+        # `args` or `kwargs`.
+        params = [arg.name for arg in macro.args]
+        names = referenced_macro_names(env, macro)
+        linenum = self.tok.linenum
+
+        if len(self.args) > len(params) and names is not None and "args" not in names:
+            env.error(
+                LiquidSyntaxError,
+                f"too many positional arguments for macro '{self.name}', "
+                f"expected at most {len(params)}, found {len(self.args)}",
+                linenum=linenum,
+            )
+
+        seen = set(params[: len(self.args)])
+        for name, _ in self.kwargs:
+            if name in seen:
+                env.error(
+                    LiquidSyntaxError,
+                    f"multiple values for argument '{name}' of macro '{self.name}'",
+                    linenum=linenum,
+                )
+            elif name not in params and names is not None and "kwargs" not in names:
+                env.error(
+                    LiquidSyntaxError,
+                    f"unexpected keyword argument '{name}' for macro '{self.name}'",
+                    linenum=linenum,
+                )
+            seen.add(name)
+
+    def _get_plan(self, context: Context, macro: Macro) -> BindingPlan:
+        entry = self.plans.get(id(macro))
+        if entry is None or entry[0] is not macro:
+            entry = self.plans[id(macro)] = (
+                macro,
+                self._resolve_plan(context.env, macro),
+            )
+        return entry[1]
+
+    def _resolve_plan(self, env: Environment, macro: Macro) -> BindingPlan:
+        plan = self._make_plan(macro)
+        names = referenced_macro_names(env, macro)
+        if names is not None:
+            # Skip arguments the macro's body never references.
+            args = [(name, expr) for name, expr in plan.args if name in names]
+            plan = BindingPlan(
+                args=args,
+                exprs=dict(args),
+                excess_args=plan.excess_args,
+                excess_kwargs=plan.excess_kwargs,
+                excess="args" in names or "kwargs" in names,
+            )
+        return plan
+
+    def _make_plan(self, macro: Macro) -> BindingPlan:
+        args: Dict[str, Expression] = dict(macro.args)
         macro_names = [arg.name for arg in macro.args]
 
         # Bind positional arguments to names. If there are more positional arguments
@@ -236,27 +988,88 @@ class CallNode(Node):
             else:
                 excess_kwargs[name] = expr
 
-        excess: Dict[str, object] = {
-            "kwargs": {
-                name: expr.evaluate(context) for name, expr in excess_kwargs.items()
-            },
-            "args": [expr.evaluate(context) for expr in excess_args],
+        bindings = [
+            (name, None if expr == NIL else expr) for name, expr in args.items()
+        ]
+        return BindingPlan(
+            args=bindings,
+            exprs=dict(bindings),
+            excess_args=excess_args,
+            excess_kwargs=list(excess_kwargs.items()),
+        )
+
+    def _bind(
+        self, context: Context, macro: Macro
+    ) -> Tuple[Dict[str, object], Dict[str, Any]]:
+        plan = self._get_plan(context, macro)
+
+        excess: Dict[str, Any] = {}
+        if plan.excess:
+            excess["kwargs"] = {
+                name: expr.evaluate(context) for name, expr in plan.excess_kwargs
+            }
+            excess["args"] = [expr.evaluate(context) for expr in plan.excess_args]
+
+        # NOTE: default arguments are bound late.
+        bound_args: Dict[str, object] = {
+            name: (
+                missing_argument(context.env, name)
+                if expr is None
+                else expr.evaluate(context)
+            )
+            for name, expr in plan.args
         }
 
+        return bound_args, excess
+
+    async def _bind_async(
+        self, context: Context, macro: Macro
+    ) -> Tuple[Dict[str, object], Dict[str, Any]]:
+        plan = self._get_plan(context, macro)
+
+        exprs = [expr for _, expr in plan.args if expr is not None]
+        if plan.excess:
+            exprs.extend(plan.excess_args)
+            exprs.extend(expr for _, expr in plan.excess_kwargs)
+
+        # Evaluate arguments concurrently, so async drops passed to the same macro
+        # can wait for their data in parallel.
+        if len(exprs) > 1:
+            results = await asyncio.gather(
+                *[expr.evaluate_async(context) for expr in exprs]
+            )
+        else:
+            results = [await expr.evaluate_async(context) for expr in exprs]
+
+        values = iter(results)
+
         # NOTE: default arguments are bound late.
-        bound_args: Dict[str, object] = {}
-        for name, expr in args.items():
-            if expr == NIL:
-                bound_args[name] = context.env.undefined(name)
-            else:
-                assert isinstance(expr, Expression)
-                assert isinstance(name, str)
-                bound_args[name] = expr.evaluate(context)
+        bound_args: Dict[str, object] = {
+            name: missing_argument(context.env, name) if expr is None else next(values)
+            for name, expr in plan.args
+        }
+
+        excess: Dict[str, Any] = {}
+        if plan.excess:
+            excess["args"] = [next(values) for _ in plan.excess_args]
+            excess["kwargs"] = {name: next(values) for name, _ in plan.excess_kwargs}
+
+        return bound_args, excess
 
-        namespace = ReadOnlyChainMap(bound_args, excess)
-        return context.copy(namespace, disabled_tags=[TAG_INCLUDE])
+    def _make_namespace(self, context: Context, macro: Macro) -> ReadOnlyChainMap:
+        return ReadOnlyChainMap(*self._bind(context, macro))
 
     def _get_macro(self, context: Context) -> Union[Macro, Undefined]:
+        if not self.linked:
+            # Nodes from an included template or a macro library might not belong
+            # to the template being rendered. They are resolved by name.
+            if context.template is not None:
+                link_macros(context.template)
+            self.linked = True
+
+        if self.macro is not None:
+            return self.macro
+
         macro = context.tag_namespace.get("macros", {}).get(
             self.name, context.env.undefined(self.name)
         )
@@ -264,6 +1077,41 @@ class CallNode(Node):
         return macro
 
     def render_to_output(self, context: Context, buffer: TextIO) -> Optional[bool]:
+        if self.target is None:
+            return self._call(context, buffer)
+
+        buf = self._get_buffer(context, buffer)
+        try:
+            self._call(context, buf)
+            self._assign(context, buf)
+        finally:
+            self._release_buffer(context, buf)
+        return False
+
+    def _get_buffer(self, context: Context, buffer: TextIO) -> StringIO:
+        # Render into a string buffer reused between calls in the same render, unless
+        # output is limited. Limited buffers carry the size of `buffer`, so they can't
+        # be reused.
+        if context.env.output_stream_limit is not None:
+            return context.get_buffer(buffer)
+        buffers: List[StringIO] = render_state(context, MACRO_BUFFERS, list)
+        return buffers.pop() if buffers else StringIO()
+
+    def _release_buffer(self, context: Context, buf: StringIO) -> None:
+        if context.env.output_stream_limit is None:
+            buf.seek(0)
+            buf.truncate()
+            buffers: List[StringIO] = render_state(context, MACRO_BUFFERS, list)
+            buffers.append(buf)
+
+    def _assign(self, context: Context, buf: StringIO) -> None:
+        assert self.target is not None
+        if context.autoescape:
+            context.assign(self.target, Markup(buf.getvalue()))
+        else:
+            context.assign(self.target, buf.getvalue())
+
+    def _call(self, context: Context, buffer: TextIO) -> bool:
         macro = self._get_macro(context)
 
         if is_undefined(macro):
@@ -272,14 +1120,75 @@ class CallNode(Node):
 
         assert isinstance(macro, Macro)
 
-        ctx = self._make_context(context, macro)
-        macro.block.render(ctx, buffer)
+        if self.limits is None:
+            return self._profile(context, buffer, macro)
 
+        budget = render_state(context, MACRO_BUDGET, MacroBudget)
+        with budget.call(self.limits, buffer, self.tok.linenum) as buf:
+            return self._profile(context, buf, macro)
+
+    def _profile(self, context: Context, buffer: TextIO, macro: Macro) -> bool:
+        profiler: Optional[MacroProfiler] = getattr(context.env, "macro_profiler", None)
+        if profiler is None:
+            return self._render_macro(context, buffer, macro)
+
+        with profiler.call(context, self.name, buffer) as call:
+            return self._render_macro(context, call.buffer, macro, call=call)
+
+    def _render_macro(
+        self,
+        context: Context,
+        buffer: TextIO,
+        macro: Macro,
+        *,
+        call: Optional[MacroCall] = None,
+    ) -> bool:
+        if macro.cache is None and not macro.inline:
+            namespace = LazyArguments(context, self._get_plan(context, macro))
+            if call is not None:
+                call.bound()
+            with MacroScope(context, namespace) as ctx:
+                macro.block.render(ctx, buffer)
+            return True
+
+        args, excess = self._bind(context, macro)
+        if call is not None:
+            call.bound()
+
+        if macro.inline:
+            with context.extend(ReadOnlyChainMap(args, excess)):
+                macro.block.render(context, buffer)
+            return True
+
+        assert macro.cache is not None
+        key = macro.cache.key(args, excess)
+        output = None if key is None else macro.cache.get(key)
+        if output is None:
+            buf = StringIO()
+            with MacroScope(context, ReadOnlyChainMap(args, excess)) as ctx:
+                macro.block.render(ctx, buf)
+            output = buf.getvalue()
+            if key is not None:
+                macro.cache.set(key, output)
+
+        buffer.write(output)
         return True
 
     async def render_to_output_async(
         self, context: Context, buffer: TextIO
     ) -> Optional[bool]:
+        if self.target is None:
+            return await self._call_async(context, buffer)
+
+        buf = self._get_buffer(context, buffer)
+        try:
+            await self._call_async(context, buf)
+            self._assign(context, buf)
+        finally:
+            self._release_buffer(context, buf)
+        return False
+
+    async def _call_async(self, context: Context, buffer: TextIO) -> bool:
         macro = self._get_macro(context)
 
         if is_undefined(macro):
@@ -288,9 +1197,58 @@ class CallNode(Node):
 
         assert isinstance(macro, Macro)
 
-        ctx = self._make_context(context, macro)
-        await macro.block.render_async(ctx, buffer)
+        if self.limits is None:
+            return await self._profile_async(context, buffer, macro)
+
+        budget = render_state(context, MACRO_BUDGET, MacroBudget)
+        with budget.call(self.limits, buffer, self.tok.linenum) as buf:
+            return await self._profile_async(context, buf, macro)
+
+    async def _profile_async(
+        self, context: Context, buffer: TextIO, macro: Macro
+    ) -> bool:
+        profiler: Optional[MacroProfiler] = getattr(context.env, "macro_profiler", None)
+        if profiler is None:
+            return await self._render_macro_async(context, buffer, macro)
 
+        with profiler.call(context, self.name, buffer) as call:
+            return await self._render_macro_async(
+                context, call.buffer, macro, call=call
+            )
+
+    async def _render_macro_async(
+        self,
+        context: Context,
+        buffer: TextIO,
+        macro: Macro,
+        *,
+        call: Optional[MacroCall] = None,
+    ) -> bool:
+        args, excess = await self._bind_async(context, macro)
+        if call is not None:
+            call.bound()
+
+        if macro.inline:
+            with context.extend(ReadOnlyChainMap(args, excess)):
+                await macro.block.render_async(context, buffer)
+            return True
+
+        if macro.cache is None:
+            with MacroScope(context, ReadOnlyChainMap(args, excess)) as ctx:
+                await macro.block.render_async(ctx, buffer)
+            return True
+
+        key = macro.cache.key(args, excess)
+        output = None if key is None else macro.cache.get(key)
+        if output is None:
+            buf = StringIO()
+            with MacroScope(context, ReadOnlyChainMap(args, excess)) as ctx:
+                await macro.block.render_async(ctx, buf)
+            output = buf.getvalue()
+            if key is not None:
+                macro.cache.set(key, output)
+
+        buffer.write(output)
         return True
 
     def children(self) -> List[ChildNode]:
@@ -306,12 +1264,57 @@ class CallNode(Node):
         ]
 
 
+class ImportNode(Node):
+    """Parse tree node representing a macro library import."""
+
+    __slots__ = ("tok", "name", "libraries")
+
+    def __init__(self, tok: Token, name: str, libraries: MacroLibraries):
+        self.tok = tok
+        self.name = name
+        self.libraries = libraries
+
+    def __str__(self) -> str:  # pragma: no cover
+        return f"import({self.name})"
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return f"ImportNode(tok={self.tok}, name={self.name})"
+
+    def render_to_output(self, context: Context, buffer: TextIO) -> Optional[bool]:
+        macros = self.libraries.get(self.name)
+        context.tag_namespace.setdefault("macros", {}).update(macros)
+        return False
+
+    async def render_to_output_async(
+        self, context: Context, buffer: TextIO
+    ) -> Optional[bool]:
+        macros = await self.libraries.get_async(self.name)
+        context.tag_namespace.setdefault("macros", {}).update(macros)
+        return False
+
+    def children(self) -> List[ChildNode]:
+        return []
+
+
 class MacroTag(Tag):
     """Macro tag definition."""
 
     name = TAG_MACRO
     end = TAG_ENDMACRO
 
+    # The maximum number of outputs to cache for each macro using the `cache`
+    # modifier. Caches belong to the parsed template, so they are shared by every
+    # render of it, from any thread and with any render context. Output is keyed on
+    # argument values only, which is why cached macros that reference names other
+    # than their arguments are reported according to the environment's tolerance
+    # mode.
+    cache_size = 256
+
+    # Macros with no more than this many nodes in their body are candidates for
+    # inlining. Environments can override it with a `macro_inline_threshold`
+    # attribute. Zero disables inlining.
+    inline_threshold = 0
+
     def __init__(self, env: Environment):
         super().__init__(env)
         self.parser = get_parser(self.env)
@@ -322,7 +1325,21 @@ class MacroTag(Tag):
         stream.next_token()
 
         expect(stream, TOKEN_EXPRESSION)
-        expr_stream = TokenStream(tokenize_macro_expression(stream.current.value))
+        tokens = list(tokenize_macro_expression(stream.current.value))
+
+        # An optional `cache` modifier follows the argument list, without a comma.
+        # `{% macro 'name' cache %}` is a macro with an argument called `cache`.
+        cache: Optional[MacroCache] = None
+        if is_cache_modifier(tokens):
+            tokens.pop()
+            cache = MacroCache(self.cache_size)
+        cache_argument = (
+            len(tokens) == 2
+            and tokens[1].type == TOKEN_IDENTIFIER
+            and tokens[1].value == "cache"
+        )
+
+        expr_stream = TokenStream(iter(tokens))
 
         # Name of the macro. Must be a string literal
         expect(expr_stream, TOKEN_STRING)
@@ -351,7 +1368,60 @@ class MacroTag(Tag):
         block = self.parser.parse_block(stream, (TAG_ENDMACRO, TOKEN_EOF))
         expect(stream, TOKEN_TAG, value=TAG_ENDMACRO)
 
-        return MacroNode(tok=tok, name=name, args=args, block=block)
+        threshold = getattr(self.env, "macro_inline_threshold", self.inline_threshold)
+        node = MacroNode(
+            tok=tok,
+            name=name,
+            args=args,
+            block=block,
+            cache=cache,
+            inline=cache is None and can_inline(args, block, threshold),
+        )
+        if cache_argument:
+            self._check_cache_argument(node)
+        if cache is not None and not self._check_cache(node):
+            # Output that might depend on more than the macro's arguments is never
+            # cached, even if the environment's tolerance mode lets it through.
+            node = MacroNode(
+                tok=tok,
+                name=name,
+                args=args,
+                block=block,
+                inline=can_inline(args, block, threshold),
+            )
+        return node
+
+    def _check_cache_argument(self, node: MacroNode) -> None:
+        # Report a `cache` argument that looks like it was meant to be a modifier,
+        # according to the environment's tolerance mode.
+        names = referenced_macro_names(self.env, node.macro)
+        if names is not None and "cache" not in names:
+            self.env.error(
+                LiquidSyntaxError,
+                f"macro '{node.name}' never uses its 'cache' argument, "
+                "the cache modifier must follow another argument",
+                linenum=node.tok.linenum,
+            )
+
+    def _check_cache(self, node: MacroNode) -> bool:
+        # Report cached macros that might output stale content, according to the
+        # environment's tolerance mode. Returns `True` if the macro is safe to cache.
+        names = unbound_macro_names(self.env, node.macro)
+        if names is None:
+            msg = "might reference names other than its arguments"
+        elif names:
+            msg = "references names other than its arguments: " + ", ".join(
+                repr(name) for name in sorted(names)
+            )
+        else:
+            return True
+
+        self.env.error(
+            LiquidSyntaxError,
+            f"cached macro '{node.name}' {msg}",
+            linenum=node.tok.linenum,
+        )
+        return False
 
 
 class CallTag(Tag):
@@ -360,13 +1430,28 @@ class CallTag(Tag):
     name = TAG_CALL
     block = False
 
+    # Per-render limits on nested macro calls, total macro calls and characters
+    # written by macro calls. Environments can override them with
+    # `macro_depth_limit`, `macro_call_limit` and `macro_output_limit` attributes.
+    # `None` means no limit.
+    depth_limit: Optional[int] = None
+    call_limit: Optional[int] = None
+    output_limit: Optional[int] = None
+
     def parse(self, stream: TokenStream) -> CallNode:
         expect(stream, TOKEN_TAG, value=TAG_CALL)
         tok = stream.current
-
         stream.next_token()
         expect(stream, TOKEN_EXPRESSION)
-        expr_stream = TokenStream(tokenize_macro_expression(stream.current.value))
+        tokens = list(tokenize_macro_expression(stream.current.value))
+
+        # An optional `as <name>` target follows the argument list, without a comma.
+        target: Optional[str] = None
+        if is_call_target(tokens):
+            target = tokens.pop().value
+            tokens.pop()
+
+        expr_stream = TokenStream(iter(tokens))
 
         # Name of the macro. Must be a string literal
         expect(expr_stream, TOKEN_STRING)
@@ -400,7 +1485,470 @@ class CallTag(Tag):
                     linenum=tok.linenum,
                 )
 
-        return CallNode(tok=tok, name=name, args=args, kwargs=kwargs)
+        return CallNode(
+            tok=tok,
+            name=name,
+            args=args,
+            kwargs=kwargs,
+            target=target,
+            limits=self._limits(),
+        )
+
+    def _limits(self) -> Optional[MacroLimits]:
+        limits = MacroLimits(
+            depth=getattr(self.env, "macro_depth_limit", self.depth_limit),
+            calls=getattr(self.env, "macro_call_limit", self.call_limit),
+            output=getattr(self.env, "macro_output_limit", self.output_limit),
+        )
+        if limits == (None, None, None):
+            return None
+        return limits
+
+
+class MacroLibrary(NamedTuple):
+    """A template loaded with the `import` tag and the macros it defines."""
+
+    template: BoundTemplate
+    macros: Dict[str, Macro]
+
+
+class MacroLibraries:
+    """Macro libraries loaded with the `import` tag, for one environment.
+
+    Each library is loaded and parsed once, then reused until its loader says it is
+    out of date. Library templates are never rendered.
+
+    Args:
+        env: The environment to load libraries from.
+    """
+
+    def __init__(self, env: Environment):
+        self.env = env
+        self.libraries: Dict[str, MacroLibrary] = {}
+
+    def get(self, name: str) -> Dict[str, Macro]:
+        """Return a mapping of macro names to macros defined in the template `name`.
+
+        Raises:
+            TemplateNotFound: If the template can not be found by the environment's
+                loader.
+        """
+        library = self.libraries.get(name)
+        if library is None or (
+            self._auto_reload and not library.template.is_up_to_date
+        ):
+            library = self._load(self.env.get_template(name))
+            self.libraries[name] = library
+        return library.macros
+
+    async def get_async(self, name: str) -> Dict[str, Macro]:
+        """An async version of `get`."""
+        library = self.libraries.get(name)
+        if library is None or (
+            self._auto_reload and not await library.template.is_up_to_date_async()
+        ):
+            library = self._load(await self.env.get_template_async(name))
+            self.libraries[name] = library
+        return library.macros
+
+    @property
+    def _auto_reload(self) -> bool:
+        # Environments without a template cache always report `auto_reload` as
+        # `False`, but reload every template anyway.
+        return self.env.cache is None or self.env.auto_reload
+
+    def _load(self, template: BoundTemplate) -> MacroLibrary:
+        link_macros(template)
+        return MacroLibrary(
+            template=template,
+            macros={
+                node.name: node.macro
+                for node in template.tree.statements
+                if isinstance(node, MacroNode)
+            },
+        )
+
+
+class ImportTag(Tag):
+    """Import tag definition."""
+
+    name = TAG_IMPORT
+    block = False
+
+    def __init__(self, env: Environment):
+        super().__init__(env)
+        self.libraries = MacroLibraries(env)
+
+    def parse(self, stream: TokenStream) -> ImportNode:
+        expect(stream, TOKEN_TAG, value=TAG_IMPORT)
+        tok = stream.current
+
+        stream.next_token()
+        expect(stream, TOKEN_EXPRESSION)
+        expr_stream = TokenStream(tokenize_macro_expression(stream.current.value))
+
+        # Name of the library template. Must be a string literal
+        expect(expr_stream, TOKEN_STRING)
+        name = parse_string_literal(expr_stream).value
+        expr_stream.next_token()
+        expect(expr_stream, TOKEN_EOF)
+
+        return ImportNode(tok=tok, name=name, libraries=self.libraries)
+
+
+def is_cache_modifier(tokens: List[Token]) -> bool:
+    """Return `True` if the last of the given macro expression tokens is a `cache`
+    modifier, rather than part of an argument.
+
+    The modifier must follow an argument. An identifier that directly follows the
+    macro's name is always an argument.
+    """
+    return (
+        len(tokens) > 2
+        and tokens[-1].type == TOKEN_IDENTIFIER
+        and tokens[-1].value == "cache"
+        and tokens[-2].type
+        not in (TOKEN_COMMA, TOKEN_COLON, TOKEN_DOT, TOKEN_LBRACKET, TOKEN_NEGATIVE)
+    )
+
+
+def is_call_target(tokens: List[Token]) -> bool:
+    """Return `True` if the last three of the given call expression tokens are an
+    `as <name>` target, rather than part of an argument."""
+    return (
+        len(tokens) > 2
+        and tokens[-1].type == TOKEN_IDENTIFIER
+        and tokens[-2].type == TOKEN_IDENTIFIER
+        and tokens[-2].value == "as"
+        and tokens[-3].type
+        not in (TOKEN_COMMA, TOKEN_COLON, TOKEN_DOT, TOKEN_LBRACKET, TOKEN_NEGATIVE)
+    )
+
+
+def can_inline(args: List[MacroArg], block: BlockNode, threshold: int) -> bool:
+    """Return `True` if a macro's body can be rendered at the call site, without
+    giving it its own scope.
+
+    A macro can be inlined if its body has no more than `threshold` nodes, contains
+    only text and output statements, and those output statements only reference
+    the macro's arguments and don't use filters. Filters can be replaced or
+    registered after the macro is parsed, and some resolve names from the render
+    context.
+    """
+    if len(block.statements) > threshold:
+        return False
+
+    names = {arg.name for arg in args}
+    names.update(("args", "kwargs"))
+
+    for node in block.statements:
+        if isinstance(node, LiteralNode):
+            continue
+        if not isinstance(node, StatementNode):
+            return False
+        referenced: Set[str] = set()
+        filters: Set[str] = set()
+        if not collect_references(node.expression, referenced, filters):
+            return False
+        if filters or not referenced <= names:
+            return False
+    return True
+
+
+def collect_references(expr: Expression, names: Set[str], filters: Set[str]) -> bool:
+    """Add root variable names and filter names referenced by `expr` to `names` and
+    `filters`. Return `False` if an expression does not support static analysis."""
+    stack = [expr]
+    while stack:
+        expr = stack.pop()
+        if isinstance(expr, Identifier):
+            root = expr.path[0]
+            if not isinstance(root, IdentifierPathElement):
+                # A root that is itself a variable, like `{{ [key] }}`, could be
+                # any name.
+                return False
+            names.add(str(root.value))
+
+        for attr in ("filters", "tail_filters"):
+            for _filter in getattr(expr, attr, None) or ():
+                filters.add(_filter.name)
+
+        try:
+            stack.extend(expr.children())
+        except NotImplementedError:
+            return False
+    return True
+
+
+def analyze_macro_block(block: BlockNode) -> Optional[MacroReferences]:
+    """Return the variable and filter names referenced by a macro's body, or `None`
+    if we can't be sure which names the body might reference.
+
+    Calls to other macros and templates loaded with `render` see the calling macro's
+    arguments, so macros that use them can not be analyzed.
+    """
+    names: Set[str] = set()
+    filters: Set[str] = set()
+    bound: Set[str] = set()
+    stack: List[Node] = [block]
+
+    while stack:
+        node = stack.pop()
+        if isinstance(node, CallNode):
+            return None
+
+        try:
+            children = node.children()
+        except NotImplementedError:
+            return None
+
+        for child in children:
+            if child.load_mode:
+                return None
+            if child.expression is not None and not collect_references(
+                child.expression, names, filters
+            ):
+                return None
+            bound.update(getattr(child, "block_scope", None) or ())
+            bound.update(getattr(child, "template_scope", None) or ())
+            if child.node is not None:
+                stack.append(child.node)
+
+    return MacroReferences(frozenset(names), frozenset(filters), frozenset(bound))
+
+
+def referenced_macro_names(env: Environment, macro: Macro) -> Optional[FrozenSet[str]]:
+    """Return names a macro's body might reference, or `None` if it might reference
+    any name.
+
+    Filters decorated with `with_context` can resolve arbitrary names from the render
+    context, so macros that use them are treated as referencing every name.
+    """
+    references = macro.references
+    if references is None:
+        return None
+
+    for name in references.filters:
+        if getattr(env.filters.get(name), "with_context", False):
+            return None
+
+    return references.names
+
+
+def unbound_macro_names(env: Environment, macro: Macro) -> Optional[FrozenSet[str]]:
+    """Return names a macro's body might reference that are not its arguments and
+    are not assigned in its body, or `None` if it might reference any name.
+
+    A cached macro that references such names could output stale content, as
+    those names are not part of the cache key.
+    """
+    names = referenced_macro_names(env, macro)
+    if names is None:
+        return None
+
+    assert macro.references is not None
+    params = {arg.name for arg in macro.args}
+    params.update(("args", "kwargs"))
+    return names - params - macro.references.bound
+
+
+# Shared placeholders for missing macro arguments, by undefined type and name.
+_missing_arguments: Dict[Type[Undefined], Dict[str, Undefined]] = {}
+
+
+def missing_argument(env: Environment, name: str) -> Undefined:
+    """Return an instance of the environment's undefined type for the missing macro
+    argument `name`.
+
+    Instances of Python Liquid's built-in undefined types are created once per name
+    and shared between calls. Instances of other undefined types might carry state,
+    so a new one is created every time.
+    """
+    undefined = env.undefined
+    placeholders = _missing_arguments.get(undefined)
+    if placeholders is None:
+        if undefined not in STATELESS_UNDEFINED:
+            return undefined(name)
+        placeholders = _missing_arguments[undefined] = {}
+
+    try:
+        return placeholders[name]
+    except KeyError:
+        placeholder = placeholders[name] = undefined(name)
+        return placeholder
+
+
+def macro_cache_info(template: BoundTemplate) -> Dict[str, MacroCacheInfo]:
+    """Return output cache statistics for each macro defined in `template` using the
+    `cache` modifier, keyed by macro name."""
+    return {
+        node.name: node.cache.info()
+        for node in _walk(template.tree.statements)
+        if isinstance(node, MacroNode) and node.cache is not None
+    }
+
+
+def link_macros(template: BoundTemplate) -> None:
+    """Link `call` nodes in `template`'s parse tree to macros defined in the same
+    template.
+
+    A call is linked to a macro if exactly one macro with the call's name is defined
+    in the template, and that definition is at the top level of the template, not
+    inside another block or a `liquid` tag, whether it comes before or after the
+    call. Nothing is linked if the template imports or includes other templates, as
+    they might define macros too, or uses a tag that can't be analyzed. Other calls
+    are resolved by name at render time. Linked calls are checked against the
+    macro's parameters.
+
+    Templates are linked the first time one of their calls is rendered. Call this
+    after loading a template to check call arguments up front. Linking a template
+    more than once does nothing.
+    """
+    if template in _linked_templates:
+        return
+
+    macros: Dict[str, List[MacroNode]] = {}
+    calls: List[CallNode] = []
+    if _collect_links(template.tree.statements, macros, calls):
+        top_level = {
+            id(node) for node in template.tree.statements if isinstance(node, MacroNode)
+        }
+        for call in calls:
+            nodes = macros.get(call.name, [])
+            if len(nodes) == 1 and id(nodes[0]) in top_level:
+                call.link(template.env, nodes[0].macro)
+
+    for call in calls:
+        call.linked = True
+    _linked_templates.add(template)
+
+
+def _collect_links(
+    nodes: List[Node], macros: Dict[str, List[MacroNode]], calls: List[CallNode]
+) -> bool:
+    # Add every macro definition in `nodes` to `macros`, keyed by name, and every
+    # call to `calls`. Returns `False` if macros might be defined by other templates
+    # or by nodes that can't be analyzed.
+    for node in nodes:
+        if isinstance(node, ImportNode):
+            return False
+
+        if isinstance(node, MacroNode):
+            macros.setdefault(node.name, []).append(node)
+        elif isinstance(node, CallNode):
+            calls.append(node)
+
+        try:
+            children = node.children()
+        except NotImplementedError:
+            return False
+
+        if any(child.load_mode not in (None, "render") for child in children):
+            return False
+
+        if not _collect_links(
+            [child.node for child in children if child.node], macros, calls
+        ):
+            return False
+
+    return True
+
+
+def eliminate_dead_macros(template: BoundTemplate) -> int:
+    """Remove macros that are never called from `template`'s parse tree, returning
+    the number of macro definitions removed.
+
+    A macro is called if a `call` tag outside of any macro, or in the body of a
+    macro that is called, uses its name. Nothing is removed if `template` includes,
+    renders, extends or imports other templates, or uses a tag that can't be
+    analyzed, as its macros might be called from elsewhere.
+
+    Don't use this on templates that are imported as macro libraries.
+    """
+    roots: Set[str] = set()
+    calls: Dict[str, Set[str]] = {}
+    if not _collect_calls(template.tree.statements, roots, calls):
+        return 0
+
+    live: Set[str] = set()
+    stack = list(roots)
+    while stack:
+        name = stack.pop()
+        if name not in live:
+            live.add(name)
+            stack.extend(calls.get(name, ()))
+
+    return _prune(template.tree.statements, live)
+
+
+def _collect_calls(
+    nodes: List[Node], names: Set[str], calls: Dict[str, Set[str]]
+) -> bool:
+    # Add the names of macros called from `nodes` to `names`, and the names of
+    # macros called from each macro defined in `nodes` to `calls`. Returns `False`
+    # if calls can't be found statically.
+    for node in nodes:
+        if isinstance(node, ImportNode):
+            return False
+
+        if isinstance(node, MacroNode):
+            if not _collect_calls(
+                [node.block], calls.setdefault(node.name, set()), calls
+            ):
+                return False
+            continue
+
+        if isinstance(node, CallNode):
+            names.add(node.name)
+            continue
+
+        try:
+            children = node.children()
+        except NotImplementedError:
+            return False
+
+        if any(child.load_mode for child in children):
+            return False
+
+        if not _collect_calls(
+            [child.node for child in children if child.node], names, calls
+        ):
+            return False
+
+    return True
+
+
+def _prune(statements: List[Node], live: Set[str]) -> int:
+    # Remove definitions of macros that are not in `live` from `statements` and any
+    # blocks they contain, in place. Returns the number of definitions removed.
+    kept = [
+        node
+        for node in statements
+        if not isinstance(node, MacroNode) or node.name in live
+    ]
+    removed = len(statements) - len(kept)
+    statements[:] = kept
+
+    stack: List[Node] = list(kept)
+    while stack:
+        node = stack.pop()
+        for child in node.children():
+            if isinstance(child.node, BlockNode):
+                removed += _prune(child.node.statements, live)
+            elif child.node is not None:
+                stack.append(child.node)
+
+    return removed
+
+
+def _walk(nodes: List[Node]) -> Iterator[Node]:
+    for node in nodes:
+        yield node
+        try:
+            children = node.children()
+        except NotImplementedError:
+            continue
+        yield from _walk([child.node for child in children if child.node])
 
 
 def parse_macro_argument(stream: TokenStream) -> MacroArg:
@@ -0,0 +1,397 @@
+"""Micro benchmarks for extra tags, filters and output stages.
+
+Run all benchmarks with `make benchmark` or `python -O performance.py`. Pass one
+or more benchmark names to run a subset, like `python -O performance.py minify`.
+"""
+import argparse
+import io
+import timeit
+import tracemalloc
+
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import TextIO
+
+from liquid import Context
+from liquid import Environment
+from liquid import Undefined
+from liquid.builtin.tags.for_tag import ForNode
+from liquid.builtin.tags.include_tag import TAG_INCLUDE
+from liquid.stream import TokenStream
+
+from liquid_extra.minify import HTMLMinifier
+from liquid_extra.minify import render_minified
+from liquid_extra.tags import CallTag
+from liquid_extra.tags import MacroTag
+from liquid_extra.tags import WithTag
+from liquid_extra.tags.macro import CallNode
+from liquid_extra.tags.macro import Macro
+from liquid_extra.tags.macro import MacroNode
+from liquid_extra.tags.macro import eliminate_dead_macros
+
+
+def print_result(name: str, times: List[float], number: int) -> None:
+    """Print the best of `times` as a per-iteration figure."""
+    best = min(times)
+    print(f"{name:>36}: {best:.4f}s for {number} ({best / number * 1e6:.2f}µs each)")
+
+
+def benchmark_minify(repeat: int = 5, number: int = 500) -> None:
+    """Compare rendering with and without the streaming HTML minifier."""
+    env = Environment()
+    env.add_tag(MacroTag)
+    env.add_tag(CallTag)
+    env.add_tag(WithTag)
+
+    template = env.from_string(
+        "{% macro 'card', product %}\n"
+        "      <div class='card'>\n"
+        "        <h2>\n          {{ product.title }}\n        </h2>\n"
+        "        <p>\n          {{ product.description }}\n        </p>\n"
+        "        <pre>  {{ product.sku }}  </pre>\n"
+        "      </div>\n"
+        "{% endmacro %}\n"
+        "<html>\n  <body>\n"
+        "    {% for product in products %}\n"
+        "      {% with p: product %}\n"
+        "        {% call 'card', p %}\n"
+        "      {% endwith %}\n"
+        "    {% endfor %}\n"
+        "  </body>\n</html>\n"
+    )
+
+    products = [
+        {
+            "title": f"Product {i}",
+            "description": "Some   description  text.",
+            "sku": f"SKU-{i:04d}",
+        }
+        for i in range(50)
+    ]
+
+    plain = template.render(products=products)
+    minified = render_minified(template, products=products)
+    saved = len(plain) - len(minified)
+
+    print("minify")
+    print(
+        f"{'bytes':>36}: {len(plain)} -> {len(minified)} "
+        f"({saved} saved, {saved / len(plain):.1%})"
+    )
+
+    print_result(
+        "render",
+        timeit.repeat(
+            lambda: template.render(products=products), repeat=repeat, number=number
+        ),
+        number,
+    )
+    print_result(
+        "render minified",
+        timeit.repeat(
+            lambda: render_minified(template, products=products),
+            repeat=repeat,
+            number=number,
+        ),
+        number,
+    )
+
+    def minify_string() -> None:
+        minifier = HTMLMinifier(io.StringIO())
+        minifier.write(plain)
+        minifier.getvalue()
+
+    times = timeit.repeat(minify_string, repeat=repeat, number=number)
+    print_result("minify only", times, number)
+    print(
+        f"{'minify throughput':>36}: "
+        f"{len(plain) * number / min(times) / 1e6:.2f}M characters/s"
+    )
+
+
+class CopyingCallNode(CallNode):
+    """A `call` node that renders macros in a copy of the render context, as `call`
+    did before macro scopes. Used for comparison only."""
+
+    def render_to_output(self, context: Context, buffer: TextIO) -> Optional[bool]:
+        macro = self._get_macro(context)
+        assert isinstance(macro, Macro)
+        namespace = self._make_namespace(context, macro)
+        ctx = context.copy(namespace, disabled_tags=[TAG_INCLUDE])
+        macro.block.render(ctx, buffer)
+        return True
+
+
+class CopyingCallTag(CallTag):
+    """A `call` tag that parses to a `CopyingCallNode`."""
+
+    def parse(self, stream: TokenStream) -> CallNode:
+        node = super().parse(stream)
+        return CopyingCallNode(node.tok, node.name, node.args, node.kwargs)
+
+
+def call_peak_memory(env: Environment) -> int:
+    """Return the peak memory allocated while rendering a single `call` tag, after
+    warming up."""
+    template = env.from_string(
+        "{% macro 'price', amount, currency: 'GBP' %}"
+        "{{ amount }} {{ currency }}"
+        "{% endmacro %}"
+        "{% call 'price', 42 %}"
+    )
+    macro_node, call_node = template.tree.statements
+    context = Context(env, globals=template.make_globals({}))
+    buffer = io.StringIO()
+    macro_node.render(context, buffer)
+    call_node.render(context, buffer)
+
+    tracemalloc.start()
+    tracemalloc.clear_traces()
+    call_node.render(context, buffer)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def benchmark_macro_call(repeat: int = 5, number: int = 200) -> None:
+    """Compare calling macros in a scope pushed onto the current render context with
+    calling macros in a copy of the render context."""
+    source = (
+        "{% macro 'price', amount, currency: 'GBP' %}"
+        "{{ amount }} {{ currency }}"
+        "{% endmacro %}"
+        "{% for product in products %}"
+        "{% call 'price', product.price %}"
+        "{% endfor %}"
+    )
+
+    products = [{"price": i} for i in range(100)]
+    calls = len(products)
+
+    print("macro call")
+    for name, call_tag in (("scope", CallTag), ("copy", CopyingCallTag)):
+        env = Environment()
+        env.add_tag(MacroTag)
+        env.add_tag(call_tag)
+        template = env.from_string(source)
+
+        times = timeit.repeat(
+            lambda: template.render(products=products),  # pylint: disable=W0640
+            repeat=repeat,
+            number=number,
+        )
+        print(f"{name:>36}: {calls * number / min(times):,.0f} calls/s")
+
+        print(
+            f"{name + ' peak allocation':>36}: {call_peak_memory(env)} bytes per call"
+        )
+
+
+class InliningEnvironment(Environment):
+    """An environment that inlines small macros."""
+
+    macro_inline_threshold = 10
+
+
+def benchmark_macro_inline(repeat: int = 5, number: int = 200) -> None:
+    """Compare calling small macros with and without inlining."""
+    source = (
+        "{% macro 'icon', name, size: 16 %}"
+        "<svg class='icon icon-{{ name }}' width='{{ size }}'></svg>"
+        "{% endmacro %}"
+        "{% for name in names %}"
+        "{% call 'icon', name %}"
+        "{% endfor %}"
+    )
+
+    names = [f"icon-{i % 12}" for i in range(100)]
+    calls = len(names)
+
+    print("macro inline")
+    for name, env in (("scope", Environment()), ("inline", InliningEnvironment())):
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+        template = env.from_string(source)
+
+        times = timeit.repeat(
+            lambda: template.render(names=names),  # pylint: disable=W0640
+            repeat=repeat,
+            number=number,
+        )
+        print(f"{name:>36}: {calls * number / min(times):,.0f} calls/s")
+
+
+def time_bind(env: Environment, source: str, repeat: int, number: int) -> List[float]:
+    """Time binding arguments to parameters, without rendering the macro, for the
+    first macro and `call` tag in a `for` loop in `source`."""
+    template = env.from_string(source)
+    macro_node, for_node = template.tree.statements
+    assert isinstance(macro_node, MacroNode)
+    assert isinstance(for_node, ForNode)
+    call_node = for_node.block.statements[0]
+    assert isinstance(call_node, CallNode)
+
+    context = Context(env, globals=template.make_globals({"name": "x"}))
+    return timeit.repeat(
+        lambda: call_node._make_namespace(  # pylint: disable=protected-access
+            context, macro_node.macro
+        ),
+        repeat=repeat,
+        number=number,
+    )
+
+
+def benchmark_call_as(repeat: int = 5, number: int = 200) -> None:
+    """Compare capturing macro output with `capture` and with `call ... as`."""
+    macro = (
+        "{% macro 'card', product %}"
+        "<div class='card'><h2>{{ product.title }}</h2></div>"
+        "{% endmacro %}"
+    )
+    sources = (
+        (
+            "capture",
+            macro + "{% for p in products %}"
+            "{% capture card_html %}{% call 'card', p %}{% endcapture %}"
+            "{{ card_html }}{% endfor %}",
+        ),
+        (
+            "call as",
+            macro + "{% for p in products %}"
+            "{% call 'card', p as card_html %}"
+            "{{ card_html }}{% endfor %}",
+        ),
+    )
+
+    products = [{"title": f"Product {i}"} for i in range(100)]
+    calls = len(products)
+
+    env = Environment()
+    env.add_tag(MacroTag)
+    env.add_tag(CallTag)
+
+    print("macro call as")
+    for name, source in sources:
+        template = env.from_string(source)
+        times = timeit.repeat(
+            lambda: template.render(products=products),  # pylint: disable=W0640
+            repeat=repeat,
+            number=number,
+        )
+        print(f"{name:>36}: {calls * number / min(times):,.0f} calls/s")
+
+
+def benchmark_dead_macros(repeat: int = 5, number: int = 500) -> None:
+    """Compare rendering a template that defines many macros but calls few of them,
+    with and without dead macro elimination."""
+    macros = "".join(
+        f"{{% macro 'macro_{i}', a, b: 1 %}}<div>{{{{ a }}}} {{{{ b }}}}</div>"
+        "{% endmacro %}"
+        for i in range(40)
+    )
+    calls = "{% call 'macro_1', 'x' %}{% call 'macro_2', 'y' %}"
+    source = macros + calls
+
+    env = Environment()
+    env.add_tag(MacroTag)
+    env.add_tag(CallTag)
+
+    print("dead macros")
+    for name, eliminate in (("all macros", False), ("dead macros removed", True)):
+        # Memory still allocated after parsing, with the template alive.
+        tracemalloc.start()
+        template = env.from_string(source)
+        if eliminate:
+            eliminate_dead_macros(template)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        times = timeit.repeat(template.render, repeat=repeat, number=number)
+        print_result(name, times, number)
+        print(f"{name + ' parsed size':>36}: {size} bytes")
+
+
+class PerCallUndefined(Undefined):
+    """An undefined type that is not shared between missing macro arguments."""
+
+
+def benchmark_macro_optional(repeat: int = 5, number: int = 200) -> None:
+    """Compare calling a macro with many missing optional parameters with shared and
+    per call undefined placeholders."""
+    params = [
+        "label",
+        "value",
+        "placeholder",
+        "hint",
+        "error",
+        "required",
+        "disabled",
+        "readonly",
+        "autocomplete",
+        "pattern",
+        "min",
+        "max",
+        "step",
+        "class",
+    ]
+    source = (
+        "{% macro 'field', name, " + ", ".join(f"{p}: nil" for p in params) + " %}"
+        "<input name='{{ name }}'"
+        + "".join(f"{{% if {p} %}} {p}='{{{{ {p} }}}}'{{% endif %}}" for p in params)
+        + ">"
+        "{% endmacro %}"
+        "{% for name in names %}"
+        "{% call 'field', name, label: name %}"
+        "{% endfor %}"
+    )
+
+    names = [f"field-{i}" for i in range(50)]
+    calls = len(names)
+
+    print("macro optional parameters")
+    for name, undefined in (("shared", Undefined), ("per call", PerCallUndefined)):
+        env = Environment(undefined=undefined)
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+        template = env.from_string(source)
+
+        times = timeit.repeat(
+            lambda: template.render(names=names),  # pylint: disable=W0640
+            repeat=repeat,
+            number=number,
+        )
+        print(f"{name:>36}: {calls * number / min(times):,.0f} calls/s")
+
+        times = time_bind(env, source, repeat=repeat, number=number * calls)
+        print(f"{name + ' bind':>36}: {calls * number / min(times):,.0f} calls/s")
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "macro": benchmark_macro_call,
+    "inline": benchmark_macro_inline,
+    "optional": benchmark_macro_optional,
+    "call_as": benchmark_call_as,
+    "dead": benchmark_dead_macros,
+    "minify": benchmark_minify,
+}
+
+
+def main() -> None:
+    """Run the named benchmarks, or all of them."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("names", nargs="*", help=", ".join(BENCHMARKS))
+    args = parser.parse_args()
+
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name!r}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Test cases for the `bisect` and `sorted_index` filters."""
+# pylint: disable=missing-class-docstring,missing-function-docstring
+
+from liquid import Environment
+from liquid.exceptions import FilterArgumentError
+from liquid.exceptions import FilterValueError
+from liquid.loaders import DictLoader
+
+from liquid_extra.filters import bisect
+from liquid_extra.filters import sorted_index
+
+from .base import FilterTestCase
+from .base import RenderFilterTestCase
+from .base import Case
+from .base import RenderCase
+
+PRODUCTS = [
+    {"title": "foo", "price": 5},
+    {"title": "bar", "price": 10},
+    {"title": "baz", "price": 10},
+    {"title": "qux", "price": 20},
+]
+
+# Items without a price sort first.
+UNPRICED = [{"title": "gift"}, {"title": "sample"}, *PRODUCTS]
+
+
+class BisectFilterTestCase(FilterTestCase):
+    """Test the bisect template filter."""
+
+    def test_bisect_filter(self) -> None:
+        test_cases = [
+            Case(
+                description="insertion point",
+                val=[0, 50, 100],
+                args=[75],
+                kwargs={},
+                expect=2,
+            ),
+            Case(
+                description="existing item inserts before",
+                val=[0, 50, 50, 100],
+                args=[50],
+                kwargs={},
+                expect=1,
+            ),
+            Case(
+                description="existing item inserts after",
+                val=[0, 50, 50, 100],
+                args=[50],
+                kwargs={"right": True},
+                expect=3,
+            ),
+            Case(
+                description="before all items",
+                val=[0, 50, 100],
+                args=[-1],
+                kwargs={},
+                expect=0,
+            ),
+            Case(
+                description="after all items",
+                val=[0, 50, 100],
+                args=[101],
+                kwargs={},
+                expect=3,
+            ),
+            Case(
+                description="empty array",
+                val=[],
+                args=[1],
+                kwargs={},
+                expect=0,
+            ),
+            Case(
+                description="range",
+                val=range(0, 100, 10),
+                args=[35],
+                kwargs={},
+                expect=4,
+            ),
+            Case(
+                description="by property",
+                val=PRODUCTS,
+                args=[10, "price"],
+                kwargs={},
+                expect=1,
+            ),
+            Case(
+                description="by property inserts after",
+                val=PRODUCTS,
+                args=[10, "price"],
+                kwargs={"right": True},
+                expect=3,
+            ),
+            Case(
+                description="by property insertion point",
+                val=PRODUCTS,
+                args=[15, "price"],
+                kwargs={},
+                expect=3,
+            ),
+            Case(
+                description="by property with missing properties",
+                val=UNPRICED,
+                args=[10, "price"],
+                kwargs={},
+                expect=3,
+            ),
+            Case(
+                description="by property with missing properties inserts after",
+                val=UNPRICED,
+                args=[10, "price"],
+                kwargs={"right": True},
+                expect=5,
+            ),
+            Case(
+                description="by property before all items with the property",
+                val=UNPRICED,
+                args=[1, "price"],
+                kwargs={},
+                expect=2,
+            ),
+            Case(
+                description="incomparable items",
+                val=[1, 2, 3],
+                args=["2"],
+                kwargs={},
+                expect=FilterArgumentError,
+            ),
+            Case(
+                description="not an array",
+                val="abc",
+                args=["b"],
+                kwargs={},
+                expect=FilterValueError,
+            ),
+        ]
+
+        self.env.add_filter("bisect", bisect)
+        self._test(self.ctx.filter("bisect"), test_cases)
+
+
+class SortedIndexFilterTestCase(FilterTestCase):
+    """Test the sorted_index template filter."""
+
+    def test_sorted_index_filter(self) -> None:
+        test_cases = [
+            Case(
+                description="array of strings",
+                val=["a", "b", "c", "d"],
+                args=["c"],
+                kwargs={},
+                expect=2,
+            ),
+            Case(
+                description="item does not exist",
+                val=["a", "b", "d"],
+                args=["c"],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="after all items",
+                val=["a", "b", "d"],
+                args=["z"],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="first of many",
+                val=[1, 2, 2, 2, 3],
+                args=[2],
+                kwargs={},
+                expect=1,
+            ),
+            Case(
+                description="by property",
+                val=PRODUCTS,
+                args=[20, "price"],
+                kwargs={},
+                expect=3,
+            ),
+            Case(
+                description="by property first of many",
+                val=PRODUCTS,
+                args=[10, "price"],
+                kwargs={},
+                expect=1,
+            ),
+            Case(
+                description="by property does not exist",
+                val=PRODUCTS,
+                args=[15, "price"],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="by property with missing properties",
+                val=UNPRICED,
+                args=[10, "price"],
+                kwargs={},
+                expect=3,
+            ),
+            Case(
+                description="by property before all items with the property",
+                val=UNPRICED,
+                args=[1, "price"],
+                kwargs={},
+                expect=None,
+            ),
+        ]
+
+        self.env.add_filter("sorted_index", sorted_index)
+        self._test(self.ctx.filter("sorted_index"), test_cases)
+
+
+class RenderBisectFilterTestCase(RenderFilterTestCase):
+    """Test the bisect and sorted_index filters from a template."""
+
+    def test_render_bisect_filter(self) -> None:
+        test_cases = [
+            RenderCase(
+                description="nearest lower bound",
+                template=(
+                    r"{% assign i = breaks | bisect: 75, right: true | minus: 1 %}"
+                    r"{{ breaks[i] }}"
+                ),
+                expect="50",
+                globals={"breaks": [0, 50, 100]},
+                partials={},
+            ),
+            RenderCase(
+                description="by property",
+                template=r"{{ products | bisect: 15, 'price' }}",
+                expect="3",
+                globals={"products": PRODUCTS},
+                partials={},
+            ),
+            RenderCase(
+                description="by property keyword argument",
+                template=r"{{ products | bisect: 15, key: 'price' }}",
+                expect="3",
+                globals={"products": PRODUCTS},
+                partials={},
+            ),
+            RenderCase(
+                description="range literal",
+                template=r"{{ (1..10) | bisect: 5 }}",
+                expect="4",
+                globals={},
+                partials={},
+            ),
+            RenderCase(
+                description="undefined array",
+                template=r"{{ nosuchthing | bisect: 5 }}",
+                expect="0",
+                globals={},
+                partials={},
+            ),
+            RenderCase(
+                description="sorted index",
+                template=r"{{ dates | sorted_index: '2021-03-01' }}",
+                expect="1",
+                globals={"dates": ["2021-01-01", "2021-03-01", "2021-06-01"]},
+                partials={},
+            ),
+            RenderCase(
+                description="sorted index undefined array",
+                template=r"{{ nosuchthing | sorted_index: 5 }}",
+                expect="",
+                globals={},
+                partials={},
+            ),
+        ]
+
+        for case in test_cases:
+            env = Environment()
+            env.add_filter("bisect", bisect)
+            env.add_filter("sorted_index", sorted_index)
+            env.loader = DictLoader(case.partials)
+            template = env.from_string(case.template, globals=case.globals)
+
+            with self.subTest(msg=case.description):
+                result = template.render()
+                self.assertEqual(result, case.expect)
@@ -0,0 +1,171 @@
+"""Test cases for reporting cached macros that might output stale content."""
+# pylint: disable=missing-class-docstring,missing-function-docstring
+
+from typing import NamedTuple
+from typing import Optional
+
+from unittest import TestCase
+
+from liquid import Context
+from liquid import Environment
+from liquid.filter import with_context
+from liquid.mode import Mode
+from liquid.exceptions import LiquidSyntaxError
+from liquid.exceptions import LiquidSyntaxWarning
+
+from liquid_extra.tags import CallTag
+from liquid_extra.tags import MacroTag
+from liquid_extra.tags.macro import macro_cache_info
+
+
+@with_context
+def lookup(name: str, *, context: Context) -> object:
+    return context.resolve(name)
+
+
+class Case(NamedTuple):
+    description: str
+    template: str
+    error: Optional[str]
+
+
+class CachedMacroTestCase(TestCase):
+    test_cases = [
+        Case(
+            description="arguments only",
+            template=(
+                r"{% macro 'func', a, b: 'x' cache %}"
+                r"{{ a }}{{ b }}{{ args }}{{ kwargs }}"
+                r"{% endmacro %}"
+            ),
+            error=None,
+        ),
+        Case(
+            description="names assigned in the body",
+            template=(
+                r"{% macro 'func', a cache %}"
+                r"{% assign x = a | upcase %}{% capture y %}{{ x }}{% endcapture %}"
+                r"{% for c in a %}{{ c }}{{ forloop.index }}{% endfor %}{{ y }}"
+                r"{% endmacro %}"
+            ),
+            error=None,
+        ),
+        Case(
+            description="global variable",
+            template=r"{% macro 'func', a cache %}{{ site }}{{ a }}{% endmacro %}",
+            error=(
+                "cached macro 'func' references names other than its arguments: "
+                "'site', on line 1"
+            ),
+        ),
+        Case(
+            description="filter with context",
+            template=r"{% macro 'func', a cache %}{{ a | lookup }}{% endmacro %}",
+            error=(
+                "cached macro 'func' might reference names other than its "
+                "arguments, on line 1"
+            ),
+        ),
+        Case(
+            description="call to another macro",
+            template=r"{% macro 'func', a cache %}{% call 'other' %}{% endmacro %}",
+            error=(
+                "cached macro 'func' might reference names other than its "
+                "arguments, on line 1"
+            ),
+        ),
+        Case(
+            description="uncached macro",
+            template=r"{% macro 'func', a %}{{ site }}{% endmacro %}",
+            error=None,
+        ),
+    ]
+
+    def _env(self, mode: Mode) -> Environment:
+        env = Environment(tolerance=mode)
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+        env.add_filter("lookup", lookup)
+        return env
+
+    def test_strict(self) -> None:
+        """Test that we raise an error for unsafe cached macros in strict mode."""
+        env = self._env(Mode.STRICT)
+        for case in self.test_cases:
+            with self.subTest(msg=case.description):
+                if case.error is None:
+                    env.from_string(case.template)
+                else:
+                    with self.assertRaises(LiquidSyntaxError) as raised:
+                        env.from_string(case.template)
+                    self.assertEqual(str(raised.exception), case.error)
+
+    def test_warn(self) -> None:
+        """Test that we warn about unsafe cached macros in warn mode."""
+        env = self._env(Mode.WARN)
+        for case in self.test_cases:
+            with self.subTest(msg=case.description):
+                if case.error is not None:
+                    with self.assertWarns(LiquidSyntaxWarning):
+                        env.from_string(case.template)
+
+    def test_lax(self) -> None:
+        """Test that we don't cache unsafe macros in lax mode."""
+        env = self._env(Mode.LAX)
+        template = env.from_string(
+            r"{% macro 'func', a cache %}{{ site }}{{ a }}{% endmacro %}"
+            r"{% call 'func', 1 %}"
+        )
+        self.assertEqual(template.render(site="x"), "x1")
+        self.assertEqual(template.render(site="y"), "y1")
+        self.assertEqual(macro_cache_info(template), {})
+
+    def test_warn_does_not_cache(self) -> None:
+        """Test that we don't cache unsafe macros in warn mode."""
+        env = self._env(Mode.WARN)
+        with self.assertWarns(LiquidSyntaxWarning):
+            template = env.from_string(
+                r"{% macro 'func', a cache %}{{ site }}{{ a }}{% endmacro %}"
+                r"{% call 'func', 1 %}"
+            )
+        self.assertEqual(template.render(site="x"), "x1")
+        self.assertEqual(template.render(site="y"), "y1")
+
+    def test_drop_arguments(self) -> None:
+        """Test that arguments that hash by identity bypass the cache."""
+
+        class Drop:
+            def __str__(self) -> str:
+                return "drop"
+
+        env = self._env(Mode.STRICT)
+        template = env.from_string(
+            r"{% macro 'func', a cache %}{{ a }}{% endmacro %}"
+            r"{% call 'func', d %}{% call 'func', 'x' %}"
+        )
+        drop = Drop()
+        self.assertEqual(template.render(d=drop), "dropx")
+        self.assertEqual(template.render(d=drop), "dropx")
+
+        info = macro_cache_info(template)["func"]
+        self.assertEqual(info.bypassed, 2)
+        self.assertEqual(info.hits, 1)
+        self.assertEqual(info.currsize, 1)
+
+    def test_cache_argument(self) -> None:
+        """Test that we report an unused argument called `cache`."""
+        source = r"{% macro 'func' cache %}x{% endmacro %}{% call 'func' %}"
+        with self.assertRaises(LiquidSyntaxError) as raised:
+            self._env(Mode.STRICT).from_string(source)
+        self.assertEqual(
+            str(raised.exception),
+            "macro 'func' never uses its 'cache' argument, "
+            "the cache modifier must follow another argument, on line 1",
+        )
+
+        with self.assertWarns(LiquidSyntaxWarning):
+            self._env(Mode.WARN).from_string(source)
+
+        template = self._env(Mode.LAX).from_string(source)
+        self.assertEqual(template.render(), "x")
+        self.assertEqual(macro_cache_info(template), {})
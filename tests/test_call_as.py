@@ -0,0 +1,182 @@
+"""Test cases for assigning the output of a `call` tag to a variable."""
+# pylint: disable=missing-class-docstring,missing-function-docstring
+
+import asyncio
+
+from typing import Any
+from typing import Dict
+from typing import NamedTuple
+
+from unittest import skipIf
+from unittest import TestCase
+
+try:
+    import markupsafe  # pylint: disable=unused-import
+
+    MARKUPSAFE_AVAILABLE = True
+except ImportError:
+    MARKUPSAFE_AVAILABLE = False
+
+from liquid import Environment
+from liquid.exceptions import OutputStreamLimitError
+
+from liquid_extra.tags import CallTag
+from liquid_extra.tags import MacroTag
+from liquid_extra.tags.macro import CallNode
+
+
+class Case(NamedTuple):
+    description: str
+    template: str
+    expect: str
+    globals: Dict[str, Any]
+
+
+class CallAsTestCase(TestCase):
+    def setUp(self) -> None:
+        self.env = Environment()
+        self.env.add_tag(MacroTag)
+        self.env.add_tag(CallTag)
+
+    def test_call_as(self) -> None:
+        """Test that we can assign macro output to a variable."""
+        test_cases = [
+            Case(
+                description="positional argument without a comma",
+                template=(
+                    r"{% macro 'card' p %}<div>{{ p }}</div>{% endmacro %}"
+                    r"{% call 'card' p as card_html %}"
+                    r"[{{ card_html }}]"
+                ),
+                expect="[<div>x</div>]",
+                globals={"p": "x"},
+            ),
+            Case(
+                description="no arguments",
+                template=(
+                    r"{% macro 'hr' %}<hr>{% endmacro %}"
+                    r"{% call 'hr' as rule %}{{ rule }}{{ rule }}"
+                ),
+                expect="<hr><hr>",
+                globals={},
+            ),
+            Case(
+                description="keyword arguments",
+                template=(
+                    r"{% macro 'price' amount, currency: 'GBP' %}"
+                    r"{{ amount }} {{ currency }}"
+                    r"{% endmacro %}"
+                    r"{% call 'price', 42, currency: 'USD' as price %}"
+                    r"{{ price | upcase }}"
+                ),
+                expect="42 USD",
+                globals={},
+            ),
+            Case(
+                description="in a loop",
+                template=(
+                    r"{% macro 'item' x %}<li>{{ x }}</li>{% endmacro %}"
+                    r"{% for x in items %}{% call 'item' x as li %}{{ li }}"
+                    r"{% endfor %}{{ li }}"
+                ),
+                expect="<li>a</li><li>b</li><li>b</li>",
+                globals={"items": ["a", "b"]},
+            ),
+            Case(
+                description="nested",
+                template=(
+                    r"{% macro 'inner' x %}({{ x }}){% endmacro %}"
+                    r"{% macro 'outer' x %}"
+                    r"{% call 'inner' x as a %}{% call 'inner' a as b %}{{ b }}"
+                    r"{% endmacro %}"
+                    r"{% call 'outer' 1 as c %}{% call 'outer' 2 as d %}{{ c }}{{ d }}"
+                ),
+                expect="((1))((2))",
+                globals={},
+            ),
+            Case(
+                description="undefined macro",
+                template=r"{% call 'nosuchthing' as x %}[{{ x }}]",
+                expect="[]",
+                globals={},
+            ),
+            Case(
+                description="variable named as",
+                template=(
+                    r"{% macro 'func' a, b %}{{ a }}{{ b }}{% endmacro %}"
+                    r"{% call 'func', as, b: as %}"
+                ),
+                expect="11",
+                globals={"as": 1},
+            ),
+        ]
+
+        for case in test_cases:
+            template = self.env.from_string(case.template, globals=case.globals)
+
+            with self.subTest(msg=case.description):
+                self.assertEqual(template.render(), case.expect)
+
+            with self.subTest(msg=case.description, asynchronous=True):
+
+                async def coro() -> str:
+                    return await template.render_async()  # pylint: disable=W0640
+
+                self.assertEqual(asyncio.run(coro()), case.expect)
+
+    def test_call_as_node(self) -> None:
+        """Test that we parse a call target."""
+        template = self.env.from_string(r"{% call 'card' p, size: 2 as html %}")
+        node = template.tree.statements[0]
+        assert isinstance(node, CallNode)
+        self.assertEqual(node.target, "html")
+        self.assertEqual(len(node.args), 1)
+        self.assertEqual(len(node.kwargs), 1)
+
+    @skipIf(not MARKUPSAFE_AVAILABLE, "this test requires markupsafe")
+    def test_call_as_with_autoescape(self) -> None:
+        """Test that assigned macro output is not escaped twice."""
+        env = Environment(autoescape=True)
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+        template = env.from_string(
+            r"{% macro 'card' p %}<b>{{ p }}</b>{% endmacro %}"
+            r"{% call 'card' p as html %}{{ html }}"
+        )
+
+        expect = "<b>&lt;i&gt;</b>"
+        self.assertEqual(template.render(p="<i>"), expect)
+
+        async def coro() -> str:
+            return await template.render_async(p="<i>")
+
+        self.assertEqual(asyncio.run(coro()), expect)
+
+    def test_call_as_output_stream_limit(self) -> None:
+        """Test that assigned macro output counts towards the output stream limit."""
+        self.env.output_stream_limit = 10
+        test_cases = [
+            r"{% macro 'm' %}{{ 'x' | append: 'xxxxxxxxxx' }}{% endmacro %}"
+            r"{% call 'm' as out %}",
+            r"12345678{% macro 'm' %}xxxxx{% endmacro %}{% call 'm' as out %}",
+        ]
+
+        for source in test_cases:
+            template = self.env.from_string(source)
+
+            with self.subTest(msg=source):
+                with self.assertRaises(OutputStreamLimitError):
+                    template.render()
+
+            with self.subTest(msg=source, asynchronous=True):
+
+                async def coro() -> str:
+                    return await template.render_async()  # pylint: disable=W0640
+
+                with self.assertRaises(OutputStreamLimitError):
+                    asyncio.run(coro())
+
+        template = self.env.from_string(
+            r"{% macro 'm' %}xxxxx{% endmacro %}{% call 'm' as out %}{{ out }}"
+        )
+        self.assertEqual(template.render(), "xxxxx")
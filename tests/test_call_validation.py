@@ -0,0 +1,200 @@
+"""Test cases for validating `call` arguments against linked macros."""
+# pylint: disable=missing-class-docstring,missing-function-docstring
+
+from typing import NamedTuple
+from typing import Optional
+
+from unittest import TestCase
+
+from liquid import Environment
+from liquid.mode import Mode
+from liquid.exceptions import LiquidSyntaxError
+from liquid.exceptions import LiquidSyntaxWarning
+
+from liquid_extra.tags import CallTag
+from liquid_extra.tags import MacroTag
+from liquid_extra.tags.macro import CallNode
+from liquid_extra.tags.macro import link_macros
+
+
+class Case(NamedTuple):
+    description: str
+    template: str
+    error: Optional[str]
+
+
+class CallValidationTestCase(TestCase):
+    test_cases = [
+        Case(
+            description="too many positional arguments",
+            template=(
+                r"{% macro 'func', a, b %}{{ a }}{{ b }}{% endmacro %}"
+                r"{% call 'func', 1, 2, 3 %}"
+            ),
+            error=(
+                "too many positional arguments for macro 'func', "
+                "expected at most 2, found 3, on line 1"
+            ),
+        ),
+        Case(
+            description="unexpected keyword argument",
+            template=(
+                r"{% macro 'func', a, b: 2 %}{{ a }}{{ b }}{% endmacro %}"
+                r"{% call 'func', 1, c: 3 %}"
+            ),
+            error="unexpected keyword argument 'c' for macro 'func', on line 1",
+        ),
+        Case(
+            description="keyword argument repeats a positional argument",
+            template=(
+                r"{% macro 'func', a, b %}{{ a }}{{ b }}{% endmacro %}"
+                r"{% call 'func', 1, a: 2 %}"
+            ),
+            error="multiple values for argument 'a' of macro 'func', on line 1",
+        ),
+        Case(
+            description="keyword argument given more than once",
+            template=(
+                r"{% macro 'func', a, b %}{{ a }}{{ b }}{% endmacro %}"
+                r"{% call 'func', b: 1, b: 2 %}"
+            ),
+            error="multiple values for argument 'b' of macro 'func', on line 1",
+        ),
+        Case(
+            description="macro defined after the call",
+            template=r"{% call 'func', 1, 2 %}{% macro 'func', a %}{{ a }}{% endmacro %}",
+            error=(
+                "too many positional arguments for macro 'func', "
+                "expected at most 1, found 2, on line 1"
+            ),
+        ),
+        Case(
+            description="macro defined twice after the call",
+            template=(
+                r"{% call 'func', 1, 2 %}"
+                r"{% macro 'func', a %}{{ a }}{% endmacro %}"
+                r"{% macro 'func', a, b %}{{ a }}{{ b }}{% endmacro %}"
+            ),
+            error=None,
+        ),
+        Case(
+            description="macro redefined after the call",
+            template=(
+                r"{% macro 'func', a %}{{ a }}{% endmacro %}"
+                r"{% call 'func', 1, 2 %}"
+                r"{% macro 'func', a, b %}{{ a }}{{ b }}{% endmacro %}"
+            ),
+            error=None,
+        ),
+        Case(
+            description="macro in a block",
+            template=(
+                r"{% if true %}{% macro 'func', a %}{{ a }}{% endmacro %}{% endif %}"
+                r"{% call 'func', 1, 2 %}"
+            ),
+            error=None,
+        ),
+        Case(
+            description="excess arguments referenced by the macro",
+            template=(
+                r"{% macro 'func', a %}{{ args }}{{ kwargs }}{% endmacro %}"
+                r"{% call 'func', 1, 2, c: 3 %}"
+            ),
+            error=None,
+        ),
+        Case(
+            description="missing arguments",
+            template=(
+                r"{% macro 'func', a, b %}{{ a }}{{ b }}{% endmacro %}"
+                r"{% call 'func', b: 1 %}"
+            ),
+            error=None,
+        ),
+        Case(
+            description="macro that might reference any name",
+            template=(
+                r"{% macro 'func', a %}{% call 'other' %}{% endmacro %}"
+                r"{% call 'func', 1, 2 %}"
+            ),
+            error=None,
+        ),
+        Case(
+            description="unknown macro",
+            template=r"{% call 'nosuchthing', 1, 2 %}",
+            error=None,
+        ),
+    ]
+
+    def _env(self, mode: Mode) -> Environment:
+        env = Environment(tolerance=mode)
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+        return env
+
+    def test_strict(self) -> None:
+        """Test that we raise an error for unusable arguments in strict mode."""
+        env = self._env(Mode.STRICT)
+        for case in self.test_cases:
+            with self.subTest(msg=case.description):
+                template = env.from_string(case.template)
+                if case.error is None:
+                    template.render()
+                else:
+                    with self.assertRaises(LiquidSyntaxError) as raised:
+                        template.render()
+                    self.assertEqual(str(raised.exception), case.error)
+
+    def test_warn(self) -> None:
+        """Test that we warn about unusable arguments in warn mode."""
+        env = self._env(Mode.WARN)
+        for case in self.test_cases:
+            with self.subTest(msg=case.description):
+                if case.error is not None:
+                    with self.assertWarns(LiquidSyntaxWarning):
+                        env.from_string(case.template).render()
+
+    def test_lax(self) -> None:
+        """Test that we ignore unusable arguments in lax mode."""
+        env = self._env(Mode.LAX)
+        template = env.from_string(
+            r"{% macro 'func', a, b %}{{ a }}{{ b }}{% endmacro %}"
+            r"{% call 'func', 1, 2, 3, a: 4, c: 5 %}"
+        )
+        self.assertEqual(template.render(), "42")
+
+    def test_plan_linked_calls(self) -> None:
+        """Test that we make binding plans for calls as they are linked."""
+        env = self._env(Mode.STRICT)
+        template = env.from_string(
+            r"{% macro 'func', a, b %}{{ a }}{% endmacro %}{% call 'func', 1, 2 %}"
+        )
+        link_macros(template)
+        node = template.tree.statements[1]
+        assert isinstance(node, CallNode)
+        assert node.macro is not None
+        _, plan = node.plans[id(node.macro)]
+        self.assertEqual([name for name, _ in plan.args], ["a"])
+        self.assertFalse(plan.excess)
+
+    def test_plan_dynamic_root(self) -> None:
+        """Test that we bind every argument if a macro uses a variable as the root of
+        a path."""
+        env = self._env(Mode.STRICT)
+        template = env.from_string(
+            r"{% macro 'm' a, k %}{{ [k] }}{% endmacro %}{% call 'm' 'x', 'a' %}"
+        )
+        link_macros(template)
+        node = template.tree.statements[1]
+        assert isinstance(node, CallNode)
+        assert node.macro is not None
+        self.assertIsNone(node.macro.references)
+        self.assertEqual(template.render(), "x")
+
+    def test_link_up_front(self) -> None:
+        """Test that we can check arguments before rendering."""
+        env = self._env(Mode.STRICT)
+        template = env.from_string(
+            r"{% macro 'func', a %}{{ a }}{% endmacro %}{% call 'func', 1, 2 %}"
+        )
+        with self.assertRaises(LiquidSyntaxError):
+            link_macros(template)
@@ -0,0 +1,102 @@
+"""Test cases for removing macros that are never called."""
+# pylint: disable=missing-class-docstring,missing-function-docstring
+
+import asyncio
+
+from typing import Iterator
+from typing import List
+
+from unittest import TestCase
+
+from liquid import Environment
+from liquid.ast import Node
+from liquid.loaders import DictLoader
+from liquid.template import BoundTemplate
+
+from liquid_extra.tags import CallTag
+from liquid_extra.tags import ImportTag
+from liquid_extra.tags import MacroTag
+from liquid_extra.tags.macro import MacroNode
+from liquid_extra.tags.macro import eliminate_dead_macros
+
+
+def walk(nodes: List[Node]) -> Iterator[Node]:
+    for node in nodes:
+        yield node
+        yield from walk([child.node for child in node.children() if child.node])
+
+
+def macro_names(template: BoundTemplate) -> List[str]:
+    return [
+        node.name
+        for node in walk(template.tree.statements)
+        if isinstance(node, MacroNode)
+    ]
+
+
+class DeadMacroTestCase(TestCase):
+    def setUp(self) -> None:
+        self.env = Environment(
+            loader=DictLoader(
+                {
+                    "partial": r"{% call 'unused' %}",
+                    "library": r"{% macro 'lib' %}{% call 'unused' %}{% endmacro %}",
+                }
+            )
+        )
+        self.env.add_tag(MacroTag)
+        self.env.add_tag(CallTag)
+        self.env.add_tag(ImportTag)
+
+    def test_eliminate_dead_macros(self) -> None:
+        """Test that we remove macros that are never called."""
+        template = self.env.from_string(
+            r"{% macro 'used', x %}({% call 'helper', x %}){% endmacro %}"
+            r"{% macro 'helper', x %}{{ x }}{% endmacro %}"
+            r"{% macro 'unused' %}{% call 'only_from_unused' %}{% endmacro %}"
+            r"{% macro 'only_from_unused' %}!{% endmacro %}"
+            r"{% if true %}"
+            r"{% macro 'nested_unused' %}{% endmacro %}"
+            r"{% for i in (1..2) %}{% call 'used', i %}{% endfor %}"
+            r"{% endif %}"
+        )
+
+        expect = template.render()
+        self.assertEqual(expect, "(1)(2)")
+
+        self.assertEqual(eliminate_dead_macros(template), 3)
+        self.assertEqual(macro_names(template), ["used", "helper"])
+        self.assertEqual(template.render(), expect)
+
+        async def coro() -> str:
+            return await template.render_async()
+
+        self.assertEqual(asyncio.run(coro()), expect)
+
+        # Nothing left to remove.
+        self.assertEqual(eliminate_dead_macros(template), 0)
+
+    def test_keep_all_definitions_of_a_called_name(self) -> None:
+        """Test that we keep every definition of a macro that is called."""
+        template = self.env.from_string(
+            r"{% macro 'func' %}a{% endmacro %}"
+            r"{% call 'func' %}"
+            r"{% macro 'func' %}b{% endmacro %}"
+            r"{% call 'func' %}"
+        )
+        self.assertEqual(eliminate_dead_macros(template), 0)
+        self.assertEqual(template.render(), "ab")
+
+    def test_dynamic_templates(self) -> None:
+        """Test that we don't remove macros that might be called from elsewhere."""
+        test_cases = [
+            r"{% macro 'unused' %}{% endmacro %}{% include 'partial' %}",
+            r"{% macro 'unused' %}{% endmacro %}{% render 'partial' %}",
+            r"{% macro 'unused' %}{% endmacro %}{% import 'library' %}",
+        ]
+
+        for source in test_cases:
+            with self.subTest(msg=source):
+                template = self.env.from_string(source)
+                self.assertEqual(eliminate_dead_macros(template), 0)
+                self.assertEqual(macro_names(template), ["unused"])
@@ -1,7 +1,18 @@
 """Test cases for html filters."""
 # pylint: disable=missing-class-docstring,missing-function-docstring
 
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from io import StringIO
+from typing import Dict
+
 from unittest import skipIf
+from unittest import TestCase
 
 try:
     import markupsafe  # pylint: disable=unused-import
@@ -10,12 +21,22 @@ try:
 except ImportError:
     MARKUPSAFE_AVAILABLE = False
 
+from liquid import Context
 from liquid import Environment
 from liquid.loaders import DictLoader
 from liquid import Markup
 
 from liquid_extra.filters import stylesheet_tag
 from liquid_extra.filters import script_tag
+from liquid_extra.filters import stylesheet_tags
+from liquid_extra.filters import script_tags
+from liquid_extra.filters import AssetCollector
+from liquid_extra.filters import AssetManifest
+from liquid_extra.filters import ManifestStylesheetTag
+from liquid_extra.filters import ManifestScriptTag
+from liquid_extra.filters import collect_assets
+from liquid_extra.filters import SubresourceIntegrity
+from liquid_extra.filters.html import STYLESHEET_TAG
 
 from .base import FilterTestCase
 from .base import RenderFilterTestCase
@@ -255,3 +276,585 @@ class RenderScriptTagFilterTestCase(RenderFilterTestCase):
             with self.subTest(msg=case.description):
                 result = template.render()
                 self.assertEqual(result, case.expect)
+
+
+class AssetManifestTestCase(TestCase):
+    """Test resolving asset URLs from a manifest."""
+
+    def setUp(self) -> None:
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        self.manifest_path = os.path.join(tmpdir, "manifest.json")
+        self.write_manifest(
+            {"style.css": "style.abc123.css", "app.js": "app.def456.js"}
+        )
+
+    def write_manifest(self, manifest: Dict[str, str], mtime: float = 1.0) -> None:
+        with open(self.manifest_path, "w", encoding="utf-8") as fd:
+            json.dump(manifest, fd)
+        os.utime(self.manifest_path, (mtime, mtime))
+
+    def test_manifest_stylesheet_tag(self) -> None:
+        manifest = AssetManifest(self.manifest_path, base_url="/assets/")
+        env = Environment()
+        env.add_filter("stylesheet_tag", ManifestStylesheetTag(manifest))
+
+        template = env.from_string(
+            r"{{ 'style.css' | stylesheet_tag }}"
+            r"{{ 'https://example.com/other.css' | stylesheet_tag }}"
+        )
+
+        self.assertEqual(
+            template.render(),
+            (
+                '<link href="/assets/style.abc123.css" rel="stylesheet" '
+                'type="text/css" media="all" />'
+                '<link href="https://example.com/other.css" rel="stylesheet" '
+                'type="text/css" media="all" />'
+            ),
+        )
+
+    def test_manifest_script_tag(self) -> None:
+        manifest = AssetManifest(self.manifest_path, base_url="/assets/")
+        env = Environment()
+        env.add_filter("script_tag", ManifestScriptTag(manifest))
+
+        template = env.from_string(r"{{ 'app.js' | script_tag }}")
+        self.assertEqual(
+            template.render(),
+            '<script src="/assets/app.def456.js" type="text/javascript"></script>',
+        )
+
+    def test_manifest_tags_are_escaped(self) -> None:
+        self.write_manifest({"style.css": "<b>style.css</b>"})
+        manifest = AssetManifest(self.manifest_path)
+        env = Environment()
+        env.add_filter("stylesheet_tag", ManifestStylesheetTag(manifest))
+
+        template = env.from_string(r"{{ 'style.css' | stylesheet_tag }}")
+        self.assertEqual(
+            template.render(),
+            (
+                '<link href="&lt;b&gt;style.css&lt;/b&gt;" rel="stylesheet" '
+                'type="text/css" media="all" />'
+            ),
+        )
+
+    @skipIf(not MARKUPSAFE_AVAILABLE, "this test requires markupsafe")
+    def test_manifest_tags_with_autoescape(self) -> None:
+        manifest = AssetManifest(self.manifest_path)
+        env = Environment(autoescape=True)
+        env.add_filter("stylesheet_tag", ManifestStylesheetTag(manifest))
+        env.add_filter("script_tag", ManifestScriptTag(manifest))
+
+        template = env.from_string(
+            r"{{ 'style.css' | stylesheet_tag }}{{ url | script_tag }}"
+        )
+
+        self.assertEqual(
+            template.render(url="<b>app.js</b>"),
+            (
+                '<link href="style.abc123.css" rel="stylesheet" '
+                'type="text/css" media="all" />'
+                '<script src="&lt;b&gt;app.js&lt;/b&gt;" '
+                'type="text/javascript"></script>'
+            ),
+        )
+
+    def test_tags_are_cached(self) -> None:
+        manifest = AssetManifest(self.manifest_path)
+        tag = manifest.tag(STYLESHEET_TAG, "style.css", False)
+        self.assertIs(manifest.tag(STYLESHEET_TAG, "style.css", False), tag)
+
+    def test_unknown_names_are_not_cached(self) -> None:
+        manifest = AssetManifest(self.manifest_path)
+        for i in range(10):
+            manifest.tag(STYLESHEET_TAG, f"https://example.com/{i}.css", False)
+        manifest.tag(STYLESHEET_TAG, "style.css", False)
+        tags = manifest._state.tags  # pylint: disable=protected-access
+        self.assertEqual(len(tags), 1)
+
+    def test_reload_changed_manifest(self) -> None:
+        manifest = AssetManifest(self.manifest_path, reload_interval=0)
+        self.assertEqual(manifest.url("style.css"), "style.abc123.css")
+
+        self.write_manifest({"style.css": "style.xyz789.css"}, mtime=2.0)
+
+        # The change is loaded in the background. The old manifest is used until
+        # that finishes.
+        manifest.url("style.css")
+        manifest._refresh.join()  # pylint: disable=protected-access
+        self.assertEqual(manifest.url("style.css"), "style.xyz789.css")
+        self.assertIn(
+            "style.xyz789.css", manifest.tag(STYLESHEET_TAG, "style.css", False)
+        )
+
+    def test_missing_manifest(self) -> None:
+        manifest = AssetManifest(self.manifest_path, reload_interval=0)
+        env = Environment()
+        env.add_filter("stylesheet_tag", ManifestStylesheetTag(manifest))
+        template = env.from_string(r"{{ 'style.css' | stylesheet_tag }}")
+        expect = template.render()
+
+        os.rename(self.manifest_path, self.manifest_path + ".old")
+        self.assertEqual(template.render(), expect)
+
+    def test_reload_interval(self) -> None:
+        manifest = AssetManifest(self.manifest_path, reload_interval=3600)
+        self.write_manifest({"style.css": "style.xyz789.css"}, mtime=2.0)
+        self.assertEqual(manifest.url("style.css"), "style.abc123.css")
+
+    def test_disable_auto_reload(self) -> None:
+        manifest = AssetManifest(
+            self.manifest_path, auto_reload=False, reload_interval=0
+        )
+        self.write_manifest({"style.css": "style.xyz789.css"}, mtime=2.0)
+        self.assertEqual(manifest.url("style.css"), "style.abc123.css")
+
+        manifest.load()
+        self.assertEqual(manifest.url("style.css"), "style.xyz789.css")
+
+    def test_explicit_reload(self) -> None:
+        manifest = AssetManifest(self.manifest_path, auto_reload=False)
+        self.assertFalse(manifest.reload())
+
+        self.write_manifest({"style.css": "style.xyz789.css"}, mtime=2.0)
+        self.assertTrue(manifest.reload())
+        self.assertEqual(manifest.url("style.css"), "style.xyz789.css")
+        self.assertFalse(manifest.reload())
+
+
+class CollectAssetsTestCase(TestCase):
+    """Test that HTML filters can record the assets they output."""
+
+    def setUp(self) -> None:
+        self.env = Environment()
+        self.env.add_filter("stylesheet_tag", stylesheet_tag)
+        self.env.add_filter("script_tag", script_tag)
+
+    def test_collect_assets(self) -> None:
+        template = self.env.from_string(
+            r"{{ 'style.css' | stylesheet_tag }}"
+            r"{{ 'app.js' | script_tag }}"
+            r"{{ 'style.css' | stylesheet_tag }}"
+            r"{{ 'other.css' | stylesheet_tag }}"
+        )
+
+        context = Context(self.env)
+        assets = collect_assets(context)
+        template.render_with_context(context, StringIO())
+
+        self.assertEqual(assets.urls, ["style.css", "app.js", "other.css"])
+        self.assertEqual(
+            assets.link_header(),
+            (
+                "<style.css>; rel=preload; as=style, "
+                "<app.js>; rel=preload; as=script, "
+                "<other.css>; rel=preload; as=style"
+            ),
+        )
+
+    def test_link_header_encodes_urls(self) -> None:
+        assets = AssetCollector()
+        assets.add('o"<.css', "style")
+        assets.add("a.js>; rel=preload; as=script, <b.js", "script")
+        assets.add("c.js\r\nSet-Cookie: x=1", "script")
+        assets.add("/static/d%20e.js?v=1&x=[2]#f", "script")
+        self.assertEqual(
+            assets.link_header(),
+            (
+                "<o%22%3C.css>; rel=preload; as=style, "
+                "<a.js%3E%3B%20rel=preload%3B%20as=script%2C%20%3Cb.js>; "
+                "rel=preload; as=script, "
+                "<c.js%0D%0ASet-Cookie:%20x=1>; rel=preload; as=script, "
+                "</static/d%20e.js?v=1&x=[2]#f>; rel=preload; as=script"
+            ),
+        )
+
+    def test_collect_assets_from_partial_templates(self) -> None:
+        self.env.loader = DictLoader({"head": r"{{ 'app.js' | script_tag }}"})
+        template = self.env.from_string(
+            r"{{ 'style.css' | stylesheet_tag }}{% render 'head' %}"
+        )
+
+        context = Context(self.env)
+        assets = collect_assets(context)
+        template.render_with_context(context, StringIO())
+
+        self.assertEqual(assets.urls, ["style.css", "app.js"])
+
+    def test_assets_are_not_collected_by_default(self) -> None:
+        template = self.env.from_string(r"{{ 'style.css' | stylesheet_tag }}")
+        context = Context(self.env)
+        template.render_with_context(context, StringIO())
+        self.assertNotIn("assets", context.tag_namespace)
+
+    def test_collect_manifest_assets(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "manifest.json")
+            with open(path, "w", encoding="utf-8") as fd:
+                json.dump({"app.js": "app.def456.js"}, fd)
+
+            manifest = AssetManifest(path, base_url="/assets/")
+
+        self.env.add_filter("script_tag", ManifestScriptTag(manifest))
+        template = self.env.from_string(r"{{ 'app.js' | script_tag }}")
+
+        context = Context(self.env)
+        assets = collect_assets(context)
+        template.render_with_context(context, StringIO())
+
+        self.assertEqual(assets.urls, ["/assets/app.def456.js"])
+
+
+class DeduplicateAssetsTestCase(TestCase):
+    """Test that HTML filters can skip assets that have already been output."""
+
+    def setUp(self) -> None:
+        self.env = Environment()
+        self.env.add_filter("stylesheet_tag", stylesheet_tag)
+        self.env.add_filter("script_tag", script_tag)
+
+    def test_once(self) -> None:
+        template = self.env.from_string(
+            r"{{ 'style.css' | stylesheet_tag: once: true }}"
+            r"{{ 'style.css' | stylesheet_tag: once: true }}"
+            r"{{ 'app.js' | script_tag: once: true }}"
+            r"{{ 'app.js' | script_tag: once: true }}"
+        )
+
+        self.assertEqual(
+            template.render(),
+            (
+                '<link href="style.css" rel="stylesheet" type="text/css" media="all" />'
+                '<script src="app.js" type="text/javascript"></script>'
+            ),
+        )
+
+        # State does not carry over from one render to the next.
+        self.assertEqual(template.render(), template.render())
+
+    def test_duplicates_are_output_by_default(self) -> None:
+        template = self.env.from_string(
+            r"{{ 'app.js' | script_tag }}{{ 'app.js' | script_tag }}"
+        )
+        self.assertEqual(
+            template.render(),
+            '<script src="app.js" type="text/javascript"></script>' * 2,
+        )
+
+    def test_once_after_default(self) -> None:
+        template = self.env.from_string(
+            r"{{ 'app.js' | script_tag }}{{ 'app.js' | script_tag: once: true }}"
+        )
+        self.assertEqual(
+            template.render(),
+            '<script src="app.js" type="text/javascript"></script>',
+        )
+
+    def test_once_in_partial_templates(self) -> None:
+        self.env.loader = DictLoader(
+            {"head": r"{{ 'app.js' | script_tag: once: true }}"}
+        )
+        template = self.env.from_string(
+            r"{% render 'head' %}{% render 'head' %}{% include 'head' %}"
+        )
+        self.assertEqual(
+            template.render(),
+            '<script src="app.js" type="text/javascript"></script>',
+        )
+
+    def test_manifest_once(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "manifest.json")
+            with open(path, "w", encoding="utf-8") as fd:
+                json.dump({"app.js": "app.def456.js"}, fd)
+
+            manifest = AssetManifest(path)
+
+        self.env.add_filter("script_tag", ManifestScriptTag(manifest, once=True))
+        template = self.env.from_string(
+            r"{{ 'app.js' | script_tag }}"
+            r"{{ 'app.js' | script_tag }}"
+            r"{{ 'app.js' | script_tag: once: false }}"
+        )
+
+        self.assertEqual(
+            template.render(),
+            '<script src="app.def456.js" type="text/javascript"></script>' * 2,
+        )
+
+
+class SubresourceIntegrityTestCase(TestCase):
+    """Test integrity attributes for local assets."""
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+
+        os.mkdir(os.path.join(self.root, "static"))
+        self.app_js = os.path.join(self.root, "static", "app.def456.js")
+        with open(self.app_js, "wb") as fd:
+            fd.write(b"console.log('Hello, World!');")
+
+        self.expect_integrity = (
+            "sha384-"
+            + base64.b64encode(
+                hashlib.sha384(b"console.log('Hello, World!');").digest()
+            ).decode()
+        )
+
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+        with open(self.manifest_path, "w", encoding="utf-8") as fd:
+            json.dump(
+                {
+                    "app.js": "static/app.def456.js",
+                    "missing.js": "static/missing.js",
+                },
+                fd,
+            )
+
+    def test_integrity(self) -> None:
+        sri = SubresourceIntegrity(self.root)
+        self.assertEqual(sri.integrity("static/app.def456.js"), self.expect_integrity)
+        self.assertEqual(sri.integrity("/static/app.def456.js"), self.expect_integrity)
+
+    def test_non_local_assets(self) -> None:
+        sri = SubresourceIntegrity(os.path.join(self.root, "static"))
+        self.assertIsNone(sri.integrity("static/missing.js"))
+        self.assertIsNone(sri.integrity("https://example.com/app.def456.js"))
+        self.assertIsNone(sri.integrity("//example.com/app.def456.js"))
+        self.assertIsNone(sri.integrity("../manifest.json"))
+
+    def test_unsupported_algorithm(self) -> None:
+        with self.assertRaises(ValueError):
+            SubresourceIntegrity(self.root, algorithm="md5")
+
+    def test_rehash_changed_file(self) -> None:
+        sri = SubresourceIntegrity(self.root)
+        self.assertEqual(sri.integrity("static/app.def456.js"), self.expect_integrity)
+
+        with open(self.app_js, "wb") as fd:
+            fd.write(b"console.log('Goodbye!');")
+
+        self.assertNotEqual(
+            sri.integrity("static/app.def456.js"), self.expect_integrity
+        )
+
+    def test_sidecar(self) -> None:
+        sidecar = os.path.join(self.root, "integrity.json")
+        sri = SubresourceIntegrity(self.root, sidecar=sidecar)
+        sri.integrity("static/app.def456.js")
+        sri.save()
+
+        # Tamper with the sidecar to show that cached hashes are used without
+        # reading the asset.
+        with open(sidecar, encoding="utf-8") as fd:
+            data = json.load(fd)
+        for entry in data["hashes"].values():
+            entry[2] = "sha384-cached"
+        with open(sidecar, "w", encoding="utf-8") as fd:
+            json.dump(data, fd)
+
+        sri = SubresourceIntegrity(self.root, sidecar=sidecar)
+        self.assertEqual(sri.integrity("static/app.def456.js"), "sha384-cached")
+
+        # A different algorithm ignores cached hashes.
+        sri = SubresourceIntegrity(self.root, sidecar=sidecar, algorithm="sha256")
+        self.assertTrue(sri.integrity("static/app.def456.js").startswith("sha256-"))
+
+    def test_manifest_integrity(self) -> None:
+        sidecar = os.path.join(self.root, "integrity.json")
+        manifest = AssetManifest(
+            self.manifest_path,
+            base_url="/",
+            integrity=SubresourceIntegrity(self.root, sidecar=sidecar),
+        )
+
+        self.assertTrue(os.path.isfile(sidecar))
+
+        env = Environment()
+        env.add_filter("script_tag", ManifestScriptTag(manifest))
+        template = env.from_string(
+            r"{{ 'app.js' | script_tag }}{{ 'missing.js' | script_tag }}"
+        )
+
+        self.assertEqual(
+            template.render(),
+            (
+                '<script src="/static/app.def456.js" type="text/javascript" '
+                f'integrity="{self.expect_integrity}" crossorigin="anonymous">'
+                "</script>"
+                '<script src="/static/missing.js" type="text/javascript"></script>'
+            ),
+        )
+
+    @skipIf(not MARKUPSAFE_AVAILABLE, "this test requires markupsafe")
+    def test_manifest_integrity_with_autoescape(self) -> None:
+        manifest = AssetManifest(
+            self.manifest_path,
+            base_url="/",
+            integrity=SubresourceIntegrity(self.root),
+        )
+
+        env = Environment(autoescape=True)
+        env.add_filter("stylesheet_tag", ManifestStylesheetTag(manifest))
+        template = env.from_string(r"{{ 'app.js' | stylesheet_tag }}")
+
+        self.assertEqual(
+            template.render(),
+            (
+                '<link href="/static/app.def456.js" rel="stylesheet" '
+                'type="text/css" media="all" '
+                f'integrity="{self.expect_integrity}" crossorigin="anonymous" />'
+            ),
+        )
+
+
+class StylesheetTagsFilterTestCase(FilterTestCase):
+    """Test the stylesheet_tags template filter."""
+
+    def test_stylesheet_tags_filter(self) -> None:
+        test_cases = [
+            Case(
+                description="array of urls",
+                val=["assets/a.css", "assets/b.css"],
+                args=[],
+                kwargs={},
+                expect=(
+                    '<link href="assets/a.css" rel="stylesheet" '
+                    'type="text/css" media="all" />'
+                    '<link href="assets/b.css" rel="stylesheet" '
+                    'type="text/css" media="all" />'
+                ),
+            ),
+            Case(
+                description="single url",
+                val="assets/a.css",
+                args=[],
+                kwargs={},
+                expect=(
+                    '<link href="assets/a.css" rel="stylesheet" '
+                    'type="text/css" media="all" />'
+                ),
+            ),
+            Case(
+                description="empty array",
+                val=[],
+                args=[],
+                kwargs={},
+                expect="",
+            ),
+            Case(
+                description="html escape urls",
+                val=["<b>a.css</b>", 42],
+                args=[],
+                kwargs={},
+                expect=(
+                    '<link href="&lt;b&gt;a.css&lt;/b&gt;" rel="stylesheet" '
+                    'type="text/css" media="all" />'
+                    '<link href="42" rel="stylesheet" type="text/css" media="all" />'
+                ),
+            ),
+        ]
+
+        self.env.add_filter("stylesheet_tags", stylesheet_tags)
+        self._test(self.ctx.filter("stylesheet_tags"), test_cases)
+
+
+class ScriptTagsFilterTestCase(FilterTestCase):
+    """Test the script_tags template filter."""
+
+    def test_script_tags_filter(self) -> None:
+        test_cases = [
+            Case(
+                description="array of urls",
+                val=["a.js", "b.js"],
+                args=[],
+                kwargs={},
+                expect=(
+                    '<script src="a.js" type="text/javascript"></script>'
+                    '<script src="b.js" type="text/javascript"></script>'
+                ),
+            ),
+            Case(
+                description="html escape urls",
+                val=["<b>a.js</b>"],
+                args=[],
+                kwargs={},
+                expect=(
+                    '<script src="&lt;b&gt;a.js&lt;/b&gt;" '
+                    'type="text/javascript"></script>'
+                ),
+            ),
+        ]
+
+        self.env.add_filter("script_tags", script_tags)
+        self._test(self.ctx.filter("script_tags"), test_cases)
+
+
+class RenderTagsFilterTestCase(TestCase):
+    """Test the stylesheet_tags and script_tags filters from a template."""
+
+    def test_render_tags_filters(self) -> None:
+        env = Environment()
+        env.add_filter("stylesheet_tags", stylesheet_tags)
+        env.add_filter("script_tags", script_tags)
+
+        template = env.from_string(
+            r"{{ styles | stylesheet_tags }}{{ scripts | script_tags }}"
+        )
+
+        self.assertEqual(
+            template.render(styles=["a.css"], scripts=["a.js", "<b>.js"]),
+            (
+                '<link href="a.css" rel="stylesheet" type="text/css" media="all" />'
+                '<script src="a.js" type="text/javascript"></script>'
+                '<script src="&lt;b&gt;.js" type="text/javascript"></script>'
+            ),
+        )
+
+    def test_render_tags_once(self) -> None:
+        env = Environment()
+        env.add_filter("script_tags", script_tags)
+        template = env.from_string(
+            r"{{ scripts | script_tags: once: true }}"
+            r"{{ scripts | script_tags: once: true }}"
+        )
+
+        self.assertEqual(
+            template.render(scripts=["a.js", "b.js", "a.js"]),
+            (
+                '<script src="a.js" type="text/javascript"></script>'
+                '<script src="b.js" type="text/javascript"></script>'
+            ),
+        )
+
+    def test_render_undefined_urls(self) -> None:
+        env = Environment()
+        env.add_filter("script_tags", script_tags)
+        template = env.from_string(r"{{ nosuchthing | script_tags }}")
+        self.assertEqual(template.render(), "")
+
+    @skipIf(not MARKUPSAFE_AVAILABLE, "this test requires markupsafe")
+    def test_render_tags_with_autoescape(self) -> None:
+        env = Environment(autoescape=True)
+        env.add_filter("stylesheet_tags", stylesheet_tags)
+        env.add_filter("script_tags", script_tags)
+
+        template = env.from_string(
+            r"{{ styles | stylesheet_tags }}{{ scripts | script_tags }}"
+        )
+
+        self.assertEqual(
+            template.render(
+                styles=["a.css", "<b>.css"],
+                scripts=[Markup("<b>.js")],
+            ),
+            (
+                '<link href="a.css" rel="stylesheet" type="text/css" media="all" />'
+                '<link href="&lt;b&gt;.css" rel="stylesheet" '
+                'type="text/css" media="all" />'
+                '<script src="&lt;b&gt;.js" type="text/javascript"></script>'
+            ),
+        )
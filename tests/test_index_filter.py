@@ -1,12 +1,21 @@
 """Test cases for the `index` filter."""
 # pylint: disable=missing-class-docstring,missing-function-docstring
 
+from array import array
 from dataclasses import dataclass
 
+from typing import Iterator
+from typing import List
+
 from liquid import Environment
+from liquid.context import Undefined
+from liquid.exceptions import FilterValueError
 from liquid.loaders import DictLoader
 
 from liquid_extra.filters import index
+from liquid_extra.filters import cached_index
+from liquid_extra.filters import indices
+from liquid_extra.filters import index_by
 
 from .base import FilterTestCase
 from .base import RenderFilterTestCase
@@ -20,6 +29,16 @@ class MockObject:
     age: int
 
 
+class MockDrop:
+    """An iterable that is not a sequence."""
+
+    def __init__(self, items: List[str]):
+        self.items = items
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.items)
+
+
 class IndexFilterTestCase(FilterTestCase):
     """Test the Index template filter."""
 
@@ -50,11 +69,129 @@ class IndexFilterTestCase(FilterTestCase):
                 kwargs={},
                 expect=2,
             ),
+            Case(
+                description="range",
+                val=range(5, 10),
+                args=[7],
+                kwargs={},
+                expect=2,
+            ),
+            Case(
+                description="range with a step",
+                val=range(0, 100, 5),
+                args=[15],
+                kwargs={},
+                expect=3,
+            ),
+            Case(
+                description="range item does not exist",
+                val=range(0, 100, 5),
+                args=[16],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="range integral float",
+                val=range(10),
+                args=[3.0],
+                kwargs={},
+                expect=3,
+            ),
+            Case(
+                description="range fractional float",
+                val=range(10),
+                args=[3.5],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="range string",
+                val=range(10),
+                args=["3"],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="range nan",
+                val=range(10),
+                args=[float("nan")],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="range nil",
+                val=range(10),
+                args=[None],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="range complex",
+                val=range(10),
+                args=[3 + 0j],
+                kwargs={},
+                expect=3,
+            ),
+            Case(
+                description="generator",
+                val=(c for c in "abc"),
+                args=["c"],
+                kwargs={},
+                expect=2,
+            ),
+            Case(
+                description="generator item does not exist",
+                val=(c for c in "abc"),
+                args=["z"],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="string",
+                val="abc",
+                args=["b"],
+                kwargs={},
+                expect=FilterValueError,
+            ),
+            Case(
+                description="hash",
+                val={"a": 1},
+                args=["a"],
+                kwargs={},
+                expect=FilterValueError,
+            ),
+            Case(
+                description="not iterable",
+                val=42,
+                args=[4],
+                kwargs={},
+                expect=FilterValueError,
+            ),
         ]
 
         self.env.add_filter("index", index)
         self._test(self.ctx.filter("index"), test_cases)
 
+    def test_index_stops_at_first_match(self) -> None:
+        consumed = []
+
+        def items() -> Iterator[int]:
+            for i in range(1000):
+                consumed.append(i)
+                yield i
+
+        self.env.add_filter("index", index)
+        self.assertEqual(self.ctx.filter("index")(items(), 2), 2)
+        self.assertEqual(consumed, [0, 1, 2])
+
+    def test_index_large_range(self) -> None:
+        self.env.add_filter("index", index)
+        # Would take a very long time if the range were iterated.
+        self.assertIsNone(self.ctx.filter("index")(range(10**18), 10**18 + 0.5))
+        self.assertEqual(self.ctx.filter("index")(range(10**18), True), 1)
+        self.assertIsNone(self.ctx.filter("index")(range(10**18), None))
+        self.assertIsNone(self.ctx.filter("index")(range(10**18), MockDrop(["1"])))
+
 
 class RenderIndexFilterTestCase(RenderFilterTestCase):
     """Test the Index filter from a template."""
@@ -75,6 +212,27 @@ class RenderIndexFilterTestCase(RenderFilterTestCase):
                 globals={"handles": ["foo", "bar"]},
                 partials={},
             ),
+            RenderCase(
+                description="range literal",
+                template=r"{{ (1..5) | index: 3 }}",
+                expect="2",
+                globals={},
+                partials={},
+            ),
+            RenderCase(
+                description="lazy drop",
+                template=r"{{ handles | index: 'bar' }}",
+                expect="1",
+                globals={"handles": MockDrop(["foo", "bar"])},
+                partials={},
+            ),
+            RenderCase(
+                description="undefined array",
+                template=r"{{ nosuchthing | index: 'baz' }}",
+                expect="",
+                globals={},
+                partials={},
+            ),
         ]
 
         for case in test_cases:
@@ -86,3 +244,405 @@ class RenderIndexFilterTestCase(RenderFilterTestCase):
             with self.subTest(msg=case.description):
                 result = template.render()
                 self.assertEqual(result, case.expect)
+
+
+class CachedIndexFilterTestCase(FilterTestCase):
+    """Test the cached index template filter."""
+
+    def test_cached_index_filter(self) -> None:
+        test_cases = [
+            Case(
+                description="array of strings",
+                val=["a", "b", "c"],
+                args=["b"],
+                kwargs={},
+                expect=1,
+            ),
+            Case(
+                description="array of strings item does not exist",
+                val=["a", "b", "c"],
+                args=["z"],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="first of many",
+                val=["a", "b", "a", "b"],
+                args=["b"],
+                kwargs={},
+                expect=1,
+            ),
+            Case(
+                description="array of unhashable objects",
+                val=[
+                    MockObject("Foo", 25),
+                    MockObject("Bar", 33),
+                    MockObject("Baz", 60),
+                ],
+                args=[MockObject("Baz", 60)],
+                kwargs={},
+                expect=2,
+            ),
+            Case(
+                description="unhashable item",
+                val=["a", ["b"], "c"],
+                args=[["b"]],
+                kwargs={},
+                expect=1,
+            ),
+            Case(
+                description="mixed hashable and unhashable items",
+                val=[{"a": 1}, "b", {"a": 1}, "c"],
+                args=["c"],
+                kwargs={},
+                expect=3,
+            ),
+            Case(
+                description="range",
+                val=range(1, 6),
+                args=[3],
+                kwargs={},
+                expect=2,
+            ),
+        ]
+
+        self.env.add_filter("cached_index", cached_index)
+        self._test(self.ctx.filter("cached_index"), test_cases)
+
+    def test_index_is_cached_for_the_render(self) -> None:
+        self.env.add_filter("cached_index", cached_index)
+        filter_ = self.ctx.filter("cached_index")
+        arr = ["a", "b", "c"]
+
+        self.assertEqual(filter_(arr, "c"), 2)
+        cache = self.ctx.tag_namespace["index_cache"]
+        self.assertEqual(len(cache), 1)
+        array_index = cache[id(arr)][1]
+
+        self.assertEqual(filter_(arr, "a"), 0)
+        self.assertIs(cache[id(arr)][1], array_index)
+
+    def test_cached_index_large_range(self) -> None:
+        self.env.add_filter("cached_index", cached_index)
+        filter_ = self.ctx.filter("cached_index")
+        # Would use a lot of memory if a map of positions were built.
+        self.assertEqual(filter_(range(10**18), 10**17), 10**17)
+        self.assertIsNone(filter_(range(10**18), -1))
+        self.assertNotIn("index_cache", self.ctx.tag_namespace)
+
+
+class RenderCachedIndexFilterTestCase(RenderFilterTestCase):
+    """Test the cached index filter from a template."""
+
+    def test_render_cached_index_filter(self) -> None:
+        test_cases = [
+            RenderCase(
+                description="array of strings",
+                template=r"{{ handles | cached_index: 'foo' }}",
+                expect="0",
+                globals={"handles": ["foo", "bar"]},
+                partials={},
+            ),
+            RenderCase(
+                description="array of strings item does not exist",
+                template=r"{{ handles | cached_index: 'baz' }}",
+                expect="",
+                globals={"handles": ["foo", "bar"]},
+                partials={},
+            ),
+            RenderCase(
+                description="lookup in a loop",
+                template=(
+                    r"{% for h in needles %}"
+                    r"{{ handles | cached_index: h }},"
+                    r"{% endfor %}"
+                ),
+                expect="2,,0,",
+                globals={
+                    "handles": ["foo", "bar", "baz"],
+                    "needles": ["baz", "nosuchthing", "foo"],
+                },
+                partials={},
+            ),
+            RenderCase(
+                description="undefined array",
+                template=r"{{ nosuchthing | cached_index: 'foo' }}",
+                expect="",
+                globals={},
+                partials={},
+            ),
+            RenderCase(
+                description="undefined needle",
+                template=r"{{ a | cached_index: nosuchthing }}",
+                expect="3",
+                globals={"a": [1, "", " ", None]},
+                partials={},
+            ),
+            RenderCase(
+                description="lookup from a partial template",
+                template=r"{% render 'item', handles: handles %}",
+                expect="1",
+                globals={"handles": ["foo", "bar"]},
+                partials={"item": r"{{ handles | cached_index: 'bar' }}"},
+            ),
+        ]
+
+        for case in test_cases:
+            env = Environment()
+            env.add_filter("cached_index", cached_index)
+            env.loader = DictLoader(case.partials)
+            template = env.from_string(case.template, globals=case.globals)
+
+            with self.subTest(msg=case.description):
+                result = template.render()
+                self.assertEqual(result, case.expect)
+
+
+class IndicesFilterTestCase(FilterTestCase):
+    """Test the indices template filter."""
+
+    def test_indices_filter(self) -> None:
+        test_cases = [
+            Case(
+                description="array of strings",
+                val=["a", "b", "c"],
+                args=[["c", "a"]],
+                kwargs={},
+                expect=[2, 0],
+            ),
+            Case(
+                description="some items do not exist",
+                val=["a", "b", "c"],
+                args=[["z", "b", "y"]],
+                kwargs={},
+                expect=[None, 1, None],
+            ),
+            Case(
+                description="single needle",
+                val=["a", "b", "c"],
+                args=["b"],
+                kwargs={},
+                expect=[1],
+            ),
+            Case(
+                description="no needles",
+                val=["a", "b", "c"],
+                args=[[]],
+                kwargs={},
+                expect=[],
+            ),
+            Case(
+                description="unhashable needles",
+                val=[{"a": 1}, {"b": 2}],
+                args=[[{"b": 2}, {"c": 3}]],
+                kwargs={},
+                expect=[1, None],
+            ),
+            Case(
+                description="undefined needle",
+                val=[1, "", " ", None],
+                args=[[Undefined("nosuchthing"), ""]],
+                kwargs={},
+                expect=[3, 1],
+            ),
+            Case(
+                description="range",
+                val=range(10),
+                args=[[9, 3]],
+                kwargs={},
+                expect=[9, 3],
+            ),
+            Case(
+                description="array-like with a tolist method",
+                val=array("i", [5, 6, 7, 5]),
+                args=[[5, 7, 8]],
+                kwargs={},
+                expect=[0, 2, None],
+            ),
+            Case(
+                description="not an array",
+                val="abc",
+                args=[["a"]],
+                kwargs={},
+                expect=FilterValueError,
+            ),
+        ]
+
+        self.env.add_filter("indices", indices)
+        self._test(self.ctx.filter("indices"), test_cases)
+
+    def test_indices_large_range(self) -> None:
+        self.env.add_filter("indices", indices)
+        self.assertEqual(
+            self.ctx.filter("indices")(range(10**18), [5, 10**17, -1]),
+            [5, 10**17, None],
+        )
+        self.assertNotIn("index_cache", self.ctx.tag_namespace)
+
+
+class RenderIndicesFilterTestCase(RenderFilterTestCase):
+    """Test the indices filter from a template."""
+
+    def test_render_indices_filter(self) -> None:
+        test_cases = [
+            RenderCase(
+                description="array of strings",
+                template=(
+                    r"{% assign positions = handles | indices: needles %}"
+                    r"{% for i in positions %}{{ i }},{% endfor %}"
+                ),
+                expect="1,,0,",
+                globals={"handles": ["foo", "bar"], "needles": ["bar", "baz", "foo"]},
+                partials={},
+            ),
+            RenderCase(
+                description="undefined array",
+                template=r"{{ nosuchthing | indices: needles | size }}",
+                expect="2",
+                globals={"needles": ["bar", "baz"]},
+                partials={},
+            ),
+            RenderCase(
+                description="undefined needles",
+                template=r"{{ handles | indices: nosuchthing | size }}",
+                expect="0",
+                globals={"handles": ["foo", "bar"]},
+                partials={},
+            ),
+        ]
+
+        for case in test_cases:
+            env = Environment()
+            env.add_filter("indices", indices)
+            env.loader = DictLoader(case.partials)
+            template = env.from_string(case.template, globals=case.globals)
+
+            with self.subTest(msg=case.description):
+                result = template.render()
+                self.assertEqual(result, case.expect)
+
+
+class IndexByFilterTestCase(FilterTestCase):
+    """Test the index_by template filter."""
+
+    def test_index_by_filter(self) -> None:
+        products = [
+            {"id": 10, "title": "foo"},
+            {"id": 11, "title": "bar"},
+            {"title": "baz"},
+            {"id": 12, "title": "foo"},
+        ]
+
+        test_cases = [
+            Case(
+                description="array of hashes",
+                val=products,
+                args=["id", 11],
+                kwargs={},
+                expect=1,
+            ),
+            Case(
+                description="first of many",
+                val=products,
+                args=["title", "foo"],
+                kwargs={},
+                expect=0,
+            ),
+            Case(
+                description="no such value",
+                val=products,
+                args=["id", 99],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="no such property",
+                val=products,
+                args=["nosuchthing", 1],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="unhashable property values",
+                val=[{"tags": ["a"]}, {"tags": ["b"]}],
+                args=["tags", ["b"]],
+                kwargs={},
+                expect=1,
+            ),
+            Case(
+                description="array of objects",
+                val=[MockObject("Foo", 25), MockObject("Bar", 33)],
+                args=["age", 33],
+                kwargs={},
+                expect=None,
+            ),
+            Case(
+                description="not an array",
+                val={"id": 1},
+                args=["id", 1],
+                kwargs={},
+                expect=FilterValueError,
+            ),
+        ]
+
+        self.env.add_filter("index_by", index_by)
+        self._test(self.ctx.filter("index_by"), test_cases)
+
+    def test_property_index_is_cached_for_the_render(self) -> None:
+        self.env.add_filter("index_by", index_by)
+        filter_ = self.ctx.filter("index_by")
+        products = [{"id": 10}, {"id": 11}]
+
+        self.assertEqual(filter_(products, "id", 11), 1)
+        cache = self.ctx.tag_namespace["index_by_cache"]
+        property_index = cache[(id(products), "id")][1]
+
+        self.assertEqual(filter_(products, "id", 10), 0)
+        self.assertIs(cache[(id(products), "id")][1], property_index)
+        self.assertEqual(len(cache), 1)
+
+
+class RenderIndexByFilterTestCase(RenderFilterTestCase):
+    """Test the index_by filter from a template."""
+
+    def test_render_index_by_filter(self) -> None:
+        products = [{"id": 10, "title": "foo"}, {"id": 11, "title": "bar"}]
+
+        test_cases = [
+            RenderCase(
+                description="array of hashes",
+                template=r"{{ products | index_by: 'title', 'bar' }}",
+                expect="1",
+                globals={"products": products},
+                partials={},
+            ),
+            RenderCase(
+                description="lookup in a loop",
+                template=(
+                    r"{% for id in ids %}"
+                    r"{% assign i = products | index_by: 'id', id %}"
+                    r"{{ products[i].title }},"
+                    r"{% endfor %}"
+                ),
+                expect="bar,foo,,",
+                globals={"products": products, "ids": [11, 10, 12]},
+                partials={},
+            ),
+            RenderCase(
+                description="undefined array",
+                template=r"{{ nosuchthing | index_by: 'id', 1 }}",
+                expect="",
+                globals={},
+                partials={},
+            ),
+        ]
+
+        for case in test_cases:
+            env = Environment()
+            env.add_filter("index_by", index_by)
+            env.loader = DictLoader(case.partials)
+            template = env.from_string(case.template, globals=case.globals)
+
+            with self.subTest(msg=case.description):
+                result = template.render()
+                self.assertEqual(result, case.expect)
@@ -0,0 +1,108 @@
+"""Test cases for per-render macro limits."""
+# pylint: disable=missing-class-docstring,missing-function-docstring
+
+import asyncio
+
+from typing import Optional
+
+from unittest import TestCase
+
+from liquid import Environment
+from liquid.exceptions import ResourceLimitError
+
+from liquid_extra.tags import CallTag
+from liquid_extra.tags import MacroTag
+from liquid_extra.tags.macro import CallNode
+from liquid_extra.tags.macro import MacroCallLimitError
+from liquid_extra.tags.macro import MacroDepthError
+from liquid_extra.tags.macro import MacroLimitError
+from liquid_extra.tags.macro import MacroOutputLimitError
+
+COUNTDOWN = (
+    r"{% macro 'countdown', n %}"
+    r"{{ n }}{% assign m = n | minus: 1 %}"
+    r"{% if n > 0 %}{% call 'countdown', m %}{% endif %}"
+    r"{% endmacro %}"
+    r"{% call 'countdown', n %}"
+)
+
+
+class LimitedEnvironment(Environment):
+    macro_depth_limit: Optional[int] = 5
+    macro_call_limit: Optional[int] = 20
+    macro_output_limit: Optional[int] = 30
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.add_tag(MacroTag)
+        self.add_tag(CallTag)
+
+
+class MacroLimitsTestCase(TestCase):
+    def setUp(self) -> None:
+        self.env = LimitedEnvironment()
+
+    def test_depth_limit(self) -> None:
+        """Test that we limit nested macro calls."""
+        template = self.env.from_string(COUNTDOWN)
+        self.assertEqual(template.render(n=4), "43210")
+
+        with self.assertRaises(MacroDepthError):
+            template.render(n=5)
+
+    def test_call_limit(self) -> None:
+        """Test that we limit the number of macro calls per render."""
+        template = self.env.from_string(
+            r"{% macro 'func' %}.{% endmacro %}"
+            r"{% for i in (1..n) %}{% call 'func' %}{% endfor %}"
+        )
+
+        # The count is reset for each render.
+        self.assertEqual(template.render(n=20), "." * 20)
+        self.assertEqual(template.render(n=20), "." * 20)
+
+        with self.assertRaises(MacroCallLimitError):
+            template.render(n=21)
+
+    def test_output_limit(self) -> None:
+        """Test that we limit the number of characters written by macros."""
+        template = self.env.from_string(
+            r"{% macro 'inner', x %}<{{ x }}>{% endmacro %}"
+            r"{% macro 'outer', x %}[{% call 'inner', x %}]{% endmacro %}"
+            r"{% for i in (1..n) %}{% call 'outer', 'abc' %}{% endfor %}"
+            r"{{ 'not a macro' | append: ' not a macro' }}"
+        )
+
+        # Output from nested calls is counted once. Output from outside of macros is
+        # not counted.
+        self.assertTrue(template.render(n=4).startswith("[<abc>]" * 4))
+
+        with self.assertRaises(MacroOutputLimitError):
+            template.render(n=5)
+
+    def test_limits_async(self) -> None:
+        """Test that we enforce limits when rendering asynchronously."""
+        template = self.env.from_string(COUNTDOWN)
+
+        async def coro(n: int) -> str:
+            return await template.render_async(n=n)
+
+        self.assertEqual(asyncio.run(coro(4)), "43210")
+
+        with self.assertRaises(MacroLimitError):
+            asyncio.run(coro(5))
+
+    def test_limit_errors_are_resource_limit_errors(self) -> None:
+        """Test that macro limit errors can be handled like other resource limits."""
+        template = self.env.from_string(COUNTDOWN)
+        with self.assertRaises(ResourceLimitError):
+            template.render(n=5)
+
+    def test_no_limits_by_default(self) -> None:
+        """Test that there are no macro limits unless the environment says so."""
+        env = Environment()
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+        node = env.from_string(r"{% call 'func' %}").tree.statements[0]
+        assert isinstance(node, CallNode)
+        self.assertIsNone(node.limits)
@@ -0,0 +1,172 @@
+"""Test cases for linking `call` tags to macros defined in the same template."""
+# pylint: disable=missing-class-docstring,missing-function-docstring
+
+import asyncio
+
+from typing import List
+from typing import NamedTuple
+
+from unittest import TestCase
+
+from liquid import DictLoader
+from liquid import Environment
+from liquid.ast import Node
+
+from liquid_extra.tags import CallTag
+from liquid_extra.tags import ImportTag
+from liquid_extra.tags import MacroTag
+from liquid_extra.tags.macro import CallNode
+
+
+class Case(NamedTuple):
+    description: str
+    template: str
+    expect: str
+    linked: bool
+
+
+def find_calls(nodes: List[Node]) -> List[CallNode]:
+    calls: List[CallNode] = []
+    for node in nodes:
+        if isinstance(node, CallNode):
+            calls.append(node)
+        calls.extend(
+            find_calls([child.node for child in node.children() if child.node])
+        )
+    return calls
+
+
+class MacroLinkingTestCase(TestCase):
+    def setUp(self) -> None:
+        self.env = Environment(
+            loader=DictLoader(
+                {
+                    "defs": r"{% macro 'm' %}B{% endmacro %}",
+                    "lib": r"{% macro 'm' %}L{% endmacro %}",
+                }
+            )
+        )
+        self.env.add_tag(MacroTag)
+        self.env.add_tag(CallTag)
+        self.env.add_tag(ImportTag)
+
+    def test_link_calls(self) -> None:
+        """Test that we only link calls to macros that are sure to be defined."""
+        test_cases = [
+            Case(
+                description="top level macro",
+                template=r"{% macro 'm' %}X{% endmacro %}[{% call 'm' %}]",
+                expect="[X]",
+                linked=True,
+            ),
+            Case(
+                description="top level macro after the call",
+                template=r"[{% call 'm' %}]{% macro 'm' %}X{% endmacro %}",
+                expect="[X]",
+                linked=True,
+            ),
+            Case(
+                description="macro after a block containing the call",
+                template=(
+                    r"{% for i in (1..2) %}{% call 'm' %}{% endfor %}"
+                    r"{% macro 'm' %}X{% endmacro %}"
+                ),
+                expect="XX",
+                linked=True,
+            ),
+            Case(
+                description="macro in a block that is not rendered",
+                template=(
+                    r"{% if false %}{% macro 'm' %}X{% endmacro %}{% endif %}"
+                    r"[{% call 'm' %}]"
+                ),
+                expect="[]",
+                linked=False,
+            ),
+            Case(
+                description="macro in a block after a call",
+                template=(
+                    r"[{% call 'm' %}]"
+                    r"{% if false %}{% macro 'm' %}X{% endmacro %}{% endif %}"
+                ),
+                expect="[]",
+                linked=False,
+            ),
+            Case(
+                description="macro defined in a macro",
+                template=(
+                    r"{% macro 'outer' %}{% macro 'm' %}X{% endmacro %}{% endmacro %}"
+                    r"[{% call 'm' %}]"
+                ),
+                expect="[]",
+                linked=False,
+            ),
+            Case(
+                description="end tags in a comment",
+                template=(
+                    r"{% if true %}{% comment %}{% endif %}{% endcomment %}"
+                    r"{% macro 'm' %}X{% endmacro %}{% endif %}"
+                    r"[{% call 'm' %}]"
+                ),
+                expect="[X]",
+                linked=False,
+            ),
+            Case(
+                description="include",
+                template=(
+                    r"{% macro 'm' %}A{% endmacro %}"
+                    r"{% include 'defs' %}[{% call 'm' %}]"
+                ),
+                expect="[B]",
+                linked=False,
+            ),
+            Case(
+                description="import",
+                template=(
+                    r"{% macro 'm' %}A{% endmacro %}"
+                    r"{% import 'lib' %}[{% call 'm' %}]"
+                ),
+                expect="[L]",
+                linked=False,
+            ),
+            Case(
+                description="macro defined in a liquid tag",
+                template=(
+                    "{% macro 'm' %}A{% endmacro %}"
+                    "{% liquid\nmacro 'm'\necho 'B'\nendmacro %}"
+                    "[{% call 'm' %}]"
+                ),
+                expect="[B]",
+                linked=False,
+            ),
+            Case(
+                description="call in a liquid tag",
+                template="{% macro 'm' %}X{% endmacro %}{% liquid\ncall 'm' %}",
+                expect="X",
+                linked=True,
+            ),
+            Case(
+                description="call before a macro defined in the same liquid tag",
+                template=(
+                    "{% macro 'm' %}OUTER{% endmacro %}"
+                    "{% liquid\ncall 'm'\nmacro 'm'\necho 'INNER'\nendmacro %}"
+                ),
+                expect="OUTER",
+                linked=False,
+            ),
+        ]
+
+        for case in test_cases:
+            template = self.env.from_string(case.template)
+
+            with self.subTest(msg=case.description):
+                self.assertEqual(template.render(), case.expect)
+                for call in find_calls(template.tree.statements):
+                    self.assertEqual(call.macro is not None, case.linked)
+
+            with self.subTest(msg=case.description, asynchronous=True):
+
+                async def coro() -> str:
+                    return await template.render_async()  # pylint: disable=W0640
+
+                self.assertEqual(asyncio.run(coro()), case.expect)
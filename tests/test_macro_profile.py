@@ -0,0 +1,97 @@
+"""Test cases for macro call profiling."""
+# pylint: disable=missing-class-docstring,missing-function-docstring
+
+import asyncio
+import io
+
+from unittest import TestCase
+
+from liquid import Context
+from liquid import Environment
+
+from liquid_extra.minify import HTMLMinifier
+from liquid_extra.tags import CallTag
+from liquid_extra.tags import MacroTag
+from liquid_extra.tags.macro import MacroProfiler
+from liquid_extra.tags.macro import macro_profile
+
+
+class ProfilingEnvironment(Environment):
+    """An environment that profiles macro calls."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.macro_profiler = MacroProfiler()
+        self.add_tag(MacroTag)
+        self.add_tag(CallTag)
+
+
+class MacroProfileTestCase(TestCase):
+    source = (
+        r"{% macro 'inner', x %}<{{ x }}>{% endmacro %}"
+        r"{% macro 'outer', a %}[{% call 'inner', a %}{% call 'inner', a %}]"
+        r"{% endmacro %}"
+        r"{% call 'outer', 'ab' %}"
+    )
+
+    def test_profile_macro_calls(self) -> None:
+        """Test that we collect call statistics per render and per profiler."""
+        env = ProfilingEnvironment()
+        template = env.from_string(self.source)
+
+        for renders in (1, 2):
+            context = Context(env, globals=template.make_globals({}))
+            buffer = io.StringIO()
+            template.render_with_context(context, buffer)
+            self.assertEqual(buffer.getvalue(), "[<ab><ab>]")
+
+            profile = macro_profile(context)
+            self.assertEqual(set(profile.stats), {"inner", "outer"})
+            self.assertEqual(profile.stats["outer"].calls, 1)
+            self.assertEqual(profile.stats["outer"].written, 10)
+            self.assertEqual(profile.stats["inner"].calls, 2)
+            self.assertEqual(profile.stats["inner"].written, 8)
+
+            lifetime = env.macro_profiler.stats
+            self.assertEqual(lifetime["outer"].calls, renders)
+            self.assertEqual(lifetime["inner"].calls, renders * 2)
+
+        outer = profile.stats["outer"]
+        inner = profile.stats["inner"]
+        self.assertAlmostEqual(outer.self_time, outer.total_time - inner.total_time)
+        self.assertLessEqual(outer.bind_time, outer.self_time)
+        self.assertLessEqual(inner.self_time, inner.total_time)
+        self.assertIn("outer", env.macro_profiler.report())
+
+    def test_count_characters_written_to_any_stream(self) -> None:
+        """Test that we count output written to streams that can't tell us how much
+        has been written."""
+        env = ProfilingEnvironment()
+        template = env.from_string(self.source)
+        context = Context(env, globals=template.make_globals({}))
+        buffer = HTMLMinifier(io.StringIO())
+        template.render_with_context(context, buffer)  # type: ignore
+        self.assertEqual(buffer.getvalue(), "[<ab><ab>]")
+        self.assertEqual(macro_profile(context).stats["outer"].written, 10)
+
+    def test_profile_async(self) -> None:
+        """Test that we profile macro calls when rendering asynchronously."""
+        env = ProfilingEnvironment()
+        template = env.from_string(self.source)
+
+        async def coro() -> str:
+            return await template.render_async()
+
+        self.assertEqual(asyncio.run(coro()), "[<ab><ab>]")
+        self.assertEqual(env.macro_profiler.stats["inner"].calls, 2)
+        self.assertEqual(env.macro_profiler.stats["inner"].written, 8)
+
+    def test_profiling_is_disabled_by_default(self) -> None:
+        """Test that we don't profile macro calls unless the environment says so."""
+        env = Environment()
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+        template = env.from_string(self.source)
+        context = Context(env, globals=template.make_globals({}))
+        template.render_with_context(context, io.StringIO())
+        self.assertEqual(macro_profile(context).stats, {})
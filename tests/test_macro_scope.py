@@ -0,0 +1,93 @@
+"""Test cases for isolating stateful tags inside macros."""
+# pylint: disable=missing-class-docstring,missing-function-docstring
+
+import asyncio
+
+from typing import NamedTuple
+
+from unittest import TestCase
+
+from liquid import Environment
+
+from liquid_extra.tags import CallTag
+from liquid_extra.tags import MacroTag
+
+
+class Case(NamedTuple):
+    description: str
+    template: str
+    expect: str
+
+
+class MacroScopeTestCase(TestCase):
+    def setUp(self) -> None:
+        self.env = Environment()
+        self.env.add_tag(MacroTag)
+        self.env.add_tag(CallTag)
+
+    def test_stateful_tags(self) -> None:
+        """Test that stateful tags in a macro don't share state with the caller."""
+        test_cases = [
+            Case(
+                description="cycle",
+                template=(
+                    r"{% macro 'm' %}{% cycle 'a', 'b' %}{% endmacro %}"
+                    r"{% cycle 'a', 'b' %}{% call 'm' %}{% cycle 'a', 'b' %}"
+                ),
+                expect="aab",
+            ),
+            Case(
+                description="cycle in repeated calls",
+                template=(
+                    r"{% macro 'm' %}{% cycle 'a', 'b' %}{% endmacro %}"
+                    r"{% call 'm' %}{% call 'm' %}"
+                ),
+                expect="aa",
+            ),
+            Case(
+                description="ifchanged",
+                template=(
+                    r"{% macro 'm' %}{% ifchanged %}A{% endifchanged %}{% endmacro %}"
+                    r"{% ifchanged %}A{% endifchanged %}"
+                    r"{% call 'm' %}"
+                    r"{% ifchanged %}A{% endifchanged %}"
+                ),
+                expect="AA",
+            ),
+            Case(
+                description="offset continue",
+                template=(
+                    r"{% macro 'm' %}"
+                    r"{% for x in (1..5) limit: 3 %}{{ x }}{% endfor %}"
+                    r"{% endmacro %}"
+                    r"{% for x in (1..5) limit: 2 %}{{ x }}{% endfor %}"
+                    r"{% call 'm' %}"
+                    r"{% for x in (1..5) offset: continue %}{{ x }}{% endfor %}"
+                ),
+                expect="12123345",
+            ),
+            Case(
+                description="nested calls",
+                template=(
+                    r"{% macro 'inner' %}{% cycle 'a', 'b' %}{% endmacro %}"
+                    r"{% macro 'outer' %}"
+                    r"{% cycle 'a', 'b' %}{% call 'inner' %}{% cycle 'a', 'b' %}"
+                    r"{% endmacro %}"
+                    r"{% cycle 'a', 'b' %}{% call 'outer' %}{% cycle 'a', 'b' %}"
+                ),
+                expect="aaabb",
+            ),
+        ]
+
+        for case in test_cases:
+            template = self.env.from_string(case.template)
+
+            with self.subTest(msg=case.description):
+                self.assertEqual(template.render(), case.expect)
+
+            with self.subTest(msg=case.description, asynchronous=True):
+
+                async def coro() -> str:
+                    return await template.render_async()  # pylint: disable=W0640
+
+                self.assertEqual(asyncio.run(coro()), case.expect)
@@ -1,4 +1,4 @@
-"""Test cases for `macro` and `call` tags."""
+"""Test cases for `macro`, `call` and `import` tags."""
 # pylint: disable=missing-class-docstring,missing-function-docstring
 
 import asyncio
@@ -9,10 +9,18 @@ from typing import NamedTuple
 from typing import Any
 from typing import Dict
 
+from liquid.context import Context
 from liquid.context import StrictUndefined
+from liquid.context import Undefined
 from liquid.environment import Environment
+from liquid.mode import Mode
+from liquid.exceptions import ContextDepthError
+from liquid.exceptions import LiquidSyntaxError
+from liquid.exceptions import TemplateNotFound
 from liquid.exceptions import UndefinedError
 from liquid.loaders import DictLoader
+from liquid.loaders import TemplateSource
+from liquid.filter import with_context
 
 from liquid.token import Token
 from liquid.token import TOKEN_IDENTIFIER
@@ -23,6 +31,11 @@ from liquid.token import TOKEN_COMMA
 
 from liquid_extra.tags import MacroTag
 from liquid_extra.tags import CallTag
+from liquid_extra.tags import ImportTag
+from liquid_extra.tags.macro import CallNode
+from liquid_extra.tags.macro import MacroNode
+from liquid_extra.tags.macro import macro_cache_info
+from liquid_extra.tags.macro import missing_argument
 from liquid_extra.tags.macro import tokenize_macro_expression
 
 
@@ -309,6 +322,650 @@ class MacroRenderTestCase(TestCase):
         result = asyncio.run(coro())
         self.assertEqual(result, "Hello, World!Hello, you!")
 
+    def test_binding_plan_per_macro(self) -> None:
+        """Test that a call site binds arguments for each macro it calls."""
+        env = Environment()
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+
+        template = env.from_string(
+            r"{% for x in (1..4) %}"
+            r"{% assign odd = x | modulo: 2 %}"
+            r"{% if odd == 1 %}"
+            r"{% macro 'f', a %}A{{ a }}{{ args | join }}{% endmacro %}"
+            r"{% else %}"
+            r"{% macro 'f', b, c: 'c' %}B{{ b }}{{ c }}{{ args | join }}{% endmacro %}"
+            r"{% endif %}"
+            r"{% call 'f', x, 'y' %}"
+            r"{% endfor %}"
+        )
+
+        self.assertEqual(template.render(), "A1yB2yA3yB4y")
+        self.assertEqual(template.render(), "A1yB2yA3yB4y")
+
+    def test_macro_scope(self) -> None:
+        """Test that macros are rendered in an isolated scope."""
+        test_cases = [
+            RenderCase(
+                description="assign inside macro",
+                template=(
+                    r"{% assign x = 1 %}"
+                    r"{% macro 'func' %}{% assign x = 2 %}{{ x }}{% endmacro %}"
+                    r"{% call 'func' %}{{ x }}"
+                ),
+                expect="21",
+                globals={},
+                partials={},
+            ),
+            RenderCase(
+                description="locals are not visible inside macro",
+                template=(
+                    r"{% assign x = 1 %}"
+                    r"{% macro 'func' %}{{ x }}{{ y }}{% endmacro %}"
+                    r"{% call 'func' %}"
+                ),
+                expect="2",
+                globals={"y": 2},
+                partials={},
+            ),
+            RenderCase(
+                description="arguments shadow globals",
+                template=(
+                    r"{% macro 'func', y %}{{ y }}{% endmacro %}"
+                    r"{% call 'func', 3 %}{{ y }}"
+                ),
+                expect="32",
+                globals={"y": 2},
+                partials={},
+            ),
+            RenderCase(
+                description="counters",
+                template=(
+                    r"{% increment x %}"
+                    r"{% macro 'func' %}{% increment x %}{% endmacro %}"
+                    r"{% call 'func' %}{% call 'func' %}{% increment x %}"
+                ),
+                expect="0001",
+                globals={},
+                partials={},
+            ),
+            RenderCase(
+                description="parent loop",
+                template=(
+                    r"{% macro 'func' %}{{ forloop.index }}{% endmacro %}"
+                    r"{% for x in (1..2) %}{% call 'func' %}{{ forloop.index }}"
+                    r"{% endfor %}"
+                ),
+                expect="12",
+                globals={},
+                partials={},
+            ),
+            RenderCase(
+                description="call a macro from a macro",
+                template=(
+                    r"{% macro 'inner', you %}Hello, {{ you }}!{% endmacro %}"
+                    r"{% macro 'outer', you %}<{% call 'inner', you %}>{% endmacro %}"
+                    r"{% call 'outer', 'World' %}"
+                ),
+                expect="<Hello, World!>",
+                globals={},
+                partials={},
+            ),
+            RenderCase(
+                description="include is disabled",
+                template=(
+                    r"{% macro 'func' %}{% include 'foo' %}{% endmacro %}"
+                    r"{% call 'func' %}{% include 'foo' %}"
+                ),
+                expect="foo",
+                globals={},
+                partials={"foo": "foo"},
+            ),
+        ]
+
+        for case in test_cases:
+            env = Environment(loader=DictLoader(case.partials), tolerance=Mode.LAX)
+            env.add_tag(MacroTag)
+            env.add_tag(CallTag)
+
+            template = env.from_string(case.template, globals=case.globals)
+
+            with self.subTest(msg=case.description):
+                result = template.render()
+                self.assertEqual(result, case.expect)
+
+    def test_recursive_macro(self) -> None:
+        """Test that we guard against runaway recursion."""
+        env = Environment()
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+
+        template = env.from_string(
+            r"{% macro 'countdown', n %}"
+            r"{{ n }}{% assign m = n | minus: 1 %}"
+            r"{% if n > 0 %}{% call 'countdown', m %}{% endif %}"
+            r"{% endmacro %}"
+            r"{% call 'countdown', n %}"
+        )
+
+        self.assertEqual(template.render(n=3), "3210")
+
+        with self.assertRaises(ContextDepthError):
+            template.render(n=1000)
+
+
+class AsyncDrop:
+    """A mock drop that fetches its items asynchronously."""
+
+    def __init__(self, items: Dict[str, object]):
+        self.items = items
+        self.active = 0
+        self.max_active = 0
+
+    def __getitem__(self, key: str) -> object:
+        raise KeyError(key)
+
+    async def __getitem_async__(self, key: str) -> object:
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return self.items[key]
+
+
+class AsyncMacroArgumentsTestCase(TestCase):
+    def test_await_async_drop_arguments(self) -> None:
+        """Test that we evaluate macro arguments asynchronously and concurrently."""
+        env = Environment()
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+
+        template = env.from_string(
+            r"{% macro 'func', a, b %}"
+            r"{{ a }} {{ b }} {{ args[0] }} {{ kwargs.d }}"
+            r"{% endmacro %}"
+            r"{% call 'func', drop.a, drop.b, drop.c, d: drop.d %}"
+        )
+
+        drop = AsyncDrop({"a": "A", "b": "B", "c": "C", "d": "D"})
+
+        async def coro() -> str:
+            return await template.render_async(drop=drop)
+
+        self.assertEqual(asyncio.run(coro()), "A B C D")
+        self.assertEqual(drop.max_active, 4)
+
+    def test_await_single_async_drop_argument(self) -> None:
+        """Test that we evaluate a single macro argument asynchronously."""
+        env = Environment()
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+
+        template = env.from_string(
+            r"{% macro 'func', a %}{{ a }}{% endmacro %}{% call 'func', drop.a %}"
+        )
+
+        async def coro() -> str:
+            return await template.render_async(drop=AsyncDrop({"a": "A"}))
+
+        self.assertEqual(asyncio.run(coro()), "A")
+
+
+class CountingDrop:
+    """A mock drop that counts how many times each of its properties is read."""
+
+    def __init__(self) -> None:
+        self.reads: Dict[str, int] = {}
+
+    def __getitem__(self, key: str) -> object:
+        self.reads[key] = self.reads.get(key, 0) + 1
+        return key.upper()
+
+
+class LazyMacroArgumentsTestCase(TestCase):
+    def setUp(self) -> None:
+        self.env = Environment(loader=DictLoader({"partial": r"{{ b }}"}))
+        self.env.add_tag(MacroTag)
+        self.env.add_tag(CallTag)
+
+    def test_unreferenced_arguments(self) -> None:
+        """Test that we don't evaluate arguments a macro never references."""
+        # Excess arguments that are never referenced are an error in strict mode.
+        self.env.mode = Mode.LAX
+        template = self.env.from_string(
+            r"{% macro 'func', a, b %}{{ a }}{% endmacro %}"
+            r"{% call 'func', drop.a, drop.b, drop.c, d: drop.d %}"
+        )
+
+        drop = CountingDrop()
+        self.assertEqual(template.render(drop=drop), "A")
+        self.assertEqual(drop.reads, {"a": 1})
+
+        async def coro() -> str:
+            return await template.render_async(drop=drop)
+
+        self.assertEqual(asyncio.run(coro()), "A")
+        self.assertEqual(drop.reads, {"a": 2})
+
+    def test_lazy_arguments(self) -> None:
+        """Test that we evaluate referenced arguments once, when first accessed."""
+        template = self.env.from_string(
+            r"{% macro 'func', a, b %}"
+            r"{{ a }}{{ a }}{% if false %}{{ b }}{{ args }}{% endif %}"
+            r"{% endmacro %}"
+            r"{% call 'func', drop.a, drop.b, drop.c %}"
+        )
+
+        drop = CountingDrop()
+        self.assertEqual(template.render(drop=drop), "AA")
+        self.assertEqual(drop.reads, {"a": 1})
+
+    def test_lazy_arguments_are_evaluated_in_the_calling_scope(self) -> None:
+        """Test that lazy arguments see variables from the call site."""
+        template = self.env.from_string(
+            r"{% macro 'func', a, b %}"
+            r"{% assign x = 'inner' %}"
+            r"{% for y in (1..1) %}{{ a }} {{ b }} {% endfor %}"
+            r"{% endmacro %}"
+            r"{% assign x = 'outer' %}"
+            r"{% for y in (1..2) %}{% call 'func', x, forloop.index %}{% endfor %}"
+        )
+
+        self.assertEqual(template.render(), "outer 1 outer 2 ")
+
+    def test_arguments_visible_to_rendered_templates(self) -> None:
+        """Test that we bind every argument if a macro renders a template."""
+        template = self.env.from_string(
+            r"{% macro 'func', a, b %}{% render 'partial' %}{% endmacro %}"
+            r"{% call 'func', 1, 2 %}"
+        )
+        self.assertEqual(template.render(), "2")
+
+    def test_arguments_visible_to_context_filters(self) -> None:
+        """Test that we bind every argument if a macro uses a context filter."""
+
+        @with_context
+        def resolve(name: str, *, context: Context) -> object:
+            return context.resolve(name)
+
+        self.env.add_filter("resolve", resolve)
+        template = self.env.from_string(
+            r"{% macro 'func', a, b %}{{ 'b' | resolve }}{% endmacro %}"
+            r"{% call 'func', 1, 2 %}"
+        )
+        self.assertEqual(template.render(), "2")
+
+
+class NamedUndefined(Undefined):
+    def __str__(self) -> str:
+        return f"<{self.name}>"
+
+
+class MissingMacroArgumentsTestCase(TestCase):
+    def test_shared_placeholders(self) -> None:
+        """Test that we share undefined placeholders between missing arguments."""
+        for undefined in (Undefined, StrictUndefined):
+            env = Environment(undefined=undefined)
+            with self.subTest(undefined=undefined.__name__):
+                placeholder = missing_argument(env, "a")
+                self.assertIsInstance(placeholder, undefined)
+                self.assertIs(missing_argument(env, "a"), placeholder)
+                self.assertIsNot(missing_argument(env, "b"), placeholder)
+
+    def test_other_undefined_types(self) -> None:
+        """Test that we don't share instances of other undefined types."""
+        env = Environment(undefined=NamedUndefined)
+        self.assertIsNot(missing_argument(env, "a"), missing_argument(env, "a"))
+
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+        template = env.from_string(
+            r"{% macro 'func', a, b: nil %}{{ a }}{{ b }}{% endmacro %}"
+            r"{% macro 'cached', a, b: nil cache %}{{ a }}{{ b }}{% endmacro %}"
+            r"{% call 'func' %} {% call 'func', 1 %} {% call 'cached' %}"
+        )
+        self.assertEqual(template.render(), "<a><b> 1<b> <a><b>")
+
+        async def coro() -> str:
+            return await template.render_async()
+
+        self.assertEqual(asyncio.run(coro()), "<a><b> 1<b> <a><b>")
+
+
+class LinkMacroTestCase(TestCase):
+    def test_link_calls_to_macros(self) -> None:
+        """Test that we resolve calls to macros defined in the same template."""
+        test_cases = [
+            RenderCase(
+                description="call before macro",
+                template=(
+                    r"{% call 'func', 'World' %}"
+                    r"{% macro 'func', you %}Hello, {{ you }}!{% endmacro %}"
+                ),
+                expect="Hello, World!",
+                globals={},
+                partials={},
+            ),
+            RenderCase(
+                description="macro defined more than once",
+                template=(
+                    r"{% call 'func' %}"
+                    r"{% macro 'func' %}A{% endmacro %}"
+                    r"{% call 'func' %}"
+                    r"{% macro 'func' %}B{% endmacro %}"
+                    r"{% call 'func' %}"
+                ),
+                expect="AB",
+                globals={},
+                partials={},
+            ),
+            RenderCase(
+                description="call macro from an included template",
+                template=(
+                    r"{% macro 'func' %}Hello, World!{% endmacro %}"
+                    r"{% include 'partial' %}"
+                ),
+                expect="Hello, World!",
+                globals={},
+                partials={"partial": r"{% call 'func' %}"},
+            ),
+            RenderCase(
+                description="macro in an included template",
+                template=(r"{% include 'partial' %}{% call 'func' %}"),
+                expect="Hello, World!",
+                globals={},
+                partials={"partial": r"{% macro 'func' %}Hello, World!{% endmacro %}"},
+            ),
+        ]
+
+        for case in test_cases:
+            env = Environment(loader=DictLoader(case.partials))
+            env.add_tag(MacroTag)
+            env.add_tag(CallTag)
+
+            template = env.from_string(case.template, globals=case.globals)
+
+            with self.subTest(msg=case.description):
+                result = template.render()
+                self.assertEqual(result, case.expect)
+
+    def test_linked_call_nodes(self) -> None:
+        """Test that call nodes hold a reference to their macro after rendering."""
+        env = Environment()
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+
+        template = env.from_string(
+            r"{% call 'foo' %}"
+            r"{% macro 'foo' %}{% endmacro %}"
+            r"{% call 'foo' %}"
+            r"{% call 'bar' %}"
+            r"{% macro 'baz' %}{% endmacro %}"
+            r"{% macro 'baz' %}{% endmacro %}"
+            r"{% call 'baz' %}"
+        )
+        template.render()
+
+        nodes = template.tree.statements
+        assert isinstance(nodes[0], CallNode)
+        assert isinstance(nodes[1], MacroNode)
+        assert isinstance(nodes[2], CallNode)
+        assert isinstance(nodes[3], CallNode)
+        assert isinstance(nodes[6], CallNode)
+
+        self.assertIs(nodes[0].macro, nodes[1].macro)
+        self.assertIs(nodes[2].macro, nodes[1].macro)
+        self.assertIsNone(nodes[3].macro)
+        self.assertIsNone(nodes[6].macro)
+
+
+class MacroCacheTestCase(TestCase):
+    def setUp(self) -> None:
+        self.env = Environment()
+        self.env.add_tag(MacroTag)
+        self.env.add_tag(CallTag)
+
+    def test_cache_modifier(self) -> None:
+        """Test that we only render a cached macro once per distinct argument."""
+        template = self.env.from_string(
+            r"{% macro 'icon', name, size: 16 cache %}"
+            r"<i class='{{ name }}' width={{ size }}></i>"
+            r"{% endmacro %}"
+            r"{% for i in (1..300) %}"
+            r"{% assign n = i | modulo: 12 %}"
+            r"{% call 'icon', n %}"
+            r"{% endfor %}"
+        )
+
+        expect = "".join(f"<i class='{i % 12}' width=16></i>" for i in range(1, 301))
+        self.assertEqual(template.render(), expect)
+
+        info = macro_cache_info(template)["icon"]
+        self.assertEqual(info.misses, 12)
+        self.assertEqual(info.hits, 288)
+        self.assertEqual(info.bypassed, 0)
+        self.assertEqual(info.currsize, 12)
+
+        # The cache outlives a single render.
+        template.render()
+        info = macro_cache_info(template)["icon"]
+        self.assertEqual(info.misses, 12)
+        self.assertEqual(info.hits, 588)
+
+    def test_cached_output(self) -> None:
+        """Test that cached output is the same as uncached output."""
+        source = (
+            r"{% macro 'func', a, b: 'x' cache %}"
+            r"{{ a }}-{{ b }}-{{ args | join: '+' }}"
+            r"{% for kwarg in kwargs %}{{ kwarg[0] }}={{ kwarg[1] }}{% endfor %};"
+            r"{% endmacro %}"
+            r"{% call 'func', 1 %}{% call 'func', 1 %}"
+            r"{% call 'func', 1.0 %}{% call 'func', true %}"
+            r"{% call 'func', 1, 2, 3 %}{% call 'func', 1, 2, 3 %}"
+            r"{% call 'func', 1, c: 3 %}{% call 'func', 1, c: 3 %}"
+            r"{% call 'func' %}{% call 'func' %}"
+            r"{% call 'func', xs %}{% call 'func', xs %}"
+        )
+
+        cached = self.env.from_string(source)
+        uncached = self.env.from_string(source.replace(" cache %}", " %}", 1))
+
+        self.assertEqual(cached.render(xs=[1]), uncached.render(xs=[1]))
+
+        info = macro_cache_info(cached)["func"]
+        self.assertEqual(info.misses, 6)
+        self.assertEqual(info.hits, 4)
+        self.assertEqual(info.bypassed, 2)
+        self.assertEqual(macro_cache_info(uncached), {})
+
+    def test_cache_size(self) -> None:
+        """Test that we discard least recently used output."""
+
+        class SmallCacheMacroTag(MacroTag):
+            cache_size = 2
+
+        self.env.add_tag(SmallCacheMacroTag)
+        template = self.env.from_string(
+            r"{% macro 'func', a cache %}{{ a }}{% endmacro %}"
+            r"{% call 'func', 1 %}{% call 'func', 2 %}{% call 'func', 1 %}"
+            r"{% call 'func', 3 %}{% call 'func', 1 %}{% call 'func', 2 %}"
+        )
+
+        self.assertEqual(template.render(), "121312")
+        info = macro_cache_info(template)["func"]
+        self.assertEqual(info.misses, 4)
+        self.assertEqual(info.hits, 2)
+        self.assertEqual(info.currsize, 2)
+
+    def test_cache_modifier_or_argument(self) -> None:
+        """Test that we can tell a cache modifier from an argument called cache."""
+        test_cases = [
+            (r"{% macro 'func' cache %}{{ cache }}{% endmacro %}", ["cache"], False),
+            (r"{% macro 'func', cache %}{% endmacro %}", ["cache"], False),
+            (r"{% macro 'func', a cache %}{% endmacro %}", ["a"], True),
+            (r"{% macro 'func', a: cache %}{% endmacro %}", ["a"], False),
+            (r"{% macro 'func', a: b.cache %}{% endmacro %}", ["a"], False),
+            (r"{% macro 'func', a: b.cache cache %}{% endmacro %}", ["a"], True),
+        ]
+
+        for source, names, cached in test_cases:
+            with self.subTest(msg=source):
+                node = self.env.from_string(source).tree.statements[0]
+                assert isinstance(node, MacroNode)
+                self.assertEqual([arg.name for arg in node.args], names)
+                self.assertEqual(node.cache is not None, cached)
+
+
+class MockLoader(DictLoader):
+    """A dict loader that counts loads and supports up-to-date checks."""
+
+    def __init__(self, templates: Dict[str, str]):
+        super().__init__(templates)
+        self.loads = 0
+        self.uptodate = True
+
+    def get_source(self, env: Environment, template_name: str) -> TemplateSource:
+        self.loads += 1
+        source = super().get_source(env, template_name)
+        return TemplateSource(source.source, source.filename, lambda: self.uptodate)
+
+
+class ImportMacroTestCase(TestCase):
+    def setUp(self) -> None:
+        self.loader = MockLoader(
+            {
+                "macros/greetings.liquid": (
+                    r"Not rendered"
+                    r"{% macro 'hello', you: 'World' %}Hello, {{ you }}!{% endmacro %}"
+                    r"{% macro 'shout', you %}{% call 'hello', you %}!!{% endmacro %}"
+                ),
+            }
+        )
+        self.env = Environment(loader=self.loader, cache_size=0)
+        self.env.add_tag(MacroTag)
+        self.env.add_tag(CallTag)
+        self.env.add_tag(ImportTag)
+
+    def test_import_macros(self) -> None:
+        """Test that we can call macros imported from another template."""
+        template = self.env.from_string(
+            r"{% import 'macros/greetings.liquid' %}"
+            r"{% call 'hello' %} {% call 'shout', 'you' %}"
+        )
+
+        self.assertEqual(template.render(), "Hello, World! Hello, you!!!")
+
+        async def coro() -> str:
+            return await template.render_async()
+
+        self.assertEqual(asyncio.run(coro()), "Hello, World! Hello, you!!!")
+
+    def test_import_once(self) -> None:
+        """Test that we load macro libraries once, until they are out of date."""
+        template = self.env.from_string(
+            r"{% import 'macros/greetings.liquid' %}"
+            r"{% import 'macros/greetings.liquid' %}"
+            r"{% call 'hello' %}"
+        )
+
+        template.render()
+        template.render()
+        self.assertEqual(self.loader.loads, 1)
+
+        self.loader.uptodate = False
+        template.render()
+        self.assertEqual(self.loader.loads, 3)
+
+    def test_import_missing_template(self) -> None:
+        """Test that we raise an exception if a library does not exist."""
+        template = self.env.from_string(r"{% import 'nosuchthing' %}")
+        with self.assertRaises(TemplateNotFound):
+            template.render()
+
+    def test_import_name_must_be_a_string(self) -> None:
+        """Test that the library name must be a string literal."""
+        with self.assertRaises(LiquidSyntaxError):
+            self.env.from_string(r"{% import nosuchthing %}")
+
+
+class InliningEnvironment(Environment):
+    macro_inline_threshold = 5
+
+
+class InlineMacroTestCase(TestCase):
+    def test_inline_macro_output(self) -> None:
+        """Test that inlined macros render the same as macros with their own scope."""
+        test_cases = [
+            r"{% macro 'func', you %}Hello, {{ you }}!{% endmacro %}"
+            r"{% call 'func', 'World' %}{% call 'func', name %}{% call 'func' %}",
+            r"{% assign you = 'outer' %}"
+            r"{% macro 'func', you %}{{ you }}{% endmacro %}"
+            r"{% call 'func', 'inner' %}{{ you }}",
+            r"{% macro 'func', a, b: name %}{{ a }}-{{ b }}{% endmacro %}"
+            r"{% call 'func', name %}{% call 'func', 'x', b: 'y' %}",
+            r"{% macro 'func' %}{{ args }}{{ kwargs.x }}{% endmacro %}"
+            r"{% call 'func', 1, 2, x: 3 %}",
+            r"{% macro 'func', a, b: 1 %}{{ a[0] }}{{ a[b] }}{{ a.size }}{% endmacro %}"
+            r"{% call 'func', items %}",
+        ]
+
+        data = {"name": 1, "items": ["a", "b"]}
+        for source in test_cases:
+            env = Environment()
+            env.add_tag(MacroTag)
+            env.add_tag(CallTag)
+
+            inline_env = InliningEnvironment()
+            inline_env.add_tag(MacroTag)
+            inline_env.add_tag(CallTag)
+
+            template = env.from_string(source)
+            inline_template = inline_env.from_string(source)
+            macros = [
+                node
+                for node in inline_template.tree.statements
+                if isinstance(node, MacroNode)
+            ]
+
+            with self.subTest(msg=source):
+                self.assertTrue(all(node.macro.inline for node in macros))
+                self.assertEqual(
+                    inline_template.render(**data), template.render(**data)
+                )
+
+    def test_macros_that_can_not_be_inlined(self) -> None:
+        """Test that we only inline small macros that reference their arguments."""
+        test_cases = [
+            r"{% macro 'func', you %}{{ greeting }}, {{ you }}!{% endmacro %}",
+            r"{% macro 'func', you %}{% if you %}{{ you }}{% endif %}{% endmacro %}",
+            r"{% macro 'func', you %}{% assign x = you %}{% endmacro %}",
+            r"{% macro 'func', a %}{{ a | default: b }}{% endmacro %}",
+            r"{% macro 'func', a %}{{ a[b] }}{% endmacro %}",
+            r"{% macro 'func', a %}{{ a }}{{ a }}{{ a }}{{ a }}{{ a }}{{ a }}{% endmacro %}",
+            r"{% macro 'func', a cache %}{{ a }}{% endmacro %}",
+            r"{% macro 'func', a %}{{ a | upcase }}{% endmacro %}",
+            r"{% macro 'func' %}{{ args | join: '-' }}{% endmacro %}",
+        ]
+
+        env = InliningEnvironment()
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+
+        for source in test_cases:
+            with self.subTest(msg=source):
+                node = env.from_string(source).tree.statements[0]
+                assert isinstance(node, MacroNode)
+                self.assertFalse(node.macro.inline)
+
+    def test_inlining_is_disabled_by_default(self) -> None:
+        """Test that we don't inline macros unless the environment says so."""
+        env = Environment()
+        env.add_tag(MacroTag)
+        node = env.from_string(r"{% macro 'func', a %}{{ a }}{% endmacro %}")
+        statement = node.tree.statements[0]
+        assert isinstance(statement, MacroNode)
+        self.assertFalse(statement.macro.inline)
+
 
 class AnalyzeMacroTestCase(TestCase):
     def test_analyze_macro_tag(self) -> None:
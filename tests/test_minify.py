@@ -0,0 +1,187 @@
+"""Test cases for the streaming HTML minifier."""
+# pylint: disable=missing-class-docstring,missing-function-docstring
+
+import asyncio
+import io
+
+from typing import List
+from typing import NamedTuple
+
+from unittest import TestCase
+
+from liquid import Context
+from liquid import DictLoader
+from liquid import Environment
+from liquid.exceptions import OutputStreamLimitError
+from liquid.filter import with_context
+
+from liquid_extra.minify import HTMLMinifier
+from liquid_extra.minify import render_minified
+from liquid_extra.minify import render_minified_async
+from liquid_extra.tags import MacroTag
+from liquid_extra.tags import CallTag
+from liquid_extra.tags import WithTag
+
+
+class Case(NamedTuple):
+    description: str
+    source: str
+    expect: str
+
+
+def minify(chunks: List[str]) -> str:
+    minifier = HTMLMinifier(io.StringIO())
+    for chunk in chunks:
+        minifier.write(chunk)
+    return str(minifier.getvalue())
+
+
+class HTMLMinifierTestCase(TestCase):
+    def test_minify(self) -> None:
+        """Test that we collapse whitespace between tags."""
+        test_cases = [
+            Case(
+                description="indentation",
+                source="<ul>\n  <li>a</li>\n  <li>b</li>\n</ul>",
+                expect="<ul>\n<li>a</li>\n<li>b</li>\n</ul>",
+            ),
+            Case(
+                description="spaces",
+                source="<b>a</b>    <i>b</i>",
+                expect="<b>a</b> <i>b</i>",
+            ),
+            Case(
+                description="text",
+                source="<p>Hello,   \t World!  </p>",
+                expect="<p>Hello, World! </p>",
+            ),
+            Case(
+                description="non-breaking spaces",
+                source="<p>a\xa0\xa0 \xa0b</p>",
+                expect="<p>a\xa0\xa0 \xa0b</p>",
+            ),
+            Case(
+                description="attributes",
+                source="<div   class='a   b'  title=\"x > y\">  </div>",
+                expect="<div   class='a   b'  title=\"x > y\"> </div>",
+            ),
+            Case(
+                description="less than in text",
+                source="<p>a  <  b</p>",
+                expect="<p>a < b</p>",
+            ),
+            Case(
+                description="comment",
+                source="<!--  a  >  b  -->   <p></p>",
+                expect="<!--  a  >  b  --> <p></p>",
+            ),
+            Case(
+                description="pre",
+                source="<div>  <pre>\n  a   b\n</pre>  </div>",
+                expect="<div> <pre>\n  a   b\n</pre> </div>",
+            ),
+            Case(
+                description="textarea",
+                source="<textarea rows=3>  a   b </textarea>",
+                expect="<textarea rows=3>  a   b </textarea>",
+            ),
+            Case(
+                description="script",
+                source='<script>\n  if (a < b) {  x = "</div>";  }\n</script>  ',
+                expect='<script>\n  if (a < b) {  x = "</div>";  }\n</script> ',
+            ),
+            Case(
+                description="style",
+                source="<STYLE>\n  a  {  color: red;  }\n</STYLE>",
+                expect="<STYLE>\n  a  {  color: red;  }\n</STYLE>",
+            ),
+            Case(
+                description="element name starting with a raw text element name",
+                source="<preview>  a  </preview>",
+                expect="<preview> a </preview>",
+            ),
+        ]
+
+        for case in test_cases:
+            with self.subTest(msg=case.description):
+                self.assertEqual(minify([case.source]), case.expect)
+
+    def test_minify_in_chunks(self) -> None:
+        """Test that output does not depend on how input is split between writes."""
+        source = (
+            "<!DOCTYPE html>\n<html>\n  <head>\n"
+            "    <style>\n      a  {  color: red;  }\n    </style>\n"
+            '    <script>\n      x = "</div>";\n    </script>\n'
+            "  </head>\n  <body>\n    <!--  a  >  b  -->\n"
+            "    <div class='a   b'>\n      <b>a</b>   <i>b</i>\n    </div>\n"
+            "    <pre>\n  keep    this\n    </pre>\n"
+            "  </body>\n</html>\n"
+        )
+
+        expect = minify([source])
+        self.assertLess(len(expect), len(source))
+        self.assertIn("<pre>\n  keep    this\n    </pre>", expect)
+
+        for size in range(1, 20):
+            with self.subTest(msg=f"chunk size {size}"):
+                chunks = [source[i : i + size] for i in range(0, len(source), size)]
+                self.assertEqual(minify(chunks), expect)
+
+    def test_render_minified(self) -> None:
+        """Test that we can render a template through the minifier."""
+        env = Environment()
+        env.add_tag(MacroTag)
+        env.add_tag(CallTag)
+        env.add_tag(WithTag)
+
+        template = env.from_string(
+            "{% macro 'item', label %}\n"
+            "    <li>\n      {{ label }}\n    </li>\n"
+            "{% endmacro %}\n"
+            "<ul>\n"
+            "  {% for label in labels %}\n"
+            "    {% call 'item', label %}\n"
+            "  {% endfor %}\n"
+            "</ul>"
+        )
+
+        expect = "\n<ul>\n<li>\na\n</li>\n<li>\nb\n</li>\n</ul>"
+        self.assertEqual(render_minified(template, labels=["a", "b"]), expect)
+
+        async def coro() -> str:
+            return await render_minified_async(template, labels=["a", "b"])
+
+        self.assertEqual(asyncio.run(coro()), expect)
+
+    def test_render_minified_output_stream_limit(self) -> None:
+        """Test that render_minified respects the output stream limit."""
+        env = Environment()
+        env.output_stream_limit = 20
+        template = env.from_string(
+            "{% for x in (1..5) %}<p>  {{ x }}  </p>{% endfor %}"
+        )
+
+        with self.assertRaises(OutputStreamLimitError):
+            render_minified(template)
+
+        async def coro() -> str:
+            return await render_minified_async(template)
+
+        with self.assertRaises(OutputStreamLimitError):
+            asyncio.run(coro())
+
+        # The limit applies to minified output.
+        template = env.from_string("<p>" + " " * 100 + "</p>")
+        self.assertEqual(render_minified(template), "<p> </p>")
+
+    def test_render_minified_context_template(self) -> None:
+        """Test that render contexts know which template they are rendering."""
+
+        @with_context
+        def template_name(_: object, *, context: Context) -> str:
+            assert context.template is not None
+            return context.template.name
+
+        env = Environment(loader=DictLoader({"page": "<p>  {{ '' | name }}  </p>"}))
+        env.add_filter("name", template_name)
+        self.assertEqual(render_minified(env.get_template("page")), "<p> page </p>")